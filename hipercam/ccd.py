@@ -7,9 +7,11 @@ objects, while a multi-CCD of :class:`MCCD` is built as a
 
 """
 
+import re
 import warnings
 import numpy as np
 from collections import OrderedDict
+from numba import jit
 
 from astropy.io import fits
 from .core import *
@@ -17,7 +19,10 @@ from .group import *
 from .window import *
 from .header import *
 
-__all__ = ("CCD", "MCCD", "get_ccd_info", "trim_ultracam")
+__all__ = (
+    "CCD", "MCCD", "Calibrator", "get_ccd_info", "get_hcm_layout",
+    "read_hcm_rows", "trim_ultracam",
+)
 
 # Special keywords that will be stripped from FITS headers
 # on input as they are added on output. This is to make
@@ -169,7 +174,7 @@ class CCD(Agroup):
         arrs = []
         for wind in self.values():
             try:
-                wind_small = wind.window(xlo, xhi, ylo, yhi)
+                wind_small = wind.view(xlo, xhi, ylo, yhi)
                 arrs.append(wind_small.data.flatten())
             except HipercamError as err:
                 # could get errors if window not aligned
@@ -455,6 +460,49 @@ class CCD(Agroup):
         with fits.open(fname) as hdul:
             return cls.rhdul(hdul, cnam)
 
+    @classmethod
+    def rhcm(cls, fname, cnam=None):
+        """Builds a :class:`CCD` from an hcm file like :meth:`read`, but faster.
+        The file is read directly rather than through astropy.io.fits, and the
+        headers are only parsed if they are accessed. See :meth:`MCCD.rhcm`.
+
+        Arguments::
+
+          fname : string
+               the file to read
+
+          cnam  : (None | string)
+               if not None, the label of the CCD to extract from an MCCD
+               file, as for :meth:`read`.
+
+        Data are converted to float32 unless they are float64, as they are
+        by :meth:`read`. Raises a :class:`HipercamError` if no windows of
+        CCD `cnam` are found.
+        """
+        ccd = None
+        for raw, keys, data, off in _read_hcm(fname):
+            if cnam is None or keys.get("CCD") == cnam:
+                if ccd is None:
+                    ccd = cls(
+                        Group(Window),
+                        keys["NXTOT"],
+                        keys["NYTOT"],
+                        keys.get("NXPAD", 0),
+                        keys.get("NYPAD", 0),
+                    )
+                ccd[_hcm_label(ccd, keys)] = _hcm_window(raw, keys, data)
+
+            elif ccd is not None:
+                # CCDs are stored in contiguous blocks of HDUs
+                break
+
+        if ccd is None:
+            raise HipercamError(
+                "{:s}: found no windows of CCD {!s}".format(fname, cnam)
+            )
+
+        return ccd
+
     def matches(self, ccd):
         """Check that the :class:`CCD` matches another, which in this case means
         checking that each window of the same label matches the equivalent in
@@ -712,6 +760,45 @@ class MCCD(Agroup):
         with fits.open(fname) as hdul:
             return cls.rhdul(hdul)
 
+    @classmethod
+    def rhcm(cls, fname):
+        """Builds an :class:`MCCD` from an hcm file like :meth:`read`, but
+        faster, for use when many files must be read. The file is memory
+        mapped and scanned directly rather than through astropy.io.fits, with
+        only the few keywords needed to build the :class:`MCCD` extracted from
+        each header. The full headers are kept in raw form and only parsed
+        when they are first accessed, which many programs never need to do.
+        Unlike :meth:`read`, the header of the :class:`MCCD` is a
+        :class:`Header` rather than an astropy.io.fits.Header, as for MCCDs
+        from raw data.
+
+        Data are converted to float32 unless they are float64, as they are
+        by :meth:`read`.
+        """
+        hdus = _read_hcm(fname)
+
+        # The main header from the first HDU
+        raw, keys, data, off = next(hdus)
+        head = Header()
+        head._defer(raw, ("NUMCCD", "HIPERCAM"))
+
+        # The rest are the windows of the CCDs in contiguous blocks
+        ccds = Group(CCD)
+        for raw, keys, data, off in hdus:
+            cnam = keys["CCD"]
+            if cnam not in ccds:
+                ccds[cnam] = CCD(
+                    Group(Window),
+                    keys["NXTOT"],
+                    keys["NYTOT"],
+                    keys.get("NXPAD", 0),
+                    keys.get("NYPAD", 0),
+                )
+            ccd = ccds[cnam]
+            ccd[_hcm_label(ccd, keys)] = _hcm_window(raw, keys, data)
+
+        return cls(ccds, head)
+
     @classmethod
     def rhdul(cls, hdul):
         """Builds an :class:`MCCD` from an :class:`HDUList`.
@@ -816,6 +903,422 @@ class MCCD(Agroup):
         for ccd in self.values():
             ccd.set_const(val)
 
+# Calibrator objects keep their calibration frames cropped to each CCD
+# format they meet, and the combined bias and scaled dark of each Window for
+# each dark scale factor. The caches are cleared if they grow beyond
+# CALIB_CACHE_SIZE entries.
+CALIB_CACHE_SIZE = 50
+
+
+class Calibrator:
+    """Calibrates raw frames as (raw - bias - scale*dark) / flat where the
+    dark scale factor comes from the exposure times of each CCD. This is set
+    up once with the calibration frames, any of which can be None to skip
+    that step, and then applied to each frame::
+
+      >> calib = Calibrator(bias, dark, flat)
+      >> pccd = calib(mccd)
+
+    The calibration frames are cropped to the format of the data the first
+    time that each format is met, and the bias and the scaled dark are
+    combined into a single offset for each distinct dark scale factor. Each
+    Window is then calibrated in one pass with no temporary arrays, either
+    into new frames or into preallocated ones, which can be the raw frames
+    themselves.
+
+    Arguments::
+
+       bias : MCCD | None
+          the bias frame. Its exposure time (header item 'EXPTIME', 0 if
+          absent) is deducted from those of the data when scaling the dark.
+
+       dark : MCCD | None
+          the dark frame. Must have the header item 'EXPTIME'.
+
+       flat : MCCD | None
+          the flat field.
+    """
+
+    def __init__(self, bias=None, dark=None, flat=None):
+        self.bias = bias
+        self.dark = dark
+        self.flat = flat
+        self.bexpose = 0.0 if bias is None else bias.head.get("EXPTIME", 0.0)
+        self.dexpose = None if dark is None else dark.head["EXPTIME"]
+
+        # calibration CCDs cropped to each format, and the arrays needed
+        # for each Window of each format and dark scale factor
+        self._crops = {}
+        self._arrays = {}
+
+    def scale(self, ccd):
+        """Returns the factor to multiply the dark by when calibrating the CCD
+        'ccd', computed from its exposure time, or None if there is no dark.
+        """
+        if self.dark is None:
+            return None
+        return (ccd.head["EXPTIME"] - self.bexpose) / self.dexpose
+
+    def prepare(self, cnam, ccd, scale=None, wnams=None):
+        """Returns the arrays needed to calibrate CCD 'ccd' which has label
+        'cnam' as a dictionary keyed by its Window labels. Each entry is an
+        (offset, flat) tuple of arrays matching the Window, where 'offset' is
+        the bias plus the scaled dark. Either can be None if there is nothing
+        to apply. 'scale' is the dark scale factor; it is computed from 'ccd'
+        if not set. 'wnams' can be set to a list of Window labels to restrict
+        the arrays to those Windows. The arrays are cached and must not be
+        modified.
+        """
+        if scale is None:
+            scale = self.scale(ccd)
+
+        fmt, crops = self._crop(cnam, ccd)
+
+        arrays = {}
+        for wnam in ccd if wnams is None else wnams:
+            key = (fmt, scale, wnam)
+            warrays = self._arrays.get(key)
+
+            if warrays is None:
+                warrays = self._rows(crops, wnam, scale, slice(None))
+                if len(self._arrays) >= CALIB_CACHE_SIZE:
+                    self._arrays.clear()
+                self._arrays[key] = warrays
+
+            arrays[wnam] = warrays
+
+        return arrays
+
+    def prepare_rows(self, cnam, ccd, wnam, y1, y2, scale=None):
+        """Returns the (offset, flat) tuple of arrays needed to calibrate rows
+        y1 to y2 (array indices, y2 excluded) of Window 'wnam' of CCD 'ccd'
+        which has label 'cnam', as :meth:`prepare` does for whole Windows.
+        The offset is computed for just those rows each time rather than
+        cached, so that memory use is set by the size of the strip when
+        Windows are calibrated in strips of rows for many different dark
+        scale factors. 'flat' is a view of a cached array and must not be
+        modified.
+        """
+        if scale is None:
+            scale = self.scale(ccd)
+
+        fmt, crops = self._crop(cnam, ccd)
+        return self._rows(crops, wnam, scale, slice(y1, y2))
+
+    def _crop(self, cnam, ccd):
+        """Returns (fmt, crops) where 'fmt' identifies the format of CCD
+        'ccd' and 'crops' are the bias, dark and flat cropped to it"""
+        fmt = (cnam,) + tuple(
+            (wnam, wind.llx, wind.lly, wind.nx, wind.ny, wind.xbin, wind.ybin)
+            for wnam, wind in ccd.items()
+        )
+
+        crops = self._crops.get(fmt)
+        if crops is None:
+            # crop the calibration frames to the format of 'ccd'
+            crops = tuple(
+                None if frame is None else frame[cnam].crop(ccd)
+                for frame in (self.bias, self.dark, self.flat)
+            )
+            if len(self._crops) >= CALIB_CACHE_SIZE:
+                self._crops.clear()
+            self._crops[fmt] = crops
+
+        return fmt, crops
+
+    @staticmethod
+    def _rows(crops, wnam, scale, rows):
+        """Returns the (offset, flat) arrays for the rows 'rows' (a slice) of
+        Window 'wnam' given the cropped calibration frames 'crops'"""
+        bccd, dccd, fccd = crops
+        if dccd is not None:
+            offset = scale * dccd[wnam].data[rows]
+            if bccd is not None:
+                offset += bccd[wnam].data[rows]
+        elif bccd is not None:
+            offset = bccd[wnam].data[rows]
+        else:
+            offset = None
+
+        return offset, None if fccd is None else fccd[wnam].data[rows]
+
+    @staticmethod
+    def apply(data, offset, flat, out=None):
+        """Calibrates the array 'data' as (data - offset) / flat, where
+        'offset' and 'flat' are arrays such as those returned by
+        :meth:`prepare` (either can be None). The result is written to the
+        array 'out' if set, which can be 'data' itself, otherwise to a new
+        array. Returns the result. Strips of Windows can be calibrated by
+        passing matching slices of the arrays.
+        """
+        if out is None:
+            out = np.empty(
+                data.shape,
+                np.result_type(data, *[arr for arr in (offset, flat) if arr is not None]),
+            )
+
+        if offset is not None and flat is not None:
+            _calibrate(data, offset, flat, out)
+        elif offset is not None:
+            np.subtract(data, offset, out=out)
+        elif flat is not None:
+            np.divide(data, flat, out=out)
+        elif out is not data:
+            out[...] = data
+
+        return out
+
+    def ccd(self, cnam, ccd, out=None):
+        """Returns a calibrated version of the CCD 'ccd' labelled 'cnam'. If
+        'out' is set, it must be a CCD of the same format as 'ccd' into whose
+        Windows the data are written, leaving its headers unchanged. It can
+        be 'ccd' itself to calibrate in place. Otherwise a new CCD is
+        returned with copies of the headers of 'ccd'.
+        """
+        arrays = self.prepare(cnam, ccd)
+
+        if out is None:
+            out = CCD(Group(Window), ccd.nxtot, ccd.nytot, ccd.nxpad, ccd.nypad)
+            for wnam, wind in ccd.items():
+                offset, flat = arrays[wnam]
+                out[wnam] = Window(
+                    Winhead.copy(wind), self.apply(wind.data, offset, flat)
+                )
+        else:
+            for wnam, wind in ccd.items():
+                owind = out[wnam]
+                if owind is not wind:
+                    owind.matches(wind)
+                offset, flat = arrays[wnam]
+                self.apply(wind.data, offset, flat, owind.data)
+
+        return out
+
+    def __call__(self, mccd, out=None):
+        """Returns a calibrated version of the MCCD 'mccd'. If 'out' is set,
+        it must be an MCCD of the same format into which the data are
+        written, leaving its headers unchanged. It can be 'mccd' itself to
+        calibrate in place. Otherwise a new MCCD is returned with copies of
+        the headers of 'mccd'.
+        """
+        if out is None:
+            out = MCCD(Group(CCD), mccd.head.copy())
+            for cnam, ccd in mccd.items():
+                out[cnam] = self.ccd(cnam, ccd)
+        else:
+            for cnam, ccd in mccd.items():
+                self.ccd(cnam, ccd, out[cnam])
+
+        return out
+
+
+@jit(nopython=True, cache=True, error_model="numpy")
+def _calibrate(data, offset, flat, out):
+    """Computes out = (data - offset) / flat for 2D arrays in one pass.
+    Division by zero gives infinities or NaNs as with numpy.
+    """
+    ny, nx = data.shape
+    for iy in range(ny):
+        for ix in range(nx):
+            out[iy, ix] = (data[iy, ix] - offset[iy, ix]) / flat[iy, ix]
+
+
+# Keywords extracted from the headers of hcm files by _read_hcm, keyed by
+# their 8-byte form in the FITS cards
+HCM_KEYS = {
+    "{:8s}".format(key).encode(): key
+    for key in (
+        "BITPIX", "NAXIS", "NAXIS1", "NAXIS2", "BSCALE", "BZERO", "CCD",
+        "WINDOW", "LLX", "LLY", "XBIN", "YBIN", "OUTAMP", "NXTOT", "NYTOT",
+        "NXPAD", "NYPAD",
+    )
+}
+
+# FITS data types by BITPIX
+HCM_TYPES = {8: "u1", 16: ">i2", 32: ">i4", 64: ">i8", -32: ">f4", -64: ">f8"}
+
+_HCM_STRING = re.compile(r"\s*'((?:[^']|'')*)'")
+
+
+def _read_hcm(fname):
+    """Generator of the HDUs of an hcm file used by :meth:`MCCD.rhcm` and
+    :meth:`CCD.rhcm`. The file is memory mapped and the headers scanned for
+    the keywords in HCM_KEYS. Returns (raw, keys, data, off) for each HDU
+    where 'raw' are the bytes of the header, 'keys' is a dictionary of the
+    keywords found, 'data' is a read-only view of the data in the file, or
+    None if there are none, and 'off' is the byte offset of the data.
+    """
+    mm = np.memmap(fname, dtype=np.uint8, mode="r")
+    off = 0
+    while off < mm.size:
+
+        # Read header blocks until the END card
+        start, end, keys = off, None, {}
+        while end is None:
+            if off + 2880 > mm.size:
+                raise HipercamError(
+                    "{:s}: no END card found for header starting at byte {:d}".format(
+                        fname, start
+                    )
+                )
+            block = mm[off : off + 2880].tobytes()
+            for n in range(0, 2880, 80):
+                key = block[n : n + 8]
+                if key == b"END     ":
+                    end = off + n + 80
+                    break
+                if key in HCM_KEYS and block[n + 8 : n + 10] == b"= ":
+                    keys[HCM_KEYS[key]] = _hcm_value(block[n + 10 : n + 80])
+            off += 2880
+
+        raw = mm[start:end].tobytes()
+
+        naxis = keys.get("NAXIS", 0)
+        if naxis == 0:
+            data, doff = None, off
+
+        elif naxis == 2:
+            dtype = np.dtype(HCM_TYPES[keys["BITPIX"]])
+            shape = (keys["NAXIS2"], keys["NAXIS1"])
+            nbytes = dtype.itemsize * shape[0] * shape[1]
+            if off + nbytes > mm.size:
+                raise HipercamError(
+                    "{:s}: data starting at byte {:d} are truncated".format(fname, off)
+                )
+            data, doff = np.ndarray(shape, dtype, mm, off), off
+
+            # Data are padded to a whole number of blocks
+            off += 2880 * ((nbytes + 2879) // 2880)
+
+        else:
+            raise HipercamError(
+                "{:s}: found NAXIS = {:d}; hcm data must be 2D".format(fname, naxis)
+            )
+
+        yield raw, keys, data, doff
+
+
+def _hcm_value(field):
+    """Returns the value of a FITS header card from the bytes which follow
+    the '= '. Handles strings, logicals, integers and floats."""
+    field = field.decode("ascii")
+    if field.lstrip().startswith("'"):
+        # Quotes in strings are doubled, and trailing blanks do not count
+        match = _HCM_STRING.match(field)
+        if match is None:
+            raise HipercamError("could not read a string from {:s}".format(field))
+        return match.group(1).replace("''", "'").rstrip()
+
+    value = field.split("/", 1)[0].strip()
+    if value == "T":
+        return True
+    elif value == "F":
+        return False
+    try:
+        return int(value)
+    except ValueError:
+        return float(value.replace("D", "E"))
+
+
+def _hcm_label(ccd, keys):
+    """Returns the label of a window of an hcm file, attempting to generate
+    one if there is no keyword WINDOW, as in :meth:`CCD.rhdul`"""
+    if "WINDOW" in keys:
+        return keys["WINDOW"]
+    label = str(len(ccd) + 1)
+    if label in ccd:
+        raise KeyError("window label conflict")
+    return label
+
+
+def _hcm_data(keys, data):
+    """Returns a copy of the data of an HDU of an hcm file scaled by any
+    BSCALE and BZERO and converted to float32, unless stored as float64
+    (BITPIX = -64) when they are kept as float64, matching what
+    :meth:`CCD.rhdul` returns."""
+    bscale, bzero = keys.get("BSCALE", 1), keys.get("BZERO", 0)
+    if keys["BITPIX"] > 0 and (bscale != 1 or bzero != 0):
+        return (bscale * data.astype(np.float64) + bzero).astype(np.float32)
+    elif keys["BITPIX"] == -64:
+        return data.astype(np.float64)
+    else:
+        return data.astype(np.float32)
+
+
+def _hcm_window(raw, keys, data):
+    """Creates a :class:`Window` from the output of _read_hcm with its header
+    deferred and its data converted by _hcm_data."""
+    data = _hcm_data(keys, data)
+
+    ny, nx = data.shape
+    win = Winhead(
+        keys["LLX"],
+        keys["LLY"],
+        nx,
+        ny,
+        keys["XBIN"],
+        keys["YBIN"],
+        keys.get("OUTAMP", ""),
+    )
+    wind = Window(win, data)
+
+    # parse the header only when needed, cleaning it as in CCD.rhdul
+    wind._defer(raw, KEYWORDS)
+    return wind
+
+
+def get_hcm_layout(fname, cnam):
+    """Returns where the data of the windows of CCD 'cnam' lie within the hcm
+    file 'fname', for :func:`read_hcm_rows` to read parts of them without
+    reading or scanning the whole file each time. The headers are scanned
+    as by :meth:`CCD.rhcm`. Returns an OrderedDict keyed on the window
+    labels of (off, keys) where 'off' is the byte offset of the data and
+    'keys' a dictionary of the keywords needed to interpret them.
+    """
+    layout = OrderedDict()
+    for raw, keys, data, off in _read_hcm(fname):
+        if keys.get("CCD") == cnam and data is not None:
+            layout[keys.get("WINDOW", str(len(layout) + 1))] = (off, keys)
+        elif layout:
+            # CCDs are stored in contiguous blocks of HDUs
+            break
+
+    if not layout:
+        raise HipercamError("{:s}: found no windows of CCD {:s}".format(fname, cnam))
+    return layout
+
+
+def read_hcm_rows(fname, where, y1, y2):
+    """Reads rows y1 to y2 (array indices, y2 excluded) of a window of an hcm
+    file, converting them as when the whole file is read.
+
+    Arguments::
+
+       fname : string
+          the hcm file
+
+       where : tuple
+          (off, keys), the location of the window in the file as returned
+          for it by :func:`get_hcm_layout`.
+
+       y1, y2 : int
+          the range of rows to read.
+
+    Returns a 2D numpy array.
+    """
+    off, keys = where
+    dtype = np.dtype(HCM_TYPES[keys["BITPIX"]])
+    nx = keys["NAXIS1"]
+    y2 = min(y2, keys["NAXIS2"])
+    with open(fname, "rb") as fin:
+        fin.seek(off + dtype.itemsize * nx * y1)
+        data = np.fromfile(fin, dtype, nx * (y2 - y1))
+    if len(data) != nx * (y2 - y1):
+        raise HipercamError(
+            "{:s}: data starting at byte {:d} are truncated".format(fname, off)
+        )
+    return _hcm_data(keys, data.reshape(y2 - y1, nx))
+
 
 def get_ccd_info(fname):
     """Routine to return some useful basic information from an MCCD file without
@@ -18,6 +18,8 @@ __all__ = (
     "DFCT",
     "SEP",
     "TBTS",
+    "IDX",
+    "BLOG",
     "HipercamError",
     "HipercamWarning",
     "DMINS",
@@ -66,6 +68,8 @@ LOG = ".log"
 DFCT = ".dft"
 SEP = ".sep"
 TBTS = ".tbts"
+IDX = ".idx"
+BLOG = ".hlb"
 
 # number of minutes in a day
 DMINS = 1440.0
@@ -4,14 +4,17 @@ Code for profile fitting. Currently supports symmetric 2D Gaussian and
 Moffat profiles plus constants.
 """
 
-from numba import jit
+from numba import jit, prange
 import numpy as np
 from scipy.optimize import least_squares
 from .core import *
 from .window import *
 from . import support
 
-__all__ = ("combFit", "fitMoffat", "fitGaussian", "moffat", "gaussian")
+__all__ = (
+    "combFit", "combFitBatch", "fitMoffat", "fitMoffatBatch", "fitGaussian",
+    "profileStep", "moffat", "gaussian"
+)
 
 
 def combFit(
@@ -31,7 +34,8 @@ def combFit(
     gain,
     thresh,
     ndiv=0,
-    max_nfev=None
+    max_nfev=None,
+    max_reject=None
 ):
     """Fits a stellar profile in a :class:Window using either a 2D Gaussian
     or Moffat profile. This is a convenience wrapper of fitMoffat and
@@ -98,6 +102,13 @@ def combFit(
             will slow things. To simply evaluate the profile once at the
             centre of each pixel in `wind`, set ndiv = 0.
 
+        max_nfev : int or None
+            maximum number of function evaluations during fits.
+
+        max_reject : int or None
+            maximum number of passes of pixel rejection followed by a re-fit.
+            None for no limit.
+
     Returns:: (pars, epars, extras)
 
     where::
@@ -133,7 +144,7 @@ def combFit(
             (fit, X, Y, sigma, chisq, nok, nrej, npar, nfev)
         ) = fitGaussian(
             wind, sky, height, x, y, fwhm, fwhm_min, fwhm_fix, read, gain, thresh,
-            ndiv, max_nfev
+            ndiv, max_nfev, max_reject
         )
 
     elif method == "m":
@@ -144,12 +155,251 @@ def combFit(
             (fit, X, Y, sigma, chisq, nok, nrej, npar, nfev)
         ) = fitMoffat(
             wind, sky, height, x, y, fwhm, fwhm_min, fwhm_fix, beta,
-            beta_max, beta_fix, read, gain, thresh, ndiv, max_nfev
+            beta_max, beta_fix, read, gain, thresh, ndiv, max_nfev, max_reject
+        )
+
+    else:
+        raise NotImplementedError("{:s} fitting method not implemented".format(method))
+
+    if method == "g":
+        beta, ebeta = 0.0, -1.0
+
+    message = _message(
+        method, (sky, height, x, y, fwhm, beta),
+        (esky, eheight, ex, ey, efwhm, ebeta), fit, chisq, nok, nrej, nfev
+    )
+
+    return (
+        (sky, height, x, y, fwhm, beta),
+        (esky, eheight, ex, ey, efwhm, ebeta),
+        (fit, X, Y, sigma, chisq, nok, nrej, npar, nfev, message),
+    )
+
+
+def combFitBatch(
+    winds,
+    method,
+    skys,
+    heights,
+    xs,
+    ys,
+    fwhms,
+    fwhm_min,
+    fwhm_fix,
+    betas,
+    beta_max,
+    beta_fix,
+    reads,
+    gains,
+    thresh,
+    ndiv=0,
+    max_nfev=None,
+    max_reject=None,
+    parallel=False
+):
+    """Fits stellar profiles in several :class:Windows at once. This is the
+    equivalent of combFit for many targets; Moffat profiles are fitted
+    together by fitMoffatBatch, while Gaussian profiles are fitted one by
+    one.
+
+    Arguments::
+
+        winds : list of :class:`Window`
+            the Windows containing the profiles to fit.
+
+        method : string
+            fitting method 'g' for Gaussian, 'm' for Moffat
+
+        skys, heights, xs, ys, fwhms, betas : sequences
+            initial values of the sky, peak height, X, Y, FWHM and beta,
+            one of each per Window (see combFit).
+
+        fwhm_min, fwhm_fix, beta_max, beta_fix, thresh, ndiv, max_nfev,
+        max_reject :
+            as for combFit, common to all the fits.
+
+        reads, gains : sequences
+            readout noise and gain, one per Window, each of which can be a
+            float or an array matching the Window's data.
+
+        parallel : bool
+            see fitMoffatBatch; not used for Gaussian fits.
+
+    Returns:: a list with one entry per Window, either the (pars, epars,
+    extras) tuple that combFit would return, or the HipercamError that
+    combFit would have raised.
+
+    """
+
+    if method == "g":
+        # gaussian fits
+        results = []
+        for wind, sky, height, x, y, fwhm, read, gain in zip(
+            winds, skys, heights, xs, ys, fwhms, reads, gains
+        ):
+            try:
+                (
+                    (sky, height, x, y, fwhm),
+                    (esky, eheight, ex, ey, efwhm),
+                    extras
+                ) = fitGaussian(
+                    wind, sky, height, x, y, fwhm, fwhm_min, fwhm_fix, read,
+                    gain, thresh, ndiv, max_nfev, max_reject
+                )
+                results.append(
+                    (
+                        (sky, height, x, y, fwhm, 0.0),
+                        (esky, eheight, ex, ey, efwhm, -1.0),
+                        extras
+                    )
+                )
+            except HipercamError as err:
+                results.append(err)
+
+    elif method == "m":
+        # moffat fits
+        results = fitMoffatBatch(
+            winds, skys, heights, xs, ys, fwhms, fwhm_min, fwhm_fix, betas,
+            beta_max, beta_fix, reads, gains, thresh, ndiv, max_nfev,
+            max_reject, parallel
         )
 
     else:
         raise NotImplementedError("{:s} fitting method not implemented".format(method))
 
+    for n, result in enumerate(results):
+        if not isinstance(result, HipercamError):
+            pars, epars, (fit, X, Y, sigma, chisq, nok, nrej, npar, nfev) = result
+            message = _message(
+                method, pars, epars, fit, chisq, nok, nrej, nfev
+            )
+            results[n] = (
+                pars, epars,
+                (fit, X, Y, sigma, chisq, nok, nrej, npar, nfev, message)
+            )
+
+    return results
+
+
+def profileStep(
+    wind,
+    method,
+    pars,
+    read,
+    gain,
+    ndiv=0,
+    rejected=None,
+    fwhm_min=0.0,
+    fwhm_fix=False,
+    beta_max=np.inf,
+):
+    """Predicts how far the parameters of a stellar profile would move if it
+    were re-fitted starting from those of an earlier fit. This takes a single
+    Gauss-Newton step from the old parameters, costing one evaluation of the
+    profile and its derivatives rather than a full fit. It can be used to
+    decide whether a fit is needed at all when tracking a target from frame
+    to frame.
+
+    Arguments::
+
+        wind : :class:`Window`
+            the Window containing the stellar profile.
+
+        method : string
+            'g' for Gaussian, 'm' for Moffat
+
+        pars : tuple
+            (sky, height, x, y, fwhm, beta), the old parameters (`beta` is
+            ignored if `method` == 'g')
+
+        read : float | array
+            readout noise, RMS ADU
+
+        gain : float | array
+            gain, electrons per ADU
+
+        ndiv : int
+            sub-pixellation factor, see combFit.
+
+        rejected : tuple | None
+            (x, y), arrays of the coordinates of the pixels rejected in the
+            earlier fit. Any of these within `wind` are given zero weight so
+            that outliers do not bias the step.
+
+        fwhm_min, fwhm_fix, beta_max :
+            as for combFit. The FWHM is held fixed if `fwhm_fix`, and the
+            step is re-computed with the FWHM fixed at `fwhm_min` or beta
+            at `beta_max` if it would take them beyond these limits, as a
+            fit would be.
+
+    Returns:: (dsky, dheight, dx, dy, dfwhm, dbeta), the predicted changes in
+    the parameters (`dfwhm` == 0 if `fwhm_fix`, `dbeta` == 0 if `method` ==
+    'g').
+
+    Raises a HipercamError if the step cannot be computed.
+
+    """
+
+    sky, height, x, y, fwhm, beta = pars
+    mode = "s" if fwhm_fix else "sf"
+    if method == "g":
+        pfit = Gfit(wind, read, gain, ndiv, mode, fwhm)
+    elif method == "m":
+        pfit = Mfit(wind, read, gain, ndiv, mode + "b", fwhm, beta)
+    else:
+        raise NotImplementedError("{:s} fitting method not implemented".format(method))
+
+    if rejected is not None:
+        # negative sigma flags rejected pixels, as in the fits
+        ix = np.rint((np.asarray(rejected[0]) - wind.x(0)) / wind.xbin).astype(int)
+        iy = np.rint((np.asarray(rejected[1]) - wind.y(0)) / wind.ybin).astype(int)
+        ok = (ix >= 0) & (ix < wind.nx) & (iy >= 0) & (iy < wind.ny)
+        pfit.sigma[iy[ok], ix[ok]] = -np.abs(pfit.sigma[iy[ok], ix[ok]])
+
+    while True:
+        if method == "g":
+            param = pfit.set_par(sky, height, x, y, fwhm)
+        else:
+            param = pfit.set_par(sky, height, x, y, fwhm, beta)
+
+        # minimise |res + jac * step|**2
+        jac, res = pfit.jac(param), pfit.fun(param)
+        try:
+            step = np.linalg.lstsq(jac, -res, rcond=None)[0]
+        except (np.linalg.LinAlgError, ValueError) as err:
+            raise HipercamError(err)
+
+        if not np.isfinite(step).all():
+            raise HipercamError("profileStep: non-finite step")
+
+        new = pfit.get_par(np.asarray(param) + step)
+        mode = pfit.mode
+
+        # switch modes at the limits in the same order as the fits
+        if method == "m" and mode.find("b") > -1 and new[5] > beta_max:
+            pfit.set_mode(mode.replace("b", ""), pfit.fwhm, beta_max)
+
+        elif mode.find("f") > -1 and abs(new[4]) < fwhm_min:
+            if method == "g":
+                pfit.set_mode(mode.replace("f", ""), fwhm_min)
+            else:
+                pfit.set_mode(mode.replace("f", ""), fwhm_min, pfit.beta)
+
+        else:
+            break
+
+    new = new + (beta,) if method == "g" else new
+    return tuple(
+        npar - par for npar, par in zip(
+            new[:4] + (abs(new[4]),) + new[5:], (sky, height, x, y, fwhm, beta)
+        )
+    )
+
+
+def _message(method, pars, epars, fit, chisq, nok, nrej, nfev):
+    """Summarises the results of a profile fit for combFit and combFitBatch"""
+    sky, height, x, y, fwhm, beta = pars
+    esky, eheight, ex, ey, efwhm, ebeta = epars
     if method == "g":
         message = (
             "x, y = {:.1f}({:.1f}), {:.1f}({:.1f}),"
@@ -173,8 +423,7 @@ def combFit(
             nrej,
             nfev,
         )
-        beta, ebeta = 0.0, -1.0
-    elif method == "m":
+    else:
         message = (
             "x,y = {:.1f}({:.1f}),{:.1f}({:.1f}),"
             " FWHM = {:.2f}({:.2f}), peak = {:.1f}({:.1f}),"
@@ -200,11 +449,7 @@ def combFit(
             nfev,
         )
 
-    return (
-        (sky, height, x, y, fwhm, beta),
-        (esky, eheight, ex, ey, efwhm, ebeta),
-        (fit, X, Y, sigma, chisq, nok, nrej, npar, nfev, message),
-    )
+    return message
 
 
 ################################
@@ -231,6 +476,7 @@ def fitMoffat(
     thresh,
     ndiv,
     max_nfev=None,
+    max_reject=None,
 ):
     """Fits the profile of one target in a Window with a symmetric 2D Moffat
     profile plus a constant "c + h/(1+alpha**2)**beta" where r is the distance
@@ -320,6 +566,10 @@ def fitMoffat(
            maximum number of function evaluations during fits. Passed
            direct to least_squares.
 
+        max_reject : int or None
+           maximum number of passes of pixel rejection followed by a re-fit.
+           None for no limit.
+
     Returns:: tuple
 
         (pars, sigs, extras) where::
@@ -368,6 +618,7 @@ def fitMoffat(
     mfit = Mfit(wind, read, gain, ndiv, mode, fwhm, beta)
 
     mode_switch = False
+    npass = 0
 
     while True:
 
@@ -424,12 +675,15 @@ def fitMoffat(
             nok1 = len(resid[ok])
             sfac = np.sqrt(chisq / nok1)
 
-            # reject any above the defined threshold
-            mfit.sigma[ok & (np.abs(resid) > sfac * thresh)] *= -1
+            # reject any above the defined threshold, unless the limit
+            # on the number of rejection passes has been reached
+            if max_reject is None or npass < max_reject:
+                mfit.sigma[ok & (np.abs(resid) > sfac * thresh)] *= -1
 
             # check whether any have been rejected
             ok = mfit.mask & (mfit.sigma > 0)
             nok = len(mfit.sigma[ok])
+            npass += 1
 
             if nok == nok1:
                 # no more pixels have been rejected.  calculate how
@@ -465,6 +719,252 @@ def fitMoffat(
         )
 
 
+def fitMoffatBatch(
+    winds,
+    skys,
+    heights,
+    xcens,
+    ycens,
+    fwhms,
+    fwhm_min,
+    fwhm_fix,
+    betas,
+    beta_max,
+    beta_fix,
+    reads,
+    gains,
+    thresh,
+    ndiv,
+    max_nfev=None,
+    max_reject=None,
+    parallel=False,
+):
+    """Fits symmetric 2D Moffat profiles plus constants to the targets in
+    several Windows at once. This gives the same results as calling fitMoffat
+    on each Window in turn, but the Windows are stacked into (K,ny,nx) arrays
+    and stepped together through a single Levenberg-Marquardt loop so that
+    the overheads per fit are much lower. Windows smaller than the largest are
+    padded, the padding being masked from the fits. Fits that converge, or
+    need to be re-started after a switch of mode or the rejection of pixels,
+    drop out of or re-join the stack independently of the others.
+
+    Arguments::
+
+        winds : list of :class:`Window`
+            the Windows with the data to be fitted, one target per Window.
+
+        skys : sequence or None
+            initial values of the sky background, one per Window. Set None
+            to ignore (i.e. regard all as = 0)
+
+        heights, xcens, ycens, fwhms, betas : sequences
+            initial values of the peak heights, X and Y centres, FWHMs and
+            Moffat exponents, one per Window. See fitMoffat.
+
+        fwhm_min, fwhm_fix, beta_max, beta_fix, thresh, ndiv :
+            as for fitMoffat, common to all the fits.
+
+        reads, gains : sequences
+            readout noise (RMS counts) and gain (e- per count), one per
+            Window, each of which can be a float or an array matching the
+            Window's data.
+
+        max_nfev : int or None
+           maximum number of function evaluations per fit. If None it will
+           be 100 times the number of parameters fitted.
+
+        max_reject : int or None
+           maximum number of passes of pixel rejection followed by a re-fit
+           for each target. None for no limit.
+
+        parallel : bool
+           evaluate the profiles of the stamps in parallel threads. Only
+           worthwhile for many targets and / or large values of ndiv, and to
+           be avoided if running in parallel processes already.
+
+    Returns:: a list with one entry per Window, either the (pars, sigs,
+    extras) tuple that fitMoffat would return, or the HipercamError that
+    fitMoffat would have raised.
+
+    """
+
+    nstamp = len(winds)
+    results = nstamp * [None]
+    if nstamp == 0:
+        return results
+
+    # stack data, uncertainties, ordinates and masks into (K,ny,nx) arrays.
+    # The padding is masked so its values are of no consequence.
+    ny = max(wind.ny for wind in winds)
+    nx = max(wind.nx for wind in winds)
+    data = np.zeros((nstamp, ny, nx))
+    sigma = np.ones((nstamp, ny, nx))
+    x = np.zeros((nstamp, ny, nx))
+    y = np.zeros((nstamp, ny, nx))
+    mask = np.zeros((nstamp, ny, nx), dtype=bool)
+
+    for k, (wind, read, gain) in enumerate(zip(winds, reads, gains)):
+        mfit = Mfit(wind, read, gain, ndiv, "sfb")
+        data[k, : wind.ny, : wind.nx] = wind.data
+        sigma[k, : wind.ny, : wind.nx] = mfit.sigma
+        x[k, : wind.ny, : wind.nx] = mfit.x
+        y[k, : wind.ny, : wind.nx] = mfit.y
+        mask[k, : wind.ny, : wind.nx] = mfit.mask
+
+    # sub-pixel offset tables of each stamp
+    tables = [_subpixels(wind.xbin, wind.ybin, ndiv) for wind in winds]
+    noffs = np.array([len(xoffs) for xoffs, yoffs in tables])
+    xoffs = np.zeros((nstamp, noffs.max()))
+    yoffs = np.zeros((nstamp, noffs.max()))
+    for k, (xoff, yoff) in enumerate(tables):
+        xoffs[k, : noffs[k]] = xoff
+        yoffs[k, : noffs[k]] = yoff
+
+    # starting parameters (sky, height, xcen, ycen, fwhm, beta) of each fit,
+    # and which of them are free to vary
+    start = np.column_stack(
+        (
+            np.zeros(nstamp) if skys is None else skys,
+            heights, xcens, ycens, fwhms, betas
+        )
+    ).astype(np.float64)
+    free = np.ones((nstamp, 6), dtype=bool)
+    free[:, 0] = skys is not None
+    free[:, 4] = not fwhm_fix
+    free[:, 5] = not beta_fix
+
+    todo = []
+    for k in range(nstamp):
+        if start[k, 4] < fwhm_min or start[k, 5] > beta_max:
+            results[k] = HipercamError("fwhm and/or beta out of range")
+        else:
+            todo.append(k)
+    param = start.copy()
+    npass = np.zeros(nstamp, dtype=int)
+
+    while len(todo):
+
+        # check there are enough points to fit
+        fits = []
+        for k in todo:
+            if (mask[k] & (sigma[k] > 0)).sum() < free[k].sum():
+                results[k] = HipercamError(
+                    "too few points to fit {:d} parameters".format(free[k].sum())
+                )
+            else:
+                fits.append(k)
+        if len(fits) == 0:
+            break
+
+        fits = np.array(fits)
+        pars, nfevs, status = _lm_moffats(
+            param[fits], free[fits], data[fits], sigma[fits], mask[fits],
+            x[fits], y[fits], xoffs[fits], yoffs[fits], noffs[fits], max_nfev,
+            parallel
+        )
+        model, derivs = _moffats(
+            x[fits], y[fits], pars, xoffs[fits], yoffs[fits], noffs[fits]
+        )
+
+        # Go through the fits, which are either finished or need to be
+        # re-started, the latter making up the next batch.
+        todo = []
+        for n, k in enumerate(fits):
+
+            if status[n] < 0:
+                results[k] = HipercamError(
+                    "fitMoffatBatch: non-finite chi**2 or singular matrix"
+                )
+                continue
+
+            elif status[n] == 0:
+                results[k] = HipercamError(
+                    "The maximum number of function evaluations is exceeded."
+                )
+                continue
+
+            skyf, heightf, xf, yf, fwhmf, betaf = pars[n]
+            fwhmf = abs(fwhmf)
+
+            if free[k, 5] and betaf > beta_max:
+                # switch to fixed beta fit
+                free[k, 5] = False
+                start[k, 5] = beta_max
+                param[k] = start[k]
+                todo.append(k)
+
+            elif free[k, 4] and fwhmf < fwhm_min:
+                # switch to fixed fwhm fit
+                free[k, 4] = False
+                start[k, 4] = fwhm_min
+                param[k] = start[k]
+                todo.append(k)
+
+            else:
+
+                # no mode switch, compute covariances
+                ok = mask[k] & (sigma[k] > 0)
+                J = derivs[n][free[k]][:, ok] / sigma[k][ok]
+                try:
+                    covar = np.linalg.inv(J @ J.T)
+                except np.linalg.LinAlgError as err:
+                    results[k] = HipercamError(err)
+                    continue
+
+                covs = np.diag(covar)
+                if (covs < 0).any():
+                    results[k] = HipercamError(
+                        "Negative covariance in fitMoffatBatch"
+                    )
+                    continue
+
+                # compute chi**2 and number of OK points
+                resid = (data[k] - model[n]) / sigma[k]
+                chisq = (resid[ok] ** 2).sum()
+                nok1 = ok.sum()
+                sfac = np.sqrt(chisq / nok1)
+
+                # reject any above the defined threshold, unless the limit
+                # on the number of rejection passes has been reached
+                if max_reject is None or npass[k] < max_reject:
+                    sigma[k][ok & (np.abs(resid) > sfac * thresh)] *= -1
+
+                # check whether any have been rejected
+                nok = (mask[k] & (sigma[k] > 0)).sum()
+                npass[k] += 1
+
+                if nok == nok1:
+                    # no more pixels have been rejected. re-scale the
+                    # uncertainties to reflect the actual chi**2
+                    nrej = mask[k].sum() - nok
+                    epars = np.full(6, -1.0)
+                    epars[free[k]] = sfac * np.sqrt(covs)
+                    wny, wnx = winds[k].ny, winds[k].nx
+                    extras = (
+                        Window(winds[k], model[n, :wny, :wnx].copy()),
+                        x[k, :wny, :wnx].copy(),
+                        y[k, :wny, :wnx].copy(),
+                        sigma[k, :wny, :wnx].copy(),
+                        chisq,
+                        nok,
+                        nrej,
+                        free[k].sum(),
+                        nfevs[n]
+                    )
+                    results[k] = (
+                        (skyf, heightf, xf, yf, fwhmf, betaf),
+                        tuple(epars),
+                        extras
+                    )
+
+                else:
+                    # re-fit from where we are without the rejected pixels
+                    param[k] = pars[n]
+                    todo.append(k)
+
+    return results
+
+
 @jit(nopython=True, cache=True)
 def moffat(x, y, sky, height, xcen, ycen, fwhm, beta, xbin, ybin, ndiv):
     """
@@ -815,6 +1315,7 @@ class Mfit:
         self.xbin = wind.xbin
         self.ybin = wind.ybin
         self.ndiv = ndiv
+        self.xoffs, self.yoffs = _subpixels(wind.xbin, wind.ybin, ndiv)
         self.mask = _mask(wind, self.x, self.y)
         self.set_mode(mode, fwhm, beta)
 
@@ -831,6 +1332,39 @@ class Mfit:
         self.fwhm = fwhm
         self.beta = beta
 
+        # indices of the free parameters amongst (sky, height, xcen, ycen,
+        # fwhm, beta)
+        self.inds = [
+            n for n, free in enumerate(
+                (
+                    mode.find("s") > -1, True, True, True,
+                    mode.find("f") > -1, mode.find("b") > -1
+                )
+            ) if free
+        ]
+
+        # the last evaluation of the model and derivatives
+        self.last = None
+
+    def evaluate(self, param):
+        """Returns the model and its derivatives with respect to (sky,
+        height, xcen, ycen, fwhm, beta) as 2D and 3D arrays, given a
+        parameter vector. They come from a single call of the fused kernel
+        _moffat_jac and are saved so that calling 'jac' after 'fun' with the
+        same parameters, as least_squares does, costs nothing.
+        """
+        param = np.array(param, dtype=np.float64)
+        if self.last is None or not np.array_equal(self.last[0], param):
+            sky, height, xcen, ycen, fwhm, beta = self.get_par(param)
+            model = np.empty_like(self.x)
+            derivs = np.empty((6,) + self.x.shape)
+            _moffat_jac(
+                self.x, self.y, sky, height, xcen, ycen, fwhm, beta,
+                self.xoffs, self.yoffs, model, derivs
+            )
+            self.last = (param, model, derivs)
+        return self.last[1], self.last[2]
+
     def get_par(self, param):
         """Gets parameters (sky, height, xcen, ycen, fwhm, beta) according to
         current least_squares parameter vector, accounting for the
@@ -897,7 +1431,7 @@ class Mfit:
         elif self.mode == "fb":
             return (height, xcen, ycen, fwhm, beta)
         elif self.mode == "b":
-            reurn(height, xcen, ycen, beta)
+            return (height, xcen, ycen, beta)
         elif self.mode == "f":
             return (height, xcen, ycen, fwhm)
         elif self.mode == "":
@@ -959,44 +1493,10 @@ class Mfit:
         the normalised residuals with respect to the variable
         parameters.
         """
-        sky, height, xcen, ycen, fwhm, beta = self.get_par(param)
-
-        comp_fwhm = self.mode.find("f") > -1
-        comp_beta = self.mode.find("b") > -1
-
-        # work out which derivatives to bother with
-        if self.mode == "sfb":
-            inds = (0, 1, 2, 3, 4, 5)
-        elif self.mode == "sb" or self.mode == "sf":
-            inds = (0, 1, 2, 3, 4)
-        elif self.mode == "s":
-            inds = (0, 1, 2, 3)
-        elif self.mode == "fb":
-            inds = (1, 2, 3, 4, 5)
-        elif self.mode == "b" or self.mode == "f":
-            inds = (1, 2, 3, 4)
-        elif self.mode == "":
-            inds = (1, 2, 3)
-
-        derivs = dmoffat(
-            self.x,
-            self.y,
-            sky,
-            height,
-            xcen,
-            ycen,
-            fwhm,
-            beta,
-            self.xbin,
-            self.ybin,
-            self.ndiv,
-            comp_fwhm,
-            comp_beta,
-        )
-
+        model, derivs = self.evaluate(param)
         ok = self.mask & (self.sigma > 0)
         return np.column_stack(
-            [(-derivs[ind][ok] / self.sigma[ok]).ravel() for ind in inds]
+            [(-derivs[ind][ok] / self.sigma[ok]).ravel() for ind in self.inds]
         )
 
     def model(self, param):
@@ -1015,20 +1515,254 @@ class Mfit:
               physical imaging area; 'fwhm' is the FWHM in unbinned
               pixels; 'beta' is the Moffat exponent.
         """
-        sky, height, xcen, ycen, fwhm, beta = self.get_par(param)
-        return moffat(
-            self.x,
-            self.y,
-            sky,
-            height,
-            xcen,
-            ycen,
-            fwhm,
-            beta,
-            self.xbin,
-            self.ybin,
-            self.ndiv,
+        model, derivs = self.evaluate(param)
+        return model
+
+
+# sub-pixel offset tables, keyed by (xbin, ybin, ndiv)
+_SUBPIXELS = {}
+
+
+def _subpixels(xbin, ybin, ndiv):
+    """Returns 1D arrays of the X and Y offsets from the centre of a pixel
+    binned xbin by ybin of the points over which profiles are averaged when
+    sub-divided by ndiv (see moffat). There is just one point, the centre,
+    if ndiv == 0. The tables are cached since they rarely change.
+    """
+    key = (xbin, ybin, ndiv)
+    if key not in _SUBPIXELS:
+        if ndiv > 0:
+            # mean offset within sub-pixels
+            soff = (ndiv - 1) / (2 * ndiv)
+            xoffs, yoffs = [], []
+            for iy in range(ybin):
+                yoff = iy - (ybin - 1) / 2 - soff
+                for ix in range(xbin):
+                    xoff = ix - (xbin - 1) / 2 - soff
+                    for isy in range(ndiv):
+                        for isx in range(ndiv):
+                            xoffs.append(xoff + isx / ndiv)
+                            yoffs.append(yoff + isy / ndiv)
+        else:
+            xoffs, yoffs = [0.0], [0.0]
+        _SUBPIXELS[key] = (np.array(xoffs), np.array(yoffs))
+    return _SUBPIXELS[key]
+
+
+@jit(nopython=True, cache=True)
+def _moffat_jac(x, y, sky, height, xcen, ycen, fwhm, beta, xoffs, yoffs, model, derivs):
+    """Computes a Moffat profile plus constant and all six of its partial
+    derivatives in a single pass, sharing the radial terms between them.
+    This is equivalent to calling moffat and dmoffat, but the sub-pixel
+    positions come from tables of offsets (see _subpixels).
+
+    Parameters:
+
+      x, y : 2D numpy arrays
+         the X and Y ordinates, unbinned pixels.
+
+      sky, height, xcen, ycen, fwhm, beta : floats
+         the profile parameters. See moffat.
+
+      xoffs, yoffs : 1D numpy arrays
+         offsets of the points to average over within each pixel.
+
+      model : 2D numpy array
+         returned with the profile.
+
+      derivs : 3D numpy array
+         returned with the derivatives with respect to (sky, height, xcen,
+         ycen, fwhm, beta), in that order along the first axis.
+    """
+    tbeta = max(0.01, beta)
+    alpha = 4 * (2 ** (1 / tbeta) - 1) / fwhm ** 2
+
+    # factors for the derivatives. beta is a bit complicated because it
+    # appears directly through the exponent but also indirectly through alpha
+    fcen = 2 * alpha * tbeta
+    ffwhm = fcen / fwhm
+    fbeta = 4.0 * np.log(2) * 2 ** (1 / tbeta) / tbeta / fwhm ** 2
+
+    noff = len(xoffs)
+    ny, nx = x.shape
+    for iy in range(ny):
+        for ix in range(nx):
+            sh, sx, sy, sf, sb = 0.0, 0.0, 0.0, 0.0, 0.0
+            for n in range(noff):
+                dx = x[iy, ix] + xoffs[n] - xcen
+                dy = y[iy, ix] + yoffs[n] - ycen
+                rsq = dx ** 2 + dy ** 2
+                denom = 1 + alpha * rsq
+                dh = denom ** (-tbeta)
+                save1 = height * dh / denom
+                save2 = save1 * rsq
+                sh += dh
+                sx += dx * save1
+                sy += dy * save1
+                sf += save2
+                sb += fbeta * save2 - np.log(denom) * height * dh
+
+            model[iy, ix] = sky + height * sh / noff
+            derivs[0, iy, ix] = 1.0
+            derivs[1, iy, ix] = sh / noff
+            derivs[2, iy, ix] = fcen * sx / noff
+            derivs[3, iy, ix] = fcen * sy / noff
+            derivs[4, iy, ix] = ffwhm * sf / noff
+            derivs[5, iy, ix] = sb / noff
+
+
+@jit(nopython=True, cache=True)
+def _moffats(x, y, param, xoffs, yoffs, noffs):
+    """Evaluates Moffat profiles plus constants and their partial derivatives
+    for a stack of K stamps.
+
+    Parameters:
+
+      x, y : 3D numpy arrays
+         (K,ny,nx) X and Y ordinates of the stamps in unbinned pixels
+
+      param : 2D numpy array
+         (K,6) array of (sky, height, xcen, ycen, fwhm, beta) for each stamp
+
+      xoffs, yoffs : 2D numpy arrays
+         sub-pixel offset tables of each stamp (see _subpixels), padded
+         to a common length.
+
+      noffs : 1D numpy array
+         the number of offsets of each stamp
+
+    Returns:: (model, derivs), a (K,ny,nx) array of the profiles and a
+    (K,6,ny,nx) array of their derivatives with respect to each parameter.
+    """
+    nstamp, ny, nx = x.shape
+    model = np.empty((nstamp, ny, nx))
+    derivs = np.empty((nstamp, 6, ny, nx))
+    for k in range(nstamp):
+        _moffat_jac(
+            x[k], y[k], param[k, 0], param[k, 1], param[k, 2], param[k, 3],
+            param[k, 4], param[k, 5], xoffs[k, : noffs[k]],
+            yoffs[k, : noffs[k]], model[k], derivs[k]
         )
+    return model, derivs
+
+
+@jit(nopython=True, cache=True, parallel=True)
+def _moffats_parallel(x, y, param, xoffs, yoffs, noffs):
+    """Multi-threaded version of _moffats, with the stamps split between
+    threads. Worth it for large stacks of heavily sub-divided pixels."""
+    nstamp, ny, nx = x.shape
+    model = np.empty((nstamp, ny, nx))
+    derivs = np.empty((nstamp, 6, ny, nx))
+    for k in prange(nstamp):
+        _moffat_jac(
+            x[k], y[k], param[k, 0], param[k, 1], param[k, 2], param[k, 3],
+            param[k, 4], param[k, 5], xoffs[k, : noffs[k]],
+            yoffs[k, : noffs[k]], model[k], derivs[k]
+        )
+    return model, derivs
+
+
+def _lm_moffats(
+    param, free, data, sigma, mask, x, y, xoffs, yoffs, noffs, max_nfev,
+    parallel=False, ftol=1.0e-8, xtol=1.0e-8
+):
+    """Levenberg-Marquardt minimisation of chi**2 for a stack of K Moffat
+    profile fits at once. All fits take a step each iteration, dropping out
+    as they converge. Fixed parameters are held by zeroing their
+    derivatives. Arguments are (K,6) arrays of starting parameters and free
+    flags, and (K,ny,nx) stacks of data, uncertainties (rejected if <= 0),
+    masks and ordinates, then the sub-pixel offset tables as for _moffats.
+    The multi-threaded _moffats_parallel is used if `parallel` is True.
+
+    Returns (param, nfev, status), the final parameters, the number of
+    evaluations and a status for each fit: 1 converged, 0 reached the
+    maximum number of evaluations, -1 failed.
+    """
+    nstamp, npar = param.shape
+    param = param.copy()
+    wgt = np.where(mask & (sigma > 0), 1.0 / np.abs(sigma), 0.0)
+    maxfev = 100 * free.sum(1) if max_nfev is None else np.full(nstamp, max_nfev)
+
+    moffats = _moffats_parallel if parallel else _moffats
+
+    def evaluate(inds, par):
+        # normalised residuals and their Jacobians, (n,N) and (n,6,N)
+        model, derivs = moffats(
+            x[inds], y[inds], par, xoffs[inds], yoffs[inds], noffs[inds]
+        )
+        w = wgt[inds]
+        res = ((data[inds] - model) * w).reshape(len(inds), -1)
+        jac = (-derivs * (w[:, None] * free[inds][:, :, None, None])).reshape(
+            len(inds), npar, -1
+        )
+        return res, jac
+
+    res, jac = evaluate(np.arange(nstamp), param)
+    chisq = (res ** 2).sum(1)
+    nfev = np.ones(nstamp, dtype=int)
+    lam = np.full(nstamp, 1.0e-3)
+    status = np.where(np.isfinite(chisq), 0, -1)
+    active = status == 0
+    eye = np.eye(npar)
+
+    while active.any():
+        inds = np.flatnonzero(active)
+
+        # damped normal equations. Fixed parameters have zero rows and
+        # columns and so just get the damping term, which stops them moving
+        J, r = jac[inds], res[inds]
+        alpha = J @ J.transpose(0, 2, 1)
+        grad = (J @ r[:, :, None])[:, :, 0]
+        diag = alpha.diagonal(axis1=1, axis2=2)
+        scale = np.where(diag > 0, diag, 1.0)
+        alpha = alpha + (lam[inds, None] * scale)[:, :, None] * eye
+
+        try:
+            delta = -np.linalg.solve(alpha, grad[:, :, None])[:, :, 0]
+        except np.linalg.LinAlgError:
+            # fall back to one at a time to isolate the culprits
+            delta = np.zeros_like(grad)
+            for n in range(len(inds)):
+                try:
+                    delta[n] = -np.linalg.solve(alpha[n], grad[n])
+                except np.linalg.LinAlgError:
+                    status[inds[n]] = -1
+                    active[inds[n]] = False
+            keep = active[inds]
+            inds, delta = inds[keep], delta[keep]
+            if len(inds) == 0:
+                continue
+
+        trial = param[inds] + delta
+        tres, tjac = evaluate(inds, trial)
+        tchisq = (tres ** 2).sum(1)
+        nfev[inds] += 1
+
+        # accept steps that reduce chi**2, lowering the damping, and reject
+        # the rest, increasing it
+        old = chisq[inds]
+        better = tchisq <= old
+        acc = inds[better]
+        param[acc] = trial[better]
+        res[acc] = tres[better]
+        jac[acc] = tjac[better]
+        chisq[acc] = tchisq[better]
+        lam[acc] /= 10
+        lam[inds[~better]] *= 10
+
+        # convergence on either a small fractional change of chi**2 or a
+        # small step
+        small = np.sqrt((delta ** 2).sum(1)) <= xtol * (
+            np.sqrt((trial ** 2).sum(1)) + xtol
+        )
+        done = (better & (old - tchisq <= ftol * old)) | small
+        status[inds[done]] = 1
+        active[inds[done]] = False
+
+        over = active[inds] & (nfev[inds] >= maxfev[inds])
+        active[inds[over]] = False
+
+    return param, nfev, status
 
 
 ##########################################
@@ -1052,6 +1786,7 @@ def fitGaussian(
     thresh,
     ndiv,
     max_nfev=0,
+    max_reject=None,
 ):
     """Fits the profile of one target in an Window with a 2D symmetric Gaussian
     profile "c + h*exp(-alpha*r**2)" where r is the distance from the centre
@@ -1127,6 +1862,10 @@ def fitGaussian(
             maximum number of function evaluations during fits. Passed directly
             to leastsq.
 
+        max_reject : int or None
+            maximum number of passes of pixel rejection followed by a re-fit.
+            None for no limit.
+
     Returns:: tuple of tuples
 
         (pars, sigs, extras) where::
@@ -1165,6 +1904,7 @@ def fitGaussian(
     gfit = Gfit(wind, read, gain, ndiv, mode, fwhm)
 
     mode_switch = False
+    npass = 0
 
     while True:
 
@@ -1216,12 +1956,15 @@ def fitGaussian(
             nok1 = len(resid[ok])
             sfac = np.sqrt(chisq / nok1)
 
-            # reject any above the defined threshold
-            gfit.sigma[ok & (np.abs(resid) > sfac * thresh)] *= -1
+            # reject any above the defined threshold, unless the limit
+            # on the number of rejection passes has been reached
+            if max_reject is None or npass < max_reject:
+                gfit.sigma[ok & (np.abs(resid) > sfac * thresh)] *= -1
 
             # check whether any have been rejected
             ok = gfit.mask & (gfit.sigma > 0)
             nok = len(gfit.sigma[ok])
+            npass += 1
 
             if nok == nok1:
                 # no more pixels have been rejected.  calculate how
@@ -718,6 +718,85 @@ class Rhead:
 
         return (tmid, texp, flag)
 
+    def timings(self, tbytes):
+        """Decodes the timing bytes of many frames at once, returning times
+        for each CCD in one pass. The array equivalent of running
+        :func:`htimer` and :meth:`timing` frame by frame.
+
+        Arguments::
+
+           tbytes : 2D numpy.ndarray
+              (nframe, ntbytes) array of unsigned bytes, each row containing
+              the timing bytes of one frame, e.g. from :meth:`Rtbytes.read_block`.
+
+        Returns: (nframes, tstamps, mjds, texps, goods) where 'nframes' are the
+        frame numbers (starting at 1) and 'tstamps' the MJDs (UTC) of the raw
+        GPS timestamps, both 1D arrays, while 'mjds', 'texps' and 'goods' are
+        (nframe,5) arrays giving for each frame and CCD the MJD at
+        mid-exposure, the exposure time in seconds and whether the time is
+        thought to be good. These match the per-CCD header items MJDUTC,
+        EXPTIME and GOODTIME of the :class:`MCCD` objects made by
+        :class:`Rdata`.
+        """
+        (
+            frameCount,
+            timeStampCount,
+            years,
+            day_of_year,
+            hours,
+            mins,
+            seconds,
+            nanoseconds,
+            nsats,
+            synced,
+        ) = htimers(tbytes)
+        nframes = frameCount.astype(np.int64) + 1
+
+        # MJD of the first day of each year, as in gregorian_to_mjd
+        years = years.astype(np.int64) - 1
+        cent = years // 100
+        imjd = (
+            2
+            - cent
+            + cent // 4
+            + np.floor(365.25 * years).astype(np.int64)
+            + int(30.6001 * 14)
+            - 679006
+            + day_of_year
+        )
+        fday = (hours + mins / 60 + (seconds + nanoseconds / 1e9) / 3600) / 24
+
+        # invalid timestamps are treated as in Rdata
+        bad = years < 1581
+        imjd[bad] = 51544
+        fday[bad] = nframes[bad] / DAYSEC
+        goodtime = ~(((nsats == -1) & (synced == -1)) | (synced == 0) | bad)
+
+        mjds = np.empty((len(nframes), 5))
+        texps = np.empty((len(nframes), 5))
+        goods = np.empty((len(nframes), 5), dtype=bool)
+        for nccd, nskip in enumerate(self.nskips):
+            # vectorised version of 'timing'
+            first = nframes == nskip + 1
+            tmid = np.where(
+                first,
+                (self.toff1 - self.tdelta * nskip / 2) / DAYSEC,
+                (self.toff2 - self.tdelta * nskip / 2) / DAYSEC,
+            )
+            fdaymid = fday + tmid
+            wrap = fdaymid >= 1.0
+            mjds[:, nccd] = np.where(
+                wrap, (imjd + 1) + (fdaymid - 1), imjd + fdaymid
+            )
+            texps[:, nccd] = np.where(
+                first,
+                self.tdelta * nskip + self.toff3,
+                self.tdelta * nskip + self.toff4,
+            )
+            goods[:, nccd] = goodtime & (nframes % (nskip + 1) == 0)
+
+        return (nframes, imjd + fday, mjds, texps, goods)
+
     def __del__(self):
         """Destructor closes the file or web socket"""
         if self.server:
@@ -758,9 +837,30 @@ class Rdata(Rhead):
     inefficient memory-wise but it is safer than leaving a 2-bytes ints which
     can bite you.
 
+    For large local runs, `mmap=True` maps the file into memory once rather
+    than reading each frame into a fresh buffer. The windows of each frame are
+    then de-multiplexed as strided views straight into the map and are only
+    converted to 32-bit floats (including the FITS BZERO offset) once, as the
+    Windows are created::
+
+      >> for mccd in Rdata('run045', mmap=True):
+      >>    ...
+
+    At high frame rates, much of the time can go into building the MCCD
+    objects and their arrays afresh for every frame. With `reuse=n`, the
+    MCCD returned n calls earlier is recycled instead, its arrays being
+    overwritten with the data of the new frame and only the per-frame header
+    items being updated. Frames can also be handed back explicitly with
+    :meth:`recycle`. Either way, a recycled frame must no longer be in use::
+
+      >> for mccd in Rdata('run045', reuse=1):
+      >>    ... (mccd is overwritten by the next frame)
+
     """
 
-    def __init__(self, fname, nframe=1, server=False, full=True):
+    def __init__(
+        self, fname, nframe=1, server=False, full=True, mmap=False, reuse=0
+    ):
         """Connects to a raw HiPERCAM FITS file for reading. The file is kept
         open.  The Rdata object can then generate MCCD objects through being
         called as a function or iterator.
@@ -790,11 +890,36 @@ class Rdata(Rhead):
               for as much detail as possible; False for minimal headers which
               require less resources downstream.
 
+           mmap : bool
+              True to memory-map a local file rather than reading it frame by
+              frame. This saves a copy of each frame, which matters for large
+              format, high frame-rate runs. It is ignored for server access.
+
+           reuse : int
+              0 to create new MCCDs for every frame. n > 0 to recycle the MCCD
+              returned n calls earlier for the current frame, so that no more
+              than n MCCDs returned by the Rdata are valid at any one time.
+              Frames whose format has been changed, e.g. by trimming or
+              conversion to another data type, are not recycled.
+
         """
 
         # read the header
         Rhead.__init__(self, fname, server, full)
 
+        # memory map of the frames, if wanted
+        self._mmap = None
+        if mmap and not server:
+            self.map_frames()
+
+        # recycled MCCDs ready to be re-filled, the frames returned most
+        # recently if they are to be recycled automatically, and the format
+        # of the MCCDs produced, used to check what is recycled.
+        self.reuse = int(reuse)
+        self._pool = []
+        self._recent = []
+        self._format = None
+
         # flag to indicate should always try to get the last frame
         self.last = nframe == 0
 
@@ -948,16 +1073,24 @@ class Rdata(Rhead):
                 # move to correct place
                 self.seek_frame(nframe)
 
-            # read in frame and then the timing data, correcting the frame for
-            # the standard FITS BZERO offset. At this stage we have the data
-            # as unsigned 2-byte ints
-            frame = np.fromfile(
-                self._ffile, ">u2", (self._framesize - self.ntbytes) // 2
-            )
-            frame += BZERO
-            tbytes = self._ffile.read(self.ntbytes)
-            if len(tbytes) != self.ntbytes:
-                raise HendError("failed to read frame from disk file")
+            if self._mmap is None:
+                # read in frame and then the timing data, correcting the frame
+                # for the standard FITS BZERO offset. At this stage we have
+                # the data as unsigned 2-byte ints
+                frame = np.fromfile(
+                    self._ffile, ">u2", (self._framesize - self.ntbytes) // 2
+                )
+                frame += BZERO
+                tbytes = self._ffile.read(self.ntbytes)
+                if len(tbytes) != self.ntbytes:
+                    raise HendError("failed to read frame from disk file")
+
+            else:
+                # memory-mapped file. No data are read here: 'frame' is just a
+                # view of the signed 2-byte ints of the frame in the map. The
+                # BZERO offset is applied on conversion to floats.
+                frame, tbytes = self._map_frame(self.nframe)
+                self._ffile.seek(self._framesize, 1)
 
         ##############################################################
         #
@@ -1027,9 +1160,20 @@ class Rdata(Rhead):
             # this will mark it as unreliable down below
             synced = 0
 
-        # copy over the top-level header to avoid it becoming a reference
-        # common to all MCCDs produced by the routine
-        thead = self.thead.copy()
+        if self.reuse and len(self._recent) == self.reuse:
+            # recycle the oldest frame still valid
+            self.recycle(self._recent.pop(0))
+
+        if self._pool:
+            # re-use the arrays and headers of a recycled frame. Only the
+            # per-frame header items are changed below.
+            mccd = self._pool.pop()
+            thead = mccd.head
+        else:
+            # copy over the top-level header to avoid it becoming a reference
+            # common to all MCCDs produced by the routine
+            mccd = None
+            thead = self.thead.copy()
 
         year, month, day = mjd_to_gregorian(imjd)
         hour, minute, second = fday_to_hms(fday)
@@ -1058,8 +1202,12 @@ class Rdata(Rhead):
         ccds = Group(CCD)
         for nccd, (cnam, chead) in enumerate(zip(CNAMS, self.cheads)):
 
-            # Explicitly copy each header to avoid propagation of references
-            ch = chead.copy()
+            if mccd is None:
+                # Explicitly copy each header to avoid propagation of references
+                ch = chead.copy()
+            else:
+                # the CCD header of the recycled frame
+                ch = mccd[cnam].head
 
             # Determine whether the frame really contains data as
             # opposed to initial junk frames in the case of drift
@@ -1088,11 +1236,12 @@ class Rdata(Rhead):
             ch["GOODTIME"] = (flag and thead["GOODTIME"], "MJDs OK?")
             ch["EXPTIME"] = (texp, "Exposure time (secs)")
 
-            # store for later recovery when creating the Windows
-            cheads[cnam] = ch
+            if mccd is None:
+                # store for later recovery when creating the Windows
+                cheads[cnam] = ch
 
-            # Create the CCDs
-            ccds[cnam] = CCD(Group(Window), HCM_NXTOT, HCM_NYTOT)
+                # Create the CCDs
+                ccds[cnam] = CCD(Group(Window), HCM_NXTOT, HCM_NYTOT)
 
         # npixel points to the start pixel of the set of windows under
         # consideration
@@ -1126,6 +1275,12 @@ class Rdata(Rhead):
                     allwins, strides=(32, 2, 160, 8), shape=(5, 4, len(frame) // 80, 4)
                 ).reshape(5, 4, win.ny, win.nx)
 
+            if mccd is not None:
+                # overwrite the Windows of the recycled frame
+                self._fill(mccd, data, nwin)
+                npixel += nchunk
+                continue
+
             # now build the Windows. This is where we chop off any pre- and
             # over-scan
 
@@ -1183,7 +1338,7 @@ class Rdata(Rhead):
                             # (outputs are on the left). Create the Window
                             # with the image data, stripping off the prescan
                             ccds[cnam][wnam] = Window(
-                                winh, windata[:, self.npscan :].astype(np.float32), True
+                                winh, self._flt(windata[:, self.npscan :]), True
                             )
 
                             # Store the prescan itself
@@ -1200,7 +1355,7 @@ class Rdata(Rhead):
 
                             # Create the Window with the pre-scan
                             ccds[cnam][wpnam] = Window(
-                                winp, windata[:, : self.npscan].astype(np.float32), True
+                                winp, self._flt(windata[:, : self.npscan]), True
                             )
 
                         else:
@@ -1208,7 +1363,7 @@ class Rdata(Rhead):
                             # image data, stripping off the prescan
                             ccds[cnam][wnam] = Window(
                                 winh,
-                                windata[:, : -self.npscan].astype(np.float32),
+                                self._flt(windata[:, : -self.npscan]),
                                 True,
                             )
 
@@ -1227,7 +1382,7 @@ class Rdata(Rhead):
                             # Create the Window with the pre-scan
                             ccds[cnam][wpnam] = Window(
                                 winp,
-                                windata[:, -self.npscan :].astype(np.float32),
+                                self._flt(windata[:, -self.npscan :]),
                                 True,
                             )
 
@@ -1238,7 +1393,7 @@ class Rdata(Rhead):
                             # store CCD header in the first Winhead
                             win.update(cheads[cnam])
 
-                        ccds[cnam][wnam] = Window(win, windata.astype(np.float32), True)
+                        ccds[cnam][wnam] = Window(win, self._flt(windata), True)
 
                     if self.oscan:
                         # over-scan present. Leave any stripped pre-scans
@@ -1297,8 +1452,14 @@ class Rdata(Rhead):
             # move pointer on for next set of windows
             npixel += nchunk
 
-        # create the MCCD
-        mccd = MCCD(ccds, thead)
+        if mccd is None:
+            # create the MCCD
+            mccd = MCCD(ccds, thead)
+            if self._format is None:
+                self._format = _format(mccd)
+
+        if self.reuse:
+            self._recent.append(mccd)
 
         # update the frame counter for the next call
         self.nframe += 1
@@ -1309,6 +1470,225 @@ class Rdata(Rhead):
         # at last, return with the MCCD
         return mccd
 
+    def read_block(self, first, n):
+        """Reads a block of n frames starting at frame number `first` from a
+        local file in one go. Rather than a series of :class:`MCCD` objects,
+        the pixel data are returned as arrays covering all frames at once,
+        suitable for NumPy reductions over the frame axis. Fewer than n
+        frames are returned if the run ends first. The frame pointer of the
+        :class:`Rdata` is left unchanged.
+
+        Arguments::
+
+           first : int
+              the first frame to read, starting at 1.
+
+           n : int
+              the maximum number of frames to read.
+
+        Returns: (data, nframes, mjds, texps, goods, dstatus) where 'data'
+        is a list with one 32-bit float array per window set of the readout
+        mode (i.e. 1 or 2 entries), each of dimensions (n,5,4,ny,nx) indexed
+        by frame, CCD, quadrant (in EFGH order, so that e.g. [:,2,1] is
+        window 'F1' of CCD '3' for the first window set), Y and X. The arrays
+        are oriented as the equivalent :class:`Window` objects would be, but
+        any pre- or over-scan pixels have not been split off. 'nframes' is a
+        1D int array of the frame numbers, while 'mjds', 'texps', 'goods' and
+        'dstatus' are all (n,5) arrays, giving for each frame and CCD the
+        MJD at mid-exposure, the exposure time (seconds), whether the time is
+        thought to be OK and whether the frame contains valid data (as
+        opposed to a junk frame). These match the per-CCD header items
+        MJDUTC, EXPTIME, GOODTIME and DSTATUS of the :class:`MCCD` objects.
+
+        This is not implemented for the server.
+        """
+        if self.server:
+            raise NotImplementedError("no read_block in the case of server access")
+
+        if self._mmap is None:
+            ntot = self.ntotal()
+        else:
+            if self._framesize * (first + n - 1) > len(self._mmap):
+                # pick up any frames added since the file was mapped
+                self.map_frames()
+            ntot = len(self._mmap) // self._framesize
+        n = min(n, ntot - first + 1)
+        if first < 1 or n < 1:
+            raise HendError("no frames to read from disk file")
+
+        # read all bytes of all frames in one go
+        if self._mmap is None:
+            self._ffile.seek(self._hbytes + self._framesize * (first - 1))
+            raw = np.fromfile(self._ffile, np.uint8, n * self._framesize)
+            if len(raw) != n * self._framesize:
+                raise HendError("failed to read block of frames from disk file")
+            self.seek_frame(self.nframe)
+        else:
+            start = self._framesize * (first - 1)
+            raw = np.asarray(self._mmap[start : start + n * self._framesize])
+        raw = raw.reshape(n, self._framesize)
+
+        # split into the pixels as signed 2-byte ints without the BZERO
+        # offset, and the timing bytes.
+        pixels = raw[:, : self._framesize - self.ntbytes].view(">i2")
+        tbytes = raw[:, self._framesize - self.ntbytes :]
+
+        # de-multiplex each set of windows, with frame number as the leading
+        # axis of the same strided views used for single frames
+        nsamps = self.header.get("ESO DET NSAMP", 4)
+        fstride = pixels.strides[0]
+        data, npixel = [], 0
+        for nwin in self.nwins:
+            win = self.windows[nwin][0][0][0]
+            nchunk = 20 * win.nx * win.ny
+            allwins = pixels[:, npixel : npixel + nchunk]
+            if nsamps == 4:
+                block = as_strided(
+                    allwins,
+                    strides=(fstride, 8, 2, 40 * win.nx, 40),
+                    shape=(n, 5, 4, win.ny, win.nx),
+                )
+            else:
+                block = as_strided(
+                    allwins,
+                    strides=(fstride, 32, 2, 160, 8),
+                    shape=(n, 5, 4, nchunk // 80, 4),
+                ).reshape(n, 5, 4, win.ny, win.nx)
+
+            # apply the BZERO offset, conversion to floats and flips in
+            # one pass per window
+            out = np.empty((n, 5, 4, win.ny, win.nx), np.float32)
+            for nccd in range(5):
+                for nquad in range(4):
+                    flip_axes = self.windows[nwin][nccd][nquad][1]
+                    windata = block[:, nccd, nquad]
+                    for ax in flip_axes:
+                        windata = np.flip(windata, ax + 1)
+                    np.add(windata, np.float32(BZERO), out[:, nccd, nquad])
+            data.append(out)
+            npixel += nchunk
+
+        # decode the timing bytes
+        nframes, tstamps, mjds, texps, goods = self.timings(tbytes)
+        dstatus = np.empty((n, 5), bool)
+        for nccd, nskip in enumerate(self.nskips):
+            dstatus[:, nccd] = (nframes > self.ndwins) & (nframes % (nskip + 1) == 0)
+
+        return (data, nframes, mjds, texps, goods, dstatus)
+
+    def map_frames(self):
+        """Memory-maps all complete frames of a local file. This is called by
+        the initialiser if `mmap=True`, and again whenever a frame beyond the
+        end of the map is requested, to pick up any frames added since.
+
+        This is not implemented for the server.
+        """
+        if self.server:
+            raise NotImplementedError("no map_frames in the case of server access")
+
+        # number of complete frames actually present, which can be fewer than
+        # NAXIS3 if the file is still being written.
+        nbytes = os.fstat(self._ffile.fileno()).st_size - self._hbytes
+        nframes = min(self.ntotal(), nbytes // self._framesize)
+
+        if nframes > 0:
+            self._mmap = np.memmap(
+                self._ffile,
+                np.uint8,
+                "r",
+                self._hbytes,
+                (nframes * self._framesize,),
+            )
+        else:
+            self._mmap = np.empty(0, np.uint8)
+
+    def _map_frame(self, nframe):
+        """Returns (frame, tbytes) for frame number nframe of the memory
+        map. 'frame' is a view of the pixels as signed 2-byte ints without the
+        BZERO offset applied; 'tbytes' are the timing bytes. Raises a HendError
+        if the frame is not in the map.
+        """
+        start = self._framesize * (nframe - 1)
+        end = start + self._framesize
+        if nframe >= 1 and end > len(self._mmap):
+            # the file may have grown since it was mapped
+            self.map_frames()
+        if nframe < 1 or end > len(self._mmap):
+            raise HendError("failed to read frame from memory-mapped file")
+        frame = np.asarray(self._mmap[start : end - self.ntbytes]).view(">i2")
+        tbytes = self._mmap[end - self.ntbytes : end].tobytes()
+        return (frame, tbytes)
+
+    def recycle(self, mccd):
+        """Hands back an MCCD returned earlier so that its arrays and headers
+        can be re-used for a later frame. The MCCD must not be used after
+        this. MCCDs whose format no longer matches that of the frames, e.g.
+        after trimming, are ignored. This is done automatically if the
+        :class:`Rdata` was created with `reuse` > 0.
+        """
+        if _format(mccd) == self._format and all(
+            mccd is not pccd for pccd in self._pool
+        ):
+            self._pool.append(mccd)
+
+    def _fill(self, mccd, data, nwin):
+        """Overwrites the Windows of set nwin (0 or 1) of the recycled MCCD
+        'mccd' with the de-multiplexed 'data' of a new frame, indexed by
+        (ccd,window,y,x). This does what __call__ does when it creates the
+        Windows, including splitting off of any pre- and over-scans, but
+        without creating any new objects.
+        """
+        for nccd, ccd in enumerate(mccd.values()):
+            for nquad, qnam in enumerate(QNAMS):
+                wnam = "{:s}{:d}".format(qnam, nwin + 1)
+                if nccd in REFLECTED:
+                    # reflections for g (1) and z (4)
+                    qnam = QNAMS_REFLECT[qnam]
+
+                # get the window data and apply flips.
+                windata = data[nccd, nquad]
+                for ax in self.windows[nwin][nccd][nquad][1]:
+                    windata = np.flip(windata, ax)
+
+                if self.pscan:
+                    # prescans are on the left of quadrants E and H
+                    wpnam = "{:s}P".format(wnam)
+                    if qnam == "E" or qnam == "H":
+                        self._flt(windata[:, : self.npscan], ccd[wpnam].data)
+                        windata = windata[:, self.npscan :]
+                    else:
+                        self._flt(windata[:, -self.npscan :], ccd[wpnam].data)
+                        windata = windata[:, : -self.npscan]
+
+                if self.oscan:
+                    # overscans are at the top of quadrants E and F
+                    wonam = "{:s}O".format(wnam)
+                    if qnam == "E" or qnam == "F":
+                        self._flt(windata[-self.noscan :, :], ccd[wonam].data)
+                        windata = windata[: -self.noscan, :]
+                    else:
+                        self._flt(windata[: self.noscan, :], ccd[wonam].data)
+                        windata = windata[self.noscan :, :]
+
+                self._flt(windata, ccd[wnam].data)
+
+    def _flt(self, data, out=None):
+        """Converts window data to 32-bit floats, into the array 'out' if it is
+        set. Data straight from the memory map have the BZERO offset added in
+        the same pass."""
+        if self._mmap is None:
+            if out is None:
+                return data.astype(np.float32)
+            np.copyto(out, data)
+            return out
+        else:
+            return np.add(data, np.float32(BZERO), out=out, dtype=np.float32)
+
+    def __del__(self):
+        """Destructor releases any memory map before closing the file"""
+        self._mmap = None
+        super().__del__()
+
     def seek_frame(self, n):
         """
         Moves pointer position to the start of frame n and
@@ -1344,6 +1724,16 @@ class Rdata(Rhead):
         return ntot
 
 
+def _format(mccd):
+    """Returns a summary of the format of an MCCD, used to check that recycled
+    frames can be re-filled."""
+    return [
+        (cnam, wnam, wind.llx, wind.lly, wind.data.shape, wind.data.dtype)
+        for cnam, ccd in mccd.items()
+        for wnam, wind in ccd.items()
+    ]
+
+
 class Rtbytes(Rhead):
     """Callable, iterable object to returns timing bytes from HiPERCAM raw
     data files.
@@ -1468,6 +1858,43 @@ class Rtbytes(Rhead):
 
         return tbytes
 
+    def read_block(self, first, n):
+        """Reads the timing bytes of up to `n` consecutive frames starting at
+        frame number `first` (1 is the first) in one go, ready to be decoded
+        with :func:`htimers` or :meth:`Rhead.timings`. Only local disk files
+        are supported. The frame pointer used for sequential reads is not
+        changed.
+
+        Arguments::
+
+           first : int
+              the first frame to read, starting at 1.
+
+           n : int
+              maximum number of frames to read. Fewer will be returned if the
+              end of the run is reached.
+
+        Returns:: (nframe,ntbytes) numpy.ndarray of unsigned bytes.
+        """
+        if self.server:
+            raise NotImplementedError(
+                "read_block is only available for local disk files"
+            )
+
+        n = min(n, self.ntotal() - first + 1)
+        if first < 1 or n < 1:
+            raise HendError("no more frames to access")
+
+        # map the frames so that only the pages holding the timing bytes at
+        # the end of each frame are actually read
+        offset = self._hbytes + self._framesize * (first - 1)
+        if os.fstat(self._ffile.fileno()).st_size < offset + self._framesize * n:
+            raise HendError("failed to read timing bytes")
+        raw = np.memmap(
+            self._ffile, np.uint8, "r", offset, (n, self._framesize)
+        )
+        return np.array(raw[:, -self.ntbytes :])
+
 
 class Rtime(Rtbytes):
     """Callable, iterable object to generate timing data only from HiPERCAM raw data files.
@@ -1586,6 +2013,52 @@ def htimer(tbytes):
     return struct.unpack("<IIIIIIIIbb", buf)
 
 
+# layout of the timing bytes once unmangled, as used by htimer
+HTIMER_DTYPE = np.dtype(
+    [
+        ("frameCount", "<u4"),
+        ("timeStampCount", "<u4"),
+        ("years", "<u4"),
+        ("day_of_year", "<u4"),
+        ("hours", "<u4"),
+        ("mins", "<u4"),
+        ("seconds", "<u4"),
+        ("nanoseconds", "<u4"),
+        ("nsats", "i1"),
+        ("synced", "i1"),
+    ]
+)
+
+
+def htimers(tbytes):
+    """Array version of :func:`htimer` to decode the timing bytes of many
+    frames at once.
+
+    Parameters
+    ----------
+
+       tbytes: (2D numpy.ndarray)
+           (nframe, ntbytes) array of unsigned bytes, each row containing
+           the timestamp bytes of one frame as written in the FITS file, as
+           returned by :meth:`Rtbytes.read_block` for instance.
+
+    Returns
+    --------
+
+      timestamps : (tuple)
+          a tuple of 1D arrays, one element per frame, containing
+          (frameCount, timeStampCount, years, day_of_year, hours, mins,
+          seconds, nanoseconds, nsats, synced) values.
+    """
+    tbytes = np.atleast_2d(tbytes)
+
+    # same steps as htimer, but on all frames at once
+    vals = np.ascontiguousarray(tbytes[:, -36:-2]).view(">i2").astype(np.int32)
+    vals += BZERO
+    buf = np.ascontiguousarray(vals.astype("<u2")).view(HTIMER_DTYPE)[:, 0]
+    return tuple(buf[name] for name in HTIMER_DTYPE.names)
+
+
 class HendError(HipercamError):
     """
     Exception for the standard way to reach the end of a HiPERCAM raw data
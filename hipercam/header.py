@@ -36,6 +36,10 @@ class Header:
 
     SPECIAL_KEYWORDS = ("COMMENT", "HISTORY", "")
 
+    # attributes that are set only once the parsing of a deferred header
+    # takes place. See _defer
+    DEFERRED = ("cards", "_lookup", "_hstart", "_hstop", "_cstart", "_cstop")
+
     def __init__(self, head=None, copy=False):
         """Initialiser. 'head' can be (i) another Header, (ii) an ordered
         dictionary with values set to 2-element tuples containing
@@ -157,6 +161,34 @@ class Header:
         if self._hstart == -1:
             self._hstart = self._hstop = len(self.cards)
 
+    def _defer(self, raw, skip=()):
+        """Replaces the contents of the Header with a FITS header supplied as
+        the raw bytes of its 80-character cards, but only parses it when its
+        contents are first needed. This saves time when reading files in
+        which most headers are never looked at. Keywords in 'skip' are
+        deleted once the header has been parsed.
+        """
+        for name in Header.DEFERRED:
+            self.__dict__.pop(name, None)
+        self._raw = (raw, skip)
+
+    def __getattr__(self, name):
+        # only called when 'name' is not found in the usual way, as is the
+        # case for the card attributes of a header deferred by _defer
+        if name in Header.DEFERRED and "_raw" in self.__dict__:
+            raw, skip = self.__dict__.pop("_raw")
+            Header.__init__(self, FITS_Header.fromstring(raw.decode("ascii")))
+            for key in skip:
+                if key in self:
+                    del self[key]
+            return getattr(self, name)
+
+        raise AttributeError(
+            "{:s} object has no attribute {:s}".format(
+                self.__class__.__name__, name
+            )
+        )
+
     @property
     def to_fits(self):
         """Returns the Header as an astropy.io.fits.Header
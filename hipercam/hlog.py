@@ -23,6 +23,8 @@ reflecting problems flagged during reduction.
 
 """
 
+import io
+import os
 import struct
 import warnings
 import numpy as np
@@ -33,7 +35,7 @@ from astropy.stats import sigma_clip
 from .core import *
 from . import utils
 
-__all__ = ("Hlog", "Tseries")
+__all__ = ("Hlog", "HlogFollower", "Tseries")
 
 NaN = float('NaN')
 
@@ -76,6 +78,72 @@ CNAME_TO_FMT = {
 }
 
 
+def _read_header(fin):
+    """Reads the header of a log file written by reduce from the file object
+    'fin', stopping at the end of the data type definitions. Returns
+    (comments, cnames, apnames, dtype_defs), the comment lines and
+    dictionaries keyed by CCD label of the column names, aperture labels and
+    data types, the latter two not including the initial CCD label column.
+    """
+    comments, cnames, apnames, dtype_defs = [], {}, {}, {}
+    read_cnames, read_dtypes = False, False
+
+    for line in fin:
+        if not line.startswith("#"):
+            break
+
+        comments.append(line)
+
+        if line.find("Start of column name definitions") > -1:
+            read_cnames = True
+
+        elif line.find("Start of data type definitions") > -1:
+            read_dtypes = True
+
+        elif read_cnames:
+            if line.find("End of column name definitions") > -1:
+                read_cnames = False
+
+            elif line.find("=") > -1:
+                cnam = line[1 : line.find("=")].strip()
+                cnames[cnam] = line[line.find("=") + 1 :].strip().split()[1:]
+                apnames[cnam] = sorted(
+                    set(
+                        item[item.find("_") + 1 :]
+                        for item in cnames[cnam]
+                        if item.find("_") > -1
+                    )
+                )
+
+        elif read_dtypes:
+            if line.find("End of data type definitions") > -1:
+                # the header ends with a blank comment line
+                comments.append(fin.readline())
+                break
+
+            elif line.find("=") > -1:
+                cnam = line[1 : line.find("=")].strip()
+                dtype_defs[cnam] = line[line.find("=") + 1 :].strip().split()[1:]
+
+    return comments, cnames, apnames, dtype_defs
+
+
+def _convert(lines, dtype):
+    """Converts a list of data lines of one CCD from an ASCII log, stripped
+    of the CCD label, into a structured array of the given dtype with one
+    call to numpy.loadtxt. Booleans are read as integers first."""
+    if len(lines) == 0:
+        return np.empty(0, dtype)
+
+    rdtype = np.dtype(
+        [
+            (name, "i1" if dtype[name] == np.bool_ else dtype[name])
+            for name in dtype.names
+        ]
+    )
+    return np.loadtxt(lines, dtype=rdtype, comments=None, ndmin=1).astype(dtype)
+
+
 class Hlog(dict):
     """Class to represent a HiPERCAM log as produced by reduce.  Based on
     dictionaries, Hlog files contain numpy structured arrays for each CCD
@@ -106,8 +174,8 @@ class Hlog(dict):
        from an ASCII log.
 
     4) 'writable', a flag to say whether the Hlog can be written which
-       at the moment is only true if it has been read from an ASCII
-       |hipercam| log file. Potentially fixable in the future.
+       at the moment is only true if it has been read from an ASCII or
+       binary |hipercam| log file. Potentially fixable in the future.
 
     """
 
@@ -121,7 +189,8 @@ class Hlog(dict):
         """
         Loads a HiPERCAM ASCII log file written by reduce. Each CCD is loaded
         into a separate structured array, returned in a dictionary keyed by
-        the CCD label.
+        the CCD label. The data lines are grouped by CCD and each group is
+        converted in one call to numpy.loadtxt.
 
         Argument::
 
@@ -134,16 +203,7 @@ class Hlog(dict):
         """
 
         hlog = cls()
-        read_cnames = False
-        read_dtypes = False
-        read_data = False
-        dtype_defs = {}
         dtypes = {}
-        struct_types = {}
-        hlog.apnames = {}
-        hlog.cnames = {}
-        hlog.comments = []
-        start = True
 
         if isinstance(fname, (list, tuple, np.ndarray)):
             fnames = fname
@@ -152,117 +212,42 @@ class Hlog(dict):
                 fname,
             ]
 
+        # data lines grouped by CCD, without the CCD label
+        lines = {}
         first = True
 
         for fnam in fnames:
             with open(fnam) as fin:
-                for line in fin:
+                comments, cnames, apnames, dtype_defs = _read_header(fin)
+
+                if first:
+                    # just the first file's header is used
+                    hlog.comments = comments
+                    hlog.cnames = cnames
+                    hlog.apnames = apnames
+                    for cnam in cnames:
+                        dtypes[cnam] = np.dtype(
+                            list(zip(cnames[cnam], dtype_defs[cnam]))
+                        )
+                        lines[cnam] = []
 
+                # the comments continue up to the first line of data
+                start = first
+                for line in fin:
                     if line.startswith("#"):
-
-                        if first:
-                            if start:
-                                hlog.comments.append(line)
-
-                            if line.find("Start of column name definitions") > -1:
-                                read_cnames = True
-
-                            elif line.find("Start of data type definitions") > -1:
-                                read_dtypes = True
-
-                            elif read_cnames:
-                                # reading the column names
-                                if line.find("End of column name definitions") > -1:
-                                    read_cnames = False
-
-                                elif line.find("=") > -1:
-                                    # store the column names
-                                    cnam = line[1 : line.find("=")].strip()
-                                    hlog.cnames[cnam] = (
-                                        line[line.find("=") + 1 :].strip().split()[1:]
-                                    )
-                                    hlog.apnames[cnam] = list(
-                                        set(
-                                            [
-                                                item[item.find("_") + 1 :]
-                                                for item in hlog.cnames[cnam]
-                                                if item.find("_") > -1
-                                            ]
-                                        )
-                                    )
-                                    hlog.apnames[cnam].sort()
-
-                            elif read_dtypes:
-                                # reading the data types. We build
-                                # numpy.dtype objects and strings for
-                                # packing the data with struct.pack to
-                                # save memory.
-                                if line.find("End of data type definitions") > -1:
-                                    read_dtypes = False
-
-                                    # can now create the record array dtype
-                                    for cnam in hlog.cnames:
-                                        # numpy dtype
-                                        dtypes[cnam] = np.dtype(
-                                            list(
-                                                zip(hlog.cnames[cnam], dtype_defs[cnam])
-                                            )
-                                        )
-                                        # equivalent struct. Use
-                                        # native byte order with no
-                                        # alignment (initial '=') to
-                                        # match numpy packing.
-                                        struct_types[cnam] = "=" + "".join(
-                                            [
-                                                NUMPY_TO_STRUCT[dt]
-                                                for dt in dtype_defs[cnam]
-                                            ]
-                                        )
-
-                                    read_data = True
-
-                                elif line.find("=") > -1:
-                                    # store the data types
-                                    cnam = line[1 : line.find("=")].strip()
-                                    dtype_defs[cnam] = (
-                                        line[line.find("=") + 1 :].strip().split()[1:]
-                                    )
-
-                                    # get ready for the data
-                                    hlog[cnam] = bytearray()
-
-                    elif read_data:
-
-                        # No more storage of comment lines
+                        if start:
+                            hlog.comments.append(line)
+                    else:
                         start = False
-
-                        # read a data line
-                        items = line.strip().split()
-                        cnam = items.pop(0)
-                        dts = dtype_defs[cnam]
-
-                        # convert types
-                        for n in range(len(items)):
-                            dt = dts[n]
-                            if dt.startswith("f"):
-                                items[n] = float(items[n])
-                            elif dt.startswith("i") or dt.startswith("u"):
-                                items[n] = int(items[n])
-                            elif dt == "?":
-                                items[n] = bool(int(items[n]))
-
-                        # store in a list. Although lists are wasteful, they grow
-                        # quite fast and each element here is efficiently packed
-                        # so it should cope with quite large log files.
-                        hlog[cnam].extend(struct.pack(struct_types[cnam], *items))
+                        cnam, rest = line.split(None, 1)
+                        lines[cnam].append(rest)
 
             # flag up subsequent runs
             first = False
 
-        # for each CCD convert the list of byte data to a numpy array and then
-        # ro a record array of the right dtype.
-        for cnam in hlog:
-            hlog[cnam] = np.frombuffer(hlog[cnam], dtypes[cnam])
+        # each CCD's lines are converted in one go.
+        for cnam, dtype in dtypes.items():
+            hlog[cnam] = _convert(lines[cnam], dtype)
 
         # For backwards compatibility, try to spot bad data in old hipercam logs where
         # negative errors indicated bad data rather than NaNs. 'fixes' indicate the items
@@ -306,25 +291,129 @@ class Hlog(dict):
         return hlog
 
     @classmethod
-    def rfits(cls, fname):
+    def follow(cls, fname):
+        """
+        Starts following a log that reduce may still be writing, returning
+        an :class:`HlogFollower`. Each call to its poll method reads just
+        what has been added to the log since the last call and appends the
+        new records to its 'hlog' attribute, an Hlog. 'fname' can be an ASCII
+        log, or the header file of a binary log (extension BLOG).
+
+        For example, a plot can be kept up to date with::
+
+          >> follower = hcam.hlog.Hlog.follow('run011.log')
+          >> while True:
+          >>     if follower.poll():
+          >>         targ = follower.hlog.tseries('2','t')
+          >>         ...
+          >>     time.sleep(5)
+
+        """
+        return HlogFollower(fname)
+
+    @classmethod
+    def rbinary(cls, fname):
+        """
+        Loads a HiPERCAM binary log written by reduce (general.logformat =
+        'binary' or 'both'). This consists of a header file 'fname' (usually
+        with extension BLOG) which has the same header as the ASCII log, and a
+        file of fixed-width records for each CCD, named by adding
+        '.<CCD label>' to 'fname'. The records are memory-mapped as read-only
+        structured arrays of the dtypes defined in the header, so little is
+        read until it is needed. Any incomplete record at the end of a file,
+        e.g. if reduce is still running, is ignored.
+
+        Argument::
+
+           fname : string
+              the name of the header file.
+
+        """
+        hlog = cls()
+        with open(fname) as fin:
+            hlog.comments, hlog.cnames, hlog.apnames, dtype_defs = _read_header(
+                fin
+            )
+
+        for cnam, cnames in hlog.cnames.items():
+            # records are written little-endian
+            dtype = np.dtype(
+                [
+                    (name, "<" + dt)
+                    for name, dt in zip(cnames, dtype_defs[cnam])
+                ]
+            )
+            dname = "{:s}.{:s}".format(fname, cnam)
+            nrec = os.path.getsize(dname) // dtype.itemsize
+            if nrec:
+                hlog[cnam] = np.memmap(dname, dtype, "r", shape=(nrec,))
+            else:
+                hlog[cnam] = np.empty(0, dtype)
+
+        hlog.writable = True
+        return hlog
+
+    @classmethod
+    def rfits(cls, fname, ccds=None, columns=None):
         """
         Loads a HiPERCAM FITS log file written by |reduce| and subsequently
         converted by |hlog2fits|. Each CCD is loaded into a separate
         structured array, returned in a dictionary labelled by the CCD key.
+
+        The tables are memory-mapped, so by default nothing is read until it
+        is accessed. If only a few columns are wanted, `columns` can be used
+        to load just those into compact arrays.
+
+        Arguments::
+
+           fname : string
+              the FITS log file
+
+           ccds : None | string | list
+              the label or labels of the CCDs to load. None for all of them.
+
+           columns : None | list
+              the names of the columns to load, e.g. ['MJD', 'MJDok',
+              'Exptim', 'counts_1', 'countse_1', 'flag_1']. Names not in the
+              table of a CCD are ignored. None to memory-map the whole
+              tables. 'apnames' always lists all the apertures in the file.
         """
 
         hlog = cls()
         hlog.apnames = {}
+        if isinstance(ccds, str):
+            ccds = [ccds]
 
-        with fits.open(fname) as hdul:
+        with fits.open(fname, memmap=True) as hdul:
             for hdu in hdul[1:]:
                 cnam = hdu.header["CCDNAME"]
-                hlog[cnam] = hdu.data
+                if ccds is not None and cnam not in ccds:
+                    continue
+
+                data = hdu.data
+                names = data.dtype.names
+                if columns is None:
+                    hlog[cnam] = data
+                else:
+                    # copy just the requested columns
+                    cols = [
+                        (name, data[name]) for name in columns if name in names
+                    ]
+                    hlog[cnam] = np.empty(
+                        len(data),
+                        [
+                            (name, col.dtype.newbyteorder("="))
+                            for name, col in cols
+                        ]
+                    )
+                    for name, col in cols:
+                        hlog[cnam][name] = col
+
                 hlog.apnames[cnam] = list(
                     set(
                         [
                             item[item.find("_") + 1 :]
-                            for item in hdu.data.dtype.names
+                            for item in names
                             if item.find("_") > -1
                         ]
                     )
@@ -526,29 +615,36 @@ class Hlog(dict):
         """
         ccd = self[str(cnam)]
 
+        # Only the columns needed are accessed, which matters for
+        # memory-mapped logs (see rfits). Some can be missing if just a
+        # selection of columns was loaded.
+        names = ccd.dtype.names
+        times = ccd["MJD"].copy()
+        texps = ccd["Exptim"]/86400 if "Exptim" in names else None
+
         # Work out bad times which will be OR-ed onto the
         # aperture-specific bitmask array
-        mjdok = ccd["MJDok"]
-        tmask = np.zeros_like(mjdok, dtype=np.uint)
-        tmask[~mjdok] = BAD_TIME
-
-        times = ccd["MJD"].copy()
-        texps = ccd["Exptim"].copy()/86400
+        tmask = np.zeros(len(times), dtype=np.uint)
+        if "MJDok" in names:
+            tmask[~ccd["MJDok"]] = BAD_TIME
 
         if apnam is None:
             data = ccd[f"{name}"].copy()
             if ecol:
                 errors = ccd[f"{name}e"].copy()
             else:
-                errors = np.zeros_like(mjdok)
+                errors = np.zeros_like(times)
             bmask = tmask
         else:
             data = ccd[f"{name}_{apnam}"].copy()
             if ecol:
                 errors = ccd[f"{name}e_{apnam}"].copy()
             else:
-                errors = np.zeros_like(mjdok)
-            bmask = ccd[f"flag_{apnam}"] | tmask
+                errors = np.zeros_like(times)
+            if f"flag_{apnam}" in names:
+                bmask = ccd[f"flag_{apnam}"] | tmask
+            else:
+                bmask = tmask
 
         return Tseries(times, data, errors, bmask, texps)
 
@@ -583,6 +679,140 @@ class Hlog(dict):
             raise Hipercam_Error("Hlog not writable")
 
 
+class HlogFollower:
+    """Reads a log file incrementally as it is written by reduce (see
+    :meth:`Hlog.follow`). The byte offsets reached in the file or files are
+    remembered, and each call to poll reads only what has been appended
+    since, converting just the complete lines or records. These are added to
+    per-CCD arrays which grow by doubling, so the cost of a poll scales with
+    the amount of new data rather than the length of the log.
+
+    Attributes::
+
+       hlog : Hlog
+          the log read so far. Its arrays are views of the first rows of the
+          growable arrays, and are replaced on each poll that adds data. It
+          is empty until the header has been written.
+
+    """
+
+    def __init__(self, fname):
+        self.fname = fname
+        self.binary = fname.endswith(BLOG)
+        self.hlog = Hlog()
+        self.hlog.apnames, self.hlog.cnames, self.hlog.comments = {}, {}, []
+        self.hlog.writable = True
+
+        # file offsets and any incomplete line or record left over, keyed
+        # by file name
+        self._offsets, self._partial = {}, {}
+
+        # the header text until it is complete, then the dtypes
+        self._header = ""
+        self._dtypes = None
+
+        # the growable arrays and numbers of rows used
+        self._buffers, self._nrows = {}, {}
+
+    def _read(self, fname, whole):
+        """Returns the data added to file 'fname' since the last call, to the
+        end of the last complete line (whole=False) or the last complete
+        record of 'whole' bytes."""
+        if not os.path.exists(fname):
+            return b""
+
+        with open(fname, "rb") as fin:
+            fin.seek(self._offsets.get(fname, 0))
+            chunk = fin.read()
+        self._offsets[fname] = self._offsets.get(fname, 0) + len(chunk)
+
+        data = self._partial.get(fname, b"") + chunk
+        if whole:
+            nuse = whole * (len(data) // whole)
+        else:
+            nuse = data.rfind(b"\n") + 1
+        self._partial[fname] = data[nuse:]
+        return data[:nuse]
+
+    def _append(self, cnam, new):
+        """Appends the structured array 'new' to CCD 'cnam'"""
+        buff, nrow = self._buffers[cnam], self._nrows[cnam]
+        if nrow + len(new) > len(buff):
+            # double to keep the number of copies down
+            nbuff = np.empty(max(2 * len(buff), nrow + len(new)), buff.dtype)
+            nbuff[:nrow] = buff[:nrow]
+            self._buffers[cnam] = buff = nbuff
+        buff[nrow : nrow + len(new)] = new
+        self._nrows[cnam] = nrow = nrow + len(new)
+        self.hlog[cnam] = buff[:nrow]
+
+    def poll(self):
+        """Reads whatever has been added to the log since the last call.
+        Returns a dictionary keyed by CCD label of the new records, which
+        only includes CCDs that have some.
+        """
+        lines = []
+        if self._dtypes is None:
+            # still need the header
+            text = self._read(self.fname, 0).decode()
+            self._header += text
+            end = self._header.find("End of data type definitions")
+            if end < 0:
+                return {}
+
+            # the header ends with the next comment line
+            end = self._header.find("\n", self._header.find("\n", end) + 1)
+            if end < 0:
+                return {}
+            end += 1
+
+            (
+                self.hlog.comments, self.hlog.cnames, self.hlog.apnames,
+                dtype_defs
+            ) = _read_header(io.StringIO(self._header[:end]))
+
+            self._dtypes = {}
+            for cnam, cnames in self.hlog.cnames.items():
+                self._dtypes[cnam] = np.dtype(
+                    [
+                        (name, "<" + dt if self.binary else dt)
+                        for name, dt in zip(cnames, dtype_defs[cnam])
+                    ]
+                )
+                self._buffers[cnam] = np.empty(64, self._dtypes[cnam])
+                self._nrows[cnam] = 0
+                self.hlog[cnam] = self._buffers[cnam][:0]
+
+            if not self.binary:
+                lines = self._header[end:].splitlines(True)
+            self._header = ""
+
+        elif not self.binary:
+            lines = self._read(self.fname, 0).decode().splitlines(True)
+
+        news = {}
+        if self.binary:
+            for cnam, dtype in self._dtypes.items():
+                data = self._read(
+                    "{:s}.{:s}".format(self.fname, cnam), dtype.itemsize
+                )
+                if len(data):
+                    news[cnam] = np.frombuffer(data, dtype)
+
+        else:
+            ccdlines = {}
+            for line in lines:
+                if not line.startswith("#"):
+                    cnam, rest = line.split(None, 1)
+                    ccdlines.setdefault(cnam, []).append(rest)
+            for cnam, clines in ccdlines.items():
+                news[cnam] = _convert(clines, self._dtypes[cnam])
+
+        for cnam, new in news.items():
+            self._append(cnam, new)
+        return news
+
+
 class Tseries:
     """Class representing a basic time series with times, y values, y
     errors and flags, and allowing bad data. Attributes are::
@@ -2,6 +2,9 @@
 This contains code used in common by the scripts reduce.py and psf_reduce.py
 """
 from collections import OrderedDict
+from multiprocessing import shared_memory, resource_tracker
+import copy
+import os
 import sys
 import warnings
 import numpy as np
@@ -152,6 +155,24 @@ class Rfile(OrderedDict):
         if sect["ngroup"] < 1:
             raise hcam.HipercamError("general.ngroup must be >= 1")
 
+        # optional, for backwards compatibility
+        sect["shared"] = sect.get("shared", "no")
+        toBool(rfile, "general", "shared")
+
+        # optional, for backwards compatibility
+        sect["parallel"] = sect.get("parallel", "ccd")
+        if sect["parallel"] != "ccd" and sect["parallel"] != "frame":
+            raise hcam.HipercamError(
+                "general.parallel must either be 'ccd' or 'frame'"
+            )
+
+        # optional, for backwards compatibility
+        sect["logformat"] = sect.get("logformat", "ascii")
+        if sect["logformat"] not in ("ascii", "binary", "both"):
+            raise hcam.HipercamError(
+                "general.logformat must be one of 'ascii', 'binary' or 'both'"
+            )
+
         #
         # apertures section
         #
@@ -160,9 +181,34 @@ class Rfile(OrderedDict):
         rfile.aper = hcam.MccdAper.read(
             utils.add_extension(apsec["aperfile"], hcam.APER)
         )
-        if apsec["location"] != "fixed" and apsec["location"] != "variable":
+        if (
+            apsec["location"] != "fixed"
+            and apsec["location"] != "variable"
+            and apsec["location"] != "xcorr"
+        ):
+            raise hcam.HipercamError(
+                "aperture location must be one of 'fixed', 'variable' or 'xcorr'"
+            )
+
+        # optional, for backwards compatibility. Only used if location = xcorr
+        apsec["xcorr_refit"] = int(apsec.get("xcorr_refit", 20))
+        if apsec["xcorr_refit"] < 1:
+            raise hcam.HipercamError("apertures.xcorr_refit must be >= 1")
+
+        # optional, for backwards compatibility. Warm-started profile fits
+        apsec["fit_track"] = apsec.get("fit_track", "no")
+        toBool(rfile, "apertures", "fit_track")
+        apsec["fit_skip_tol"] = float(apsec.get("fit_skip_tol", 0.))
+        apsec["fit_max_reject"] = int(apsec.get("fit_max_reject", -1))
+        if apsec["fit_max_reject"] < 0:
+            # no limit
+            apsec["fit_max_reject"] = None
+
+        if sect["parallel"] == "frame" and apsec["location"] != "fixed":
+            # apertures tracked from one frame to the next cannot be
+            # processed out of order
             raise hcam.HipercamError(
-                "aperture location must either be 'fixed' or 'variable'"
+                "general.parallel = frame requires apertures.location = fixed"
             )
 
         if apsec["fit_method"] == "moffat":
@@ -1277,7 +1323,9 @@ class ProcessCCDs:
     that routine more gracefully.
     """
 
-    def __init__(self, rfile, read, gain, ccdproc, pool):
+    def __init__(
+        self, rfile, read, gain, ccdproc, pool, shared=False, nshard=1
+    ):
         """Arguments::
 
            rfile : Rfile
@@ -1298,6 +1346,22 @@ class ProcessCCDs:
               for parallel processing. If 'None', it will be done in serial
               mode.
 
+           shared : bool
+              if True, and pool is not None, the frame data are passed to the
+              parallel processes through shared memory rather than being
+              pickled with the other arguments. The processes only receive the
+              location of the data in the shared memory and a copy of
+              'rfile' without its calibration frames. Call :meth:`close` to
+              release the memory at the end.
+
+           nshard : int
+              if > 1, and pool is not None, the frames of each CCD are split
+              into up to 'nshard' contiguous chunks which are processed in
+              parallel as well as the CCDs, allowing more CPUs than CCDs to be
+              used. The results are put back in frame order before being
+              returned. This is only valid if the frames can be reduced
+              independently of each other, i.e. with fixed apertures.
+
         """
 
         self.rfile = rfile
@@ -1305,6 +1369,12 @@ class ProcessCCDs:
         self.gain = gain
         self.ccdproc = ccdproc
         self.pool = pool
+        self.shared = shared and pool is not None
+        self.nshard = nshard if pool is not None else 1
+
+        # shared memory holding the readout and gain frames, set up at the
+        # first call if needed
+        self._cal_shm = None
 
         # mwins: a persistent storage container that is set up in the
         # first call to this object and retained for later access. It
@@ -1415,22 +1485,263 @@ class ProcessCCDs:
                     )
                 )
 
-        if len(arglist):
+        if len(arglist) and self.nshard > 1:
+            # split the frames of each CCD into chunks, each becoming a
+            # separate job
+            arglist, nchunks = self._shard(arglist)
+
+        if len(arglist) and self.shared:
+            # as below, but with the data in shared memory
+            allres = self._shared_starmap(arglist)
+            if self.nshard > 1:
+                allres = self._unshard(allres, nchunks)
+
+            for cnam, res in allres:
+                if len(res):
+                    (nframe, store, ccdaper, results, mjdint, mjdfrac, mjdok, expose) = res[-1]
+                    self.store[cnam] = dict(store)
+                    self.rfile.aper[cnam] = ccdaper.copy()
+
+        elif len(arglist):
             # delayed reduction now carried out in parallel
             allres = self.pool.starmap(self.ccdproc, arglist)
+            if self.nshard > 1:
+                allres = self._unshard(allres, nchunks)
 
             # update store and rfile.aper with the final results for
             # each CCD. This is necessary because the alterations to
-            # these made within the routine are otherwise lost
+            # these made within the routine are otherwise lost. They are
+            # copied to leave the results untouched by later frames.
             for cnam, res in allres:
                 if len(res):
                     (nframe, store, ccdaper, results, mjdint, mjdfrac, mjdok, expose) = res[-1]
-                    self.store[cnam] = store
-                    self.rfile.aper[cnam] = ccdaper
+                    self.store[cnam] = dict(store)
+                    self.rfile.aper[cnam] = ccdaper.copy()
 
         # pass back the results
         return allres
 
+    def _shard(self, arglist):
+        """Splits the frames in each set of arguments for ccdproc into
+        contiguous chunks. Returns the new argument list and the number of
+        chunks made for each CCD, needed by :meth:`_unshard`"""
+
+        # aim to fill the pool, as long as there are enough frames
+        nchunk = -(-self.nshard // len(arglist))
+
+        shards, nchunks = [], []
+        for cnam, pcds, mcds, nfrs, read, gain, mwins, rfile, store in arglist:
+            nch = min(nchunk, len(pcds))
+            edges = [(n * len(pcds)) // nch for n in range(nch + 1)]
+            for n1, n2 in zip(edges[:-1], edges[1:]):
+                shards.append(
+                    (
+                        cnam,
+                        pcds[n1:n2],
+                        mcds[n1:n2],
+                        nfrs[n1:n2],
+                        read,
+                        gain,
+                        mwins,
+                        rfile,
+                        store,
+                    )
+                )
+            nchunks.append(nch)
+
+        return shards, nchunks
+
+    def _unshard(self, allres, nchunks):
+        """Re-assembles the results from the chunks made by :meth:`_shard` into
+        one set per CCD, in frame order"""
+
+        merged, nres = [], 0
+        for nch in nchunks:
+            cnam = allres[nres][0]
+            res = []
+            for cnm, cres in allres[nres : nres + nch]:
+                res += cres
+            merged.append((cnam, res))
+            nres += nch
+        return merged
+
+    def _shared_starmap(self, arglist):
+        """Runs ccdproc in parallel with the frame data passed through shared
+        memory"""
+
+        if self._cal_shm is None:
+            # the readout and gain frames do not change so are only copied
+            # once
+            cnams = list(self.read.keys())
+            self._cal_shm, handles = ccds_to_shm(
+                [self.read[cnam] for cnam in cnams]
+                + [self.gain[cnam] for cnam in cnams]
+            )
+            ncal = len(cnams)
+            self._cal_handles = {
+                cnam: (handles[n], handles[ncal + n]) for n, cnam in enumerate(cnams)
+            }
+
+        # all the rest go in one block per group
+        ccds = []
+        for (cnam, pcds, mcds, nfrs, read, gain, ccdwin, rfile, store) in arglist:
+            ccds += pcds + mcds
+        shm, handles = ccds_to_shm(ccds)
+
+        # calibration frames are not needed by ccdproc
+        rfile = copy.copy(self.rfile)
+        rfile.bias = rfile.dark = rfile.flat = None
+        rfile.readout = rfile.gain = None
+
+        shargs, n = [], 0
+        for (cnam, pcds, mcds, nfrs, read, gain, ccdwin, rf, store) in arglist:
+            nccd = len(pcds)
+            rhandle, ghandle = self._cal_handles[cnam]
+            shargs.append(
+                (
+                    self.ccdproc,
+                    cnam,
+                    shm.name,
+                    handles[n : n + nccd],
+                    handles[n + nccd : n + 2 * nccd],
+                    nfrs,
+                    self._cal_shm.name,
+                    rhandle,
+                    ghandle,
+                    ccdwin,
+                    rfile,
+                    store,
+                )
+            )
+            n += 2 * nccd
+
+        try:
+            allres = self.pool.starmap(shm_ccdproc, shargs)
+        finally:
+            shm.close()
+            shm.unlink()
+
+        return allres
+
+    def close(self):
+        """Releases any shared memory"""
+        if self._cal_shm is not None:
+            self._cal_shm.close()
+            self._cal_shm.unlink()
+            self._cal_shm = None
+
+
+def ccds_to_shm(ccds):
+    """Copies the data of a list of CCDs into a block of shared memory so that
+    they can be passed to other processes without pickling. Use
+    :func:`shm_to_ccds` to get them back.
+
+    Arguments::
+
+       ccds : list of CCDs
+          the CCDs to copy
+
+    Returns: (shm, handles) where 'shm' is the
+    multiprocessing.shared_memory.SharedMemory holding the data and 'handles'
+    is a list, one per CCD, of the small amount of information needed to
+    re-construct it from 'shm'. It is up to the caller to close and unlink
+    'shm' once it is no longer needed.
+    """
+
+    # offsets rounded up to multiples of 8 to keep all arrays aligned
+    size = sum(
+        8 * ((wind.data.nbytes + 7) // 8) for ccd in ccds for wind in ccd.values()
+    )
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+
+    handles, offset = [], 0
+    for ccd in ccds:
+        winds = []
+        for wnam, wind in ccd.items():
+            data = wind.data
+            np.ndarray(data.shape, data.dtype, shm.buf, offset)[...] = data
+            winds.append((wnam, wind.winhead, offset, data.shape, data.dtype.str))
+            offset += 8 * ((data.nbytes + 7) // 8)
+        handles.append((ccd.nxtot, ccd.nytot, ccd.nxpad, ccd.nypad, winds))
+
+    return (shm, handles)
+
+
+def shm_to_ccds(shm, handles):
+    """Re-constructs CCDs stored in shared memory by :func:`ccds_to_shm`. The
+    data of the CCDs are views of the shared memory, not copies.
+
+    Arguments::
+
+       shm : multiprocessing.shared_memory.SharedMemory
+          the shared memory
+
+       handles : list
+          the handles to each CCD returned by :func:`ccds_to_shm`
+
+    Returns: list of CCDs
+    """
+    ccds = []
+    for nxtot, nytot, nxpad, nypad, winds in handles:
+        ccds.append(
+            hcam.CCD(
+                [
+                    (wnam, hcam.Window(winhead, np.ndarray(shape, dtype, shm.buf, offset)))
+                    for wnam, winhead, offset, shape, dtype in winds
+                ],
+                nxtot,
+                nytot,
+                nxpad,
+                nypad,
+            )
+        )
+    return ccds
+
+
+def _attach_shm(name):
+    """Attaches to shared memory created by another process, leaving the
+    creator responsible for its removal. Otherwise the resource tracker of
+    the attaching process would try to remove it too when the process ends.
+    """
+    try:
+        # python >= 3.13
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+def shm_ccdproc(
+    ccdproc, cnam, name, phandles, mhandles, nframes, cname, rhandle, ghandle,
+    ccdwin, rfile, store,
+):
+    """Wrapper around the 'ccdproc' routine of reduce which gets the CCDs out of
+    shared memory first. This is what the parallel processes run when
+    :class:`ProcessCCDs` is used in shared mode. Returns whatever 'ccdproc'
+    returns.
+    """
+
+    shm = _attach_shm(name)
+    cshm = _attach_shm(cname)
+    pcds = mcds = read = gain = None
+    try:
+        pcds = shm_to_ccds(shm, phandles)
+        mcds = shm_to_ccds(shm, mhandles)
+        read, gain = shm_to_ccds(cshm, [rhandle, ghandle])
+        return ccdproc(cnam, pcds, mcds, nframes, read, gain, ccdwin, rfile, store)
+
+    finally:
+        # the views must be dropped before closing. The closes can still fail
+        # if an exception holds on to them, in which case the memory is
+        # released when the process ends.
+        pcds = mcds = read = gain = None
+        try:
+            shm.close()
+            cshm.close()
+        except BufferError:
+            pass
+
 
 def moveApers(cnam, ccd, read, gain, ccdwin, rfile, store):
     """Encapsulates aperture re-positioning. 'store' is a dictionary of results
@@ -1440,7 +1751,10 @@ def moveApers(cnam, ccd, read, gain, ccdwin, rfile, store):
 
     It operates by first shifting any reference apertures, then non-linked
     apertures, and finally linked apertures. The overall sequence is quite
-    complex and is described elsewhere.
+    complex and is described elsewhere. Other than the first reference
+    aperture, which is needed to help locate the rest, the profiles of the
+    reference and then the non-reference apertures are fitted together (see
+    :func:`fitStamps`).
 
     Arguments::
 
@@ -1475,6 +1789,18 @@ def moveApers(cnam, ccd, read, gain, ccdwin, rfile, store):
     Returns: True or False to indicate whether to move onto extraction or not.
     If False, extraction will be skipped.
 
+    If apertures.fit_track is set, the fit of each aperture starts from the
+    parameters of its last successful fit, and is skipped altogether if a
+    single linearised step from them predicts a move of less than
+    apertures.fit_skip_tol pixels. The numbers of successful fits and of fits
+    skipped are accumulated in store['nfit'] and store['nskip'].
+
+    If the aperture location is 'xcorr', the apertures are moved in the
+    same way, but only every 'xcorr_refit' frames. In between, they are all
+    moved by a single shift measured by cross-correlation with the data taken
+    at the time of the last profile fits (see :func:`xcorrApers`). The
+    profile fits are carried out again whenever this fails.
+
     """
 
     ccdaper = rfile.aper[cnam]
@@ -1482,6 +1808,18 @@ def moveApers(cnam, ccd, read, gain, ccdwin, rfile, store):
     # short-hand that will used a lot
     apsec = rfile["apertures"]
 
+    if apsec["location"] == "xcorr":
+        # the stamps are only retained if things go well
+        xcorr = store.pop("xcorr", None)
+        if (
+            xcorr is not None
+            and xcorr["nframe"] < apsec["xcorr_refit"]
+            and xcorrApers(cnam, ccd, rfile, store, xcorr)
+        ):
+            xcorr["nframe"] += 1
+            store["xcorr"] = xcorr
+            return True
+
     if apsec["location"] == "fixed":
         for apnam in ccdaper:
             store[apnam] = {
@@ -1499,14 +1837,16 @@ def moveApers(cnam, ccd, read, gain, ccdwin, rfile, store):
     # some initialisations
     xsum, ysum = 0.0, 0.0
     wxsum, wysum = 0.0, 0.0
-    ref = False
     fsum, wfsum = 0, 0
     bsum, wbsum = 0, 0
     shbox = apsec["search_half_width"]
+    fhbox = apsec["fit_half_width"]
 
     # first of all try to get a mean shift from the reference apertures.  we
     # move any of these apertures that are fitted OK. We work out weighted
     # mean FWHM and beta values once any other apertures are fitted.
+    refs = [apnam for apnam, aper in ccdaper.items() if aper.ref]
+    ref = len(refs) > 0
 
     # next to store shifts
     shifts = []
@@ -1516,9 +1856,15 @@ def moveApers(cnam, ccd, read, gain, ccdwin, rfile, store):
     xshift, yshift = 0., 0.
 
     try:
-        for apnam, aper in ccdaper.items():
-            if aper.ref:
-                ref = True
+        # the first reference aperture is fitted on its own, the rest, which
+        # rely upon the shift it gives, are then fitted together.
+        for batch in (refs[:1], refs[1:]):
+
+            # searches and starting values. Any error is held back until the
+            # fits of the apertures before it have been dealt with.
+            stamps, error = [], None
+            for apnam in batch:
+                aper = ccdaper[apnam]
 
                 # name of window for this aperture
                 wnam = ccdwin[apnam]
@@ -1529,61 +1875,79 @@ def moveApers(cnam, ccd, read, gain, ccdwin, rfile, store):
                 wread = read[wnam]
                 wgain = gain[wnam]
 
-                # get sub-window around start position
-                swdata = wdata.window(
-                    aper.x + xshift - shbox, aper.x + xshift + shbox,
-                    aper.y + yshift - shbox, aper.y + yshift + shbox
-                )
+                try:
+                    # get sub-window around start position
+                    swdata = wdata.view(
+                        aper.x + xshift - shbox, aper.x + xshift + shbox,
+                        aper.y + yshift - shbox, aper.y + yshift + shbox
+                    )
 
-                # carry out initial search
-                x, y, peak = swdata.search(
-                    apsec["search_smooth_fwhm"],
-                    aper.x + xshift,
-                    aper.y + yshift,
-                    apsec["fit_height_min_ref"],
-                    apsec["search_smooth_fft"],
-                )
+                    # carry out initial search
+                    x, y, peak = swdata.search(
+                        apsec["search_smooth_fwhm"],
+                        aper.x + xshift,
+                        aper.y + yshift,
+                        apsec["fit_height_min_ref"],
+                        apsec["search_smooth_fft"],
+                    )
 
-                # Now for a more refined fit. First extract fit Window
-                fhbox = apsec["fit_half_width"]
-                fwdata = wdata.window(x - fhbox, x + fhbox, y - fhbox, y + fhbox)
-                fwread = wread.window(x - fhbox, x + fhbox, y - fhbox, y + fhbox)
-                fwgain = wgain.window(x - fhbox, x + fhbox, y - fhbox, y + fhbox)
+                    # Now for a more refined fit. First extract fit Window
+                    fwdata = wdata.view(x - fhbox, x + fhbox, y - fhbox, y + fhbox)
+                    fwread = wread.view(x - fhbox, x + fhbox, y - fhbox, y + fhbox)
+                    fwgain = wgain.view(x - fhbox, x + fhbox, y - fhbox, y + fhbox)
 
-                # initial estimate of background
-                sky = np.percentile(fwdata.data, 50)
+                except hcam.HipercamError as err:
+                    error = err
+                    break
 
-                # get some parameters from previous run where possible
-                fit_fwhm = store["mfwhm"] if store["mfwhm"] > 0.0 else apsec["fit_fwhm"]
-                fit_beta = store["mbeta"] if store["mbeta"] > 0.0 else apsec["fit_beta"]
+                last = lastFit(apnam, rfile, store)
+                if last is None:
+                    # initial estimate of background
+                    sky = np.percentile(fwdata.data, 50)
+                    height = peak - sky
+
+                    # get some parameters from previous run where possible
+                    fit_fwhm = store["mfwhm"] if store["mfwhm"] > 0.0 else apsec["fit_fwhm"]
+                    fit_beta = store["mbeta"] if store["mbeta"] > 0.0 else apsec["fit_beta"]
+
+                else:
+                    # start from the last fit of this target, shifted. The
+                    # search still sets the fit window.
+                    sky, height = last["sky"], last["height"]
+                    x, y = aper.x + xshift, aper.y + yshift
+                    fit_fwhm, fit_beta = last["fwhm"], last["beta"]
 
                 # limit the initial value of beta because of tendency to
                 # wander to high values and never come down.
                 fit_beta = min(fit_beta, apsec["fit_beta_max"])
 
-                # refine the Aperture position by fitting the profile
+                stamps.append(
+                    (
+                        apnam, swdata,
+                        (
+                            fwdata, fwread, fwgain, sky, height, x, y,
+                            fit_fwhm, fit_beta, last
+                        )
+                    )
+                )
+
+            # refine the Aperture positions by fitting the profiles
+            results = fitStamps(
+                rfile, [stamp for apnam, swdata, stamp in stamps], store
+            )
+
+            for (apnam, swdata, stamp), result in zip(stamps, results):
+                aper = ccdaper[apnam]
+                fwdata = stamp[0]
+
+                if isinstance(result, hcam.HipercamError):
+                    raise result
+
                 (
                     (sky, height, x, y, fwhm, beta),
                     (esky, eheight, ex, ey, efwhm, ebeta),
                     extras,
-                ) = hcam.fitting.combFit(
-                    fwdata,
-                    rfile.method,
-                    sky,
-                    peak - sky,
-                    x,
-                    y,
-                    fit_fwhm,
-                    apsec["fit_fwhm_min"],
-                    apsec["fit_fwhm_fixed"],
-                    fit_beta,
-                    apsec["fit_beta_max"],
-                    False,
-                    fwread.data,
-                    fwgain.data,
-                    apsec["fit_thresh"],
-                    apsec["fit_ndiv"],
-                )
+                ) = result
 
                 # check that x, y are within both the search and fit boxes
                 if swdata.distance(x, y) < 0.5:
@@ -1638,6 +2002,7 @@ def moveApers(cnam, ccd, read, gain, ccdwin, rfile, store):
                         "dx": dx,
                         "dy": dy,
                     }
+                    trackFit(apnam, store, sky, height, extras)
 
                     if efwhm > 0.0:
                         # average FWHM computation
@@ -1659,6 +2024,10 @@ def moveApers(cnam, ccd, read, gain, ccdwin, rfile, store):
                         ).format(cnam, apnam, height, apsec["fit_height_min_ref"])
                     )
 
+            if error is not None:
+                apnam = batch[len(stamps)]
+                raise error
+
     except hcam.HipercamError as err:
         # trap problems during the fits
         print(
@@ -1777,7 +2146,10 @@ def moveApers(cnam, ccd, read, gain, ccdwin, rfile, store):
         xshift, yshift = 0.0, 0.0
 
     # now go over non-reference, non-linked apertures. Failed reference
-    # apertures are shifted by the mean shift just determined
+    # apertures are shifted by the mean shift just determined. The
+    # non-reference apertures are fitted together once their searches are
+    # done, any errors being held back to report in order.
+    stamps = []
     for apnam, aper in ccdaper.items():
 
         if aper.ref and store[apnam]["xe"] <= 0.0:
@@ -1799,7 +2171,7 @@ def moveApers(cnam, ccd, read, gain, ccdwin, rfile, store):
             try:
 
                 # extract search sub-window around start position.
-                swdata = wdata.window(
+                swdata = wdata.view(
                     aper.x + xshift - shbox,
                     aper.x + xshift + shbox,
                     aper.y + yshift - shbox,
@@ -1818,6 +2190,7 @@ def moveApers(cnam, ccd, read, gain, ccdwin, rfile, store):
 
                 else:
                     # no reference star, carry out an explicit search
+                    xold, yold = None, None
                     x, y, peak = swdata.search(
                         apsec["search_smooth_fwhm"],
                         aper.x + xshift,
@@ -1827,12 +2200,18 @@ def moveApers(cnam, ccd, read, gain, ccdwin, rfile, store):
                     )
 
                 # now for a more refined fit. First extract fit Window
-                fhbox = apsec["fit_half_width"]
-                fwdata = wdata.window(x - fhbox, x + fhbox, y - fhbox, y + fhbox)
-                fwread = wread.window(x - fhbox, x + fhbox, y - fhbox, y + fhbox)
-                fwgain = wgain.window(x - fhbox, x + fhbox, y - fhbox, y + fhbox)
+                fwdata = wdata.view(x - fhbox, x + fhbox, y - fhbox, y + fhbox)
+                fwread = wread.view(x - fhbox, x + fhbox, y - fhbox, y + fhbox)
+                fwgain = wgain.view(x - fhbox, x + fhbox, y - fhbox, y + fhbox)
+
+            except (hcam.HipercamError, IndexError) as err:
+                stamps.append((apnam, err, None))
+                continue
 
+            last = lastFit(apnam, rfile, store)
+            if last is None:
                 sky = np.percentile(fwdata.data, 50)
+                height = peak - sky
 
                 # get some parameters from previous run where possible
                 fit_fwhm = (
@@ -1847,132 +2226,156 @@ def moveApers(cnam, ccd, read, gain, ccdwin, rfile, store):
                     else apsec["fit_beta"]
                 )
 
-                # limit the initial value of beta because of tendency
-                # to wander to high values and never come down.
-                fit_beta = min(fit_beta, apsec["fit_beta_max"])
+            else:
+                # start from the last fit of this target
+                sky, height = last["sky"], last["height"]
+                if not ref:
+                    x, y = aper.x, aper.y
+                fit_fwhm, fit_beta = last["fwhm"], last["beta"]
 
-                # finally, attempt to fit the target profile
+            # limit the initial value of beta because of tendency
+            # to wander to high values and never come down.
+            fit_beta = min(fit_beta, apsec["fit_beta_max"])
+
+            stamps.append(
                 (
-                    (sky, height, x, y, fwhm, beta),
-                    (esky, eheight, ex, ey, efwhm, ebeta),
-                    extras,
-                ) = hcam.fitting.combFit(
-                    fwdata,
-                    rfile.method,
-                    sky,
-                    peak - sky,
-                    x,
-                    y,
-                    fit_fwhm,
-                    apsec["fit_fwhm_min"],
-                    apsec["fit_fwhm_fixed"],
-                    fit_beta,
-                    apsec["fit_beta_max"],
-                    False,
-                    fwread.data,
-                    fwgain.data,
-                    apsec["fit_thresh"],
-                    apsec["fit_ndiv"],
+                    apnam, (swdata, xold, yold),
+                    (
+                        fwdata, fwread, fwgain, sky, height, x, y,
+                        fit_fwhm, fit_beta, last
+                    )
                 )
+            )
 
-                # check the position
-                if swdata.distance(x, y) < 0.5:
-                    error_message = (
-                        "Fitted position ({:.1f},{:.1f}) too close to or"
-                        " beyond edge of search window = {!s}"
-                    ).format(x, y, swdata.format(True))
+    # finally, attempt to fit the target profiles
+    results = iter(
+        fitStamps(
+            rfile,
+            [stamp for apnam, checks, stamp in stamps if stamp is not None],
+            store
+        )
+    )
 
-                    raise hcam.HipercamError(error_message)
+    for apnam, checks, stamp in stamps:
+        aper = ccdaper[apnam]
 
-                if fwdata.distance(x, y) < 0.5:
-                    error_message = (
-                        "Fitted position ({:.1f},{:.1f}) too close to or"
-                        " beyond edge of fit window = {!s}".format(
-                            x, y, swdata.format(True)
-                        )
+        try:
+
+            if stamp is None:
+                # the search failed
+                raise checks
+
+            swdata, xold, yold = checks
+            fwdata = stamp[0]
+            result = next(results)
+            if isinstance(result, hcam.HipercamError):
+                raise result
+
+            (
+                (sky, height, x, y, fwhm, beta),
+                (esky, eheight, ex, ey, efwhm, ebeta),
+                extras,
+            ) = result
+
+            # check the position
+            if swdata.distance(x, y) < 0.5:
+                error_message = (
+                    "Fitted position ({:.1f},{:.1f}) too close to or"
+                    " beyond edge of search window = {!s}"
+                ).format(x, y, swdata.format(True))
+
+                raise hcam.HipercamError(error_message)
+
+            if fwdata.distance(x, y) < 0.5:
+                error_message = (
+                    "Fitted position ({:.1f},{:.1f}) too close to or"
+                    " beyond edge of fit window = {!s}".format(
+                        x, y, swdata.format(True)
                     )
+                )
+
+                raise hcam.HipercamError(error_message)
+
+            # check for overly large shifts in the case that we have
+            # reference apertures
+            if ref:
+                shift = np.sqrt((x - xold) ** 2 + (y - yold) ** 2)
+                if shift > apsec["fit_max_shift"]:
+                    error_message = (
+                        "Position of non-reference aperture"
+                        " shifted by {:.1f} which exceeds "
+                        "fit_max_shift = {:.1f}"
+                    ).format(shift, apsec["fit_max_shift"])
 
                     raise hcam.HipercamError(error_message)
 
-                # check for overly large shifts in the case that we have
-                # reference apertures
+            if height >= apsec["fit_height_min_nrf"]:
+                # Height check is important here since no search has
+                # taken place if there are reference stars. If position has
+                # passed checks and the height is OK, then these are useful
+                # data to update parameters
+                store[apnam] = {
+                    "xe": ex,
+                    "ye": ey,
+                    "fwhm": fwhm,
+                    "fwhme": efwhm,
+                    "beta": beta,
+                    "betae": ebeta,
+                    "dx": x - aper.x,
+                    "dy": y - aper.y
+                }
+                trackFit(apnam, store, sky, height, extras)
+
                 if ref:
-                    shift = np.sqrt((x - xold) ** 2 + (y - yold) ** 2)
-                    if shift > apsec["fit_max_shift"]:
-                        error_message = (
-                            "Position of non-reference aperture"
-                            " shifted by {:.1f} which exceeds "
-                            "fit_max_shift = {:.1f}"
-                        ).format(shift, apsec["fit_max_shift"])
-
-                        raise hcam.HipercamError(error_message)
-
-                if height >= apsec["fit_height_min_nrf"]:
-                    # Height check is important here since no search has
-                    # taken place if there are reference stars. If position has
-                    # passed checks and the height is OK, then these are useful
-                    # data to update parameters
-                    store[apnam] = {
-                        "xe": ex,
-                        "ye": ey,
-                        "fwhm": fwhm,
-                        "fwhme": efwhm,
-                        "beta": beta,
-                        "betae": ebeta,
-                        "dx": x - aper.x,
-                        "dy": y - aper.y
-                    }
+                    # apply a fraction 'fit_alpha' times the
+                    # change is position relative to the expected
+                    # position.
+                    aper.x = xold + apsec["fit_alpha"] * (x - xold)
+                    aper.y = yold + apsec["fit_alpha"] * (y - yold)
+                else:
+                    aper.x = x
+                    aper.y = y
 
-                    if ref:
-                        # apply a fraction 'fit_alpha' times the
-                        # change is position relative to the expected
-                        # position.
-                        aper.x = xold + apsec["fit_alpha"] * (x - xold)
-                        aper.y = yold + apsec["fit_alpha"] * (y - yold)
-                    else:
-                        aper.x = x
-                        aper.y = y
+                if efwhm > 0.0:
+                    # average FWHM computation
+                    wf = 1.0 / efwhm ** 2
+                    fsum += wf * fwhm
+                    wfsum += wf
 
-                    if efwhm > 0.0:
-                        # average FWHM computation
-                        wf = 1.0 / efwhm ** 2
-                        fsum += wf * fwhm
-                        wfsum += wf
+                if ebeta > 0.0:
+                    # average beta computation
+                    wb = 1.0 / ebeta ** 2
+                    bsum += wb * beta
+                    wbsum += wb
 
-                    if ebeta > 0.0:
-                        # average beta computation
-                        wb = 1.0 / ebeta ** 2
-                        bsum += wb * beta
-                        wbsum += wb
+            else:
 
-                else:
+                error_message = (
+                    "Non-reference aperture peak = {:.1f} < {:.1f}"
+                    ).format(height, apsec["fit_height_min_nrf"])
 
-                    error_message = (
-                        "Non-reference aperture peak = {:.1f} < {:.1f}"
-                        ).format(height, apsec["fit_height_min_nrf"])
+                raise hcam.HipercamError(error_message)
 
-                    raise hcam.HipercamError(error_message)
-
-            except (hcam.HipercamError, IndexError) as err:
-                print(
-                    "CCD {:s}, aperture {:s}, fit failed (but extraction may still occur), error = {!s}".format(
-                        cnam, apnam, err
-                    ),
-                    file=sys.stderr,
-                )
-                aper.x += xshift
-                aper.y += yshift
+        except (hcam.HipercamError, IndexError) as err:
+            print(
+                "CCD {:s}, aperture {:s}, fit failed (but extraction may still occur), error = {!s}".format(
+                    cnam, apnam, err
+                ),
+                file=sys.stderr,
+            )
+            aper.x += xshift
+            aper.y += yshift
 
-                store[apnam] = {
-                    "xe": NaN,
-                    "ye": NaN,
-                    "fwhm": NaN,
-                    "fwhme": NaN,
-                    "beta": NaN,
-                    "betae": NaN,
-                    "dx": xshift,
-                    "dy": yshift,
-                }
+            store[apnam] = {
+                "xe": NaN,
+                "ye": NaN,
+                "fwhm": NaN,
+                "fwhme": NaN,
+                "beta": NaN,
+                "betae": NaN,
+                "dx": xshift,
+                "dy": yshift,
+            }
 
     # finally the linked ones
     for apnam, aper in ccdaper.items():
@@ -2008,9 +2411,302 @@ def moveApers(cnam, ccd, read, gain, ccdwin, rfile, store):
     else:
         store["mbeta"] = -1
 
+    if apsec["location"] == "xcorr":
+        # new stamps for the cross-correlation to work from
+        store["xcorr"] = xcorrStamps(ccd, ccdwin, ccdaper, shbox)
+
     return True
 
 
+def lastFit(apnam, rfile, store):
+    """Returns the results of the last successful profile fit of aperture
+    'apnam' as a dictionary combining the entry for it in 'store' with its
+    fitted sky and peak height, if the apertures are being tracked
+    (apertures.fit_track) and there is one, else None.
+    """
+    if not rfile["apertures"]["fit_track"]:
+        return None
+
+    track = store.get("track", {})
+    if apnam in track and apnam in store and store[apnam]["xe"] > 0.0:
+        last = dict(store[apnam])
+        last.update(track[apnam])
+        return last
+    return None
+
+
+def trackFit(apnam, store, sky, height, extras):
+    """Records a successful profile fit of aperture 'apnam' in 'store' for
+    :func:`lastFit`: its fitted sky and peak height, and the coordinates of
+    the pixels rejected, for :func:`fitStamps` to pass to
+    :func:`hipercam.fitting.profileStep`. 'extras' is None if the fit was
+    skipped by fitStamps, in which case the pixels rejected in the last fit
+    carried out are kept; otherwise the count of fits in 'nfit' goes up by
+    one.
+    """
+    track = store.setdefault("track", {})
+    if extras is None:
+        rejected = track[apnam]["rejected"] if apnam in track else None
+    else:
+        X, Y, sigma = extras[1:4]
+        rejected = (X[sigma < 0], Y[sigma < 0])
+        store["nfit"] = store.get("nfit", 0) + 1
+    track[apnam] = {"sky": sky, "height": height, "rejected": rejected}
+
+
+def fitStamps(rfile, stamps, store):
+    """Fits the profiles of several targets at once, as moveApers requires.
+
+    Arguments::
+
+       rfile : Rfile
+           reduce file configuration parameters
+
+       stamps : list
+           one tuple per target of (fwdata, fwread, fwgain, sky, height, x, y,
+           fwhm, beta, last), the Windows of data, readout noise and gain to
+           fit, the starting values of the parameters and, if the target is
+           being tracked (apertures.fit_track), the results of its last fit
+           as stored by moveApers, else None.
+
+       store : dict
+           the count of fits skipped is accumulated in 'nskip'. Fits that
+           succeed are counted in 'nfit' by :func:`trackFit`.
+
+    Returns: list of results from :func:`hipercam.fitting.combFitBatch`, one
+    per target, each either the fitted values or a HipercamError. If a tracked
+    target is predicted to move by less than apertures.fit_skip_tol pixels,
+    its fit is skipped, and the predicted parameters are returned along with
+    the uncertainties of its last fit, and None in place of the extras.
+
+    """
+    if len(stamps) == 0:
+        return []
+
+    apsec = rfile["apertures"]
+
+    results, fits = len(stamps)*[None], []
+    for n, stamp in enumerate(stamps):
+        (
+            fwdata, fwread, fwgain, sky, height, x, y, fwhm, beta, last
+        ) = stamp
+        if last is not None and apsec["fit_skip_tol"] > 0.:
+            pars = (sky, height, x, y, fwhm, beta)
+            try:
+                step = hcam.fitting.profileStep(
+                    fwdata, rfile.method, pars, fwread.data, fwgain.data,
+                    apsec["fit_ndiv"], last["rejected"], apsec["fit_fwhm_min"],
+                    apsec["fit_fwhm_fixed"], apsec["fit_beta_max"]
+                )
+            except hcam.HipercamError:
+                # cannot tell; fit it
+                step = None
+
+            if step is not None and np.hypot(step[2], step[3]) < apsec["fit_skip_tol"]:
+                results[n] = (
+                    tuple(par + dpar for par, dpar in zip(pars, step)),
+                    (NaN, NaN, last["xe"], last["ye"], last["fwhme"], last["betae"]),
+                    None
+                )
+                continue
+
+        fits.append(n)
+
+    if len(fits):
+        (
+            fwdatas, fwreads, fwgains, skys, heights, xs, ys, fwhms, betas, lasts
+        ) = zip(*[stamps[n] for n in fits])
+        fitted = hcam.fitting.combFitBatch(
+            fwdatas,
+            rfile.method,
+            skys,
+            heights,
+            xs,
+            ys,
+            fwhms,
+            apsec["fit_fwhm_min"],
+            apsec["fit_fwhm_fixed"],
+            betas,
+            apsec["fit_beta_max"],
+            False,
+            [fwread.data for fwread in fwreads],
+            [fwgain.data for fwgain in fwgains],
+            apsec["fit_thresh"],
+            apsec["fit_ndiv"],
+            max_reject=apsec["fit_max_reject"],
+        )
+        for n, result in zip(fits, fitted):
+            results[n] = result
+
+    store.setdefault("nfit", 0)
+    store["nskip"] = store.get("nskip", 0) + len(stamps) - len(fits)
+    return results
+
+
+def xcorrStamps(ccd, ccdwin, ccdaper, hwidth):
+    """Takes copies of the data around apertures for later cross-correlation
+    with :func:`xcorrApers`. The reference apertures are used if there are
+    any, otherwise all non-linked apertures.
+
+    Arguments::
+
+       ccd : CCD
+           the debiassed, flat-fielded CCD.
+
+       ccdwin : dict
+           the Window label corresponding to each Aperture
+
+       ccdaper : CcdAper
+           the apertures, positioned on 'ccd'
+
+       hwidth : int
+           half-width of the stamps, unbinned pixels
+
+    Returns a dictionary containing the Fourier transforms of the stamps and
+    where they come from along with the positions of the apertures, as needed
+    by :func:`xcorrApers`.
+    """
+
+    refs = [apnam for apnam, aper in ccdaper.items() if aper.ref]
+    if len(refs) == 0:
+        refs = [apnam for apnam, aper in ccdaper.items() if not aper.linked]
+
+    stamps = []
+    for apnam in refs:
+        aper = ccdaper[apnam]
+        wnam = ccdwin[apnam]
+        if wnam is None:
+            continue
+        wind = ccd[wnam]
+
+        # array region of the stamp, limited by the edges of the Window
+        ix1 = max(0, int(round(wind.x_pixel(aper.x - hwidth))))
+        ix2 = min(wind.nx, int(round(wind.x_pixel(aper.x + hwidth))) + 1)
+        iy1 = max(0, int(round(wind.y_pixel(aper.y - hwidth))))
+        iy2 = min(wind.ny, int(round(wind.y_pixel(aper.y + hwidth))) + 1)
+
+        if ix2 - ix1 >= 4 and iy2 - iy1 >= 4:
+            stamp = wind.data[iy1:iy2, ix1:ix2]
+            stamp = stamp - np.median(stamp)
+            stamps.append(
+                (
+                    wnam,
+                    iy1,
+                    iy2,
+                    ix1,
+                    ix2,
+                    np.conj(np.fft.rfft2(stamp)),
+                    np.sqrt((stamp ** 2).sum()),
+                )
+            )
+
+    return {
+        "nframe": 0,
+        "stamps": stamps,
+        "positions": {apnam: (aper.x, aper.y) for apnam, aper in ccdaper.items()},
+    }
+
+
+def xcorrApers(cnam, ccd, rfile, store, xcorr, cmin=0.5):
+    """Moves all apertures by the shift of a frame relative to that in which
+    the stamps made by :func:`xcorrStamps` were taken. The shift of each
+    stamp is measured from the peak of its FFT-based cross-correlation with
+    the same region of 'ccd', refined to sub-pixel precision by fitting
+    parabolas through the peak and its neighbours. The shifts of the stamps
+    are averaged.
+
+    Arguments::
+
+       cnam : string
+           CCD label
+
+       ccd : CCD
+           the debiassed, flat-fielded CCD.
+
+       rfile : Rfile
+           reduce file configuration parameters
+
+       store : dict
+           see :func:`moveApers`. The entries for each aperture are
+           set if the shift is successfully measured.
+
+       xcorr : dict
+           the stamps returned by :func:`xcorrStamps`
+
+       cmin : float
+           minimum normalised cross-correlation for a stamp to be matched.
+
+    Returns True if the shift was measured. False is returned if any stamp is
+    poorly matched, or shifted by more than a quarter of its size, or if the
+    shifts of the stamps differ by more than fit_diff, in which case nothing
+    is changed.
+    """
+
+    ccdaper = rfile.aper[cnam]
+    if len(xcorr["stamps"]) == 0:
+        return False
+
+    shifts = []
+    for wnam, iy1, iy2, ix1, ix2, fstamp, snorm in xcorr["stamps"]:
+        wind = ccd[wnam]
+        data = wind.data[iy1:iy2, ix1:ix2]
+        data = data - np.median(data)
+        cnorm = snorm * np.sqrt((data ** 2).sum())
+
+        ccor = np.fft.irfft2(np.fft.rfft2(data) * fstamp, data.shape)
+        ny, nx = ccor.shape
+        iy, ix = np.unravel_index(ccor.argmax(), ccor.shape)
+        if cnorm <= 0 or ccor[iy, ix] < cmin * cnorm:
+            # poor match
+            return False
+
+        # signed shifts, binned pixels, with the sub-pixel correction
+        xs = (ix + nx // 2) % nx - nx // 2 + _peak_offset(
+            ccor[iy, (ix - 1) % nx], ccor[iy, ix], ccor[iy, (ix + 1) % nx]
+        )
+        ys = (iy + ny // 2) % ny - ny // 2 + _peak_offset(
+            ccor[(iy - 1) % ny, ix], ccor[iy, ix], ccor[(iy + 1) % ny, ix]
+        )
+        if abs(xs) > nx / 4 or abs(ys) > ny / 4:
+            # too large to be trusted given the cyclic nature of the FFT
+            return False
+
+        shifts.append((wind.xbin * xs, wind.ybin * ys))
+
+    # guard against inconsistent shifts as in moveApers
+    for n, (x1, y1) in enumerate(shifts[:-1]):
+        for x2, y2 in shifts[n + 1 :]:
+            if np.sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2) > rfile["apertures"]["fit_diff"]:
+                return False
+
+    xshift = sum(xs for xs, ys in shifts) / len(shifts)
+    yshift = sum(ys for xs, ys in shifts) / len(shifts)
+
+    for apnam, aper in ccdaper.items():
+        x0, y0 = xcorr["positions"][apnam]
+        store[apnam] = {
+            "xe": NaN,
+            "ye": NaN,
+            "fwhm": NaN,
+            "fwhme": NaN,
+            "beta": NaN,
+            "betae": NaN,
+            "dx": x0 + xshift - aper.x,
+            "dy": y0 + yshift - aper.y,
+        }
+        aper.x = x0 + xshift
+        aper.y = y0 + yshift
+
+    return True
+
+
+def _peak_offset(left, centre, right):
+    """Offset of the peak of a parabola through three equally-spaced values
+    from the position of the central one, which should be the largest"""
+    denom = left - 2 * centre + right
+    return 0.5 * (left - right) / denom if denom < 0 else 0.0
+
+
 class Panel:
     """
     Keeps track of the configuration of particular panels of plots so that
@@ -2889,10 +3585,26 @@ def toBool(rfile, section, param):
         )
 
 
+# The items per aperture in the log files and their data types
+LOG_APER_ITEMS = (
+    "x", "xe", "y", "ye", "fwhm", "fwhme", "beta", "betae", "counts",
+    "countse", "sky", "skye", "nsky", "nrej", "cmax", "flag",
+)
+LOG_APER_TYPES = 12 * ("f4",) + ("i4", "i4", "i4", "u4")
+
+
 class LogWriter:
     """Context manager to handle opening logfiles, writing headers to logfiles
     and safe exit.
 
+    According to general.logformat in the reduce file, the results are
+    written to the ASCII log 'filename' ('ascii'), to a binary log
+    ('binary'), or both ('both'). The binary log consists of a header file
+    with the name of the ASCII log but extension BLOG which contains the same
+    header as the ASCII log, plus one file per CCD with '.<CCD label>'
+    added, to which fixed-width records of the dtype defined in the header
+    are appended. It can be memory-mapped with :meth:`hipercam.hlog.Hlog.rbinary`.
+
     """
 
     def __init__(self, filename, rfile, hipercam_version, plist):
@@ -2901,19 +3613,49 @@ class LogWriter:
         self.hipercam_version = hipercam_version
         self.plist = plist
         self.toffset = rfile["general"]["toffset"]
+        self.logformat = rfile["general"].get("logformat", "ascii")
+        root, ext = os.path.splitext(filename)
+        self.bfilename = (root if ext == hcam.LOG else filename) + hcam.BLOG
 
     def __enter__(self):
-        # open filehandle, write header
-        self.log = open(self.filename, "w")
-        self.write_header()
+        # open filehandles, write headers
+        self.log, self.blogs, self.dtypes = None, {}, {}
+
+        if self.logformat != "binary":
+            self.log = open(self.filename, "w")
+            self.write_header(self.log)
+
+        if self.logformat != "ascii":
+            with open(self.bfilename, "w") as fout:
+                self.write_header(fout)
+
+            for cnam, ccdaper in self.rfile.aper.items():
+                if len(ccdaper) == 0:
+                    continue
+
+                # the record format, as defined in the header
+                names = ["nframe", "MJD", "MJDok", "Exptim", "mfwhm", "mbeta"]
+                dts = ["<i4", "<f8", "?", "<f4", "<f4", "<f4"]
+                for apnam in ccdaper:
+                    for item, dt in zip(LOG_APER_ITEMS, LOG_APER_TYPES):
+                        names.append("{:s}_{:s}".format(item, apnam))
+                        dts.append("<" + dt)
+                self.dtypes[cnam] = np.dtype(list(zip(names, dts)))
+                self.blogs[cnam] = open(
+                    "{:s}.{:s}".format(self.bfilename, cnam), "wb"
+                )
+
         return self
 
     def __exit__(self, *args):
-        self.log.close()
+        if self.log is not None:
+            self.log.close()
+        for blog in self.blogs.values():
+            blog.close()
 
     def write_results(self, results):
         """
-        Append results to open logfile.
+        Append results to open logfiles, ASCII and / or binary.
 
         Arguments::
 
@@ -2922,8 +3664,9 @@ class LogWriter:
               and list is a list of 8-element tuples each of which is composed
               of (nframe, store, ccdaper, results, mjdint, mjdfrac, mjdok, expose)
               storing all the relevant data for the CCD / exposure in question.
+
+        Returns with a list of alert messages for monitored apertures.
         """
-        monitor = self.rfile["monitor"]
 
         def float2str(value, form, sval=None):
             """Formats a float as a string accounting for NaNs. value is the value,
@@ -2939,6 +3682,16 @@ class LogWriter:
         for cnam, res in results:
             # Loop over all CCDs
 
+            if cnam in self.blogs:
+                # binary log, all frames of the group at once
+                self.write_records(cnam, res)
+
+                if self.log is None:
+                    # only need the alerts
+                    for nframe, store, ccdaper, reses, *rest in res:
+                        alerts += self.get_alerts(nframe, cnam, ccdaper, reses)
+                    continue
+
             for nframe, store, ccdaper, reses, mjdint, mjdfrac, mjdok, expose in res:
                 # Loop over all frames for the specific CCD group in question
 
@@ -2987,35 +3740,73 @@ class LogWriter:
                         )
                     )
 
-                    if apnam in monitor:
-                        # accumulate any problems with particular targets
-                        bitmasks = monitor[apnam]
-                        flag = r["flag"]
-                        messes = []
-                        for bitmask in bitmasks:
-                            if (flag & bitmask) and bitmask in hcam.FLAG_MESSAGES:
-                                messes.append(hcam.FLAG_MESSAGES[bitmask])
-
-                        if len(messes):
-                            alerts.append(
-                                " *** WARNING: Frame {:d}, CCD {:s}, aperture {:s}: {:s}".format(
-                                    nframe, cnam, apnam, ", ".join(messes)
-                                )
-                            )
-
                 # finish the line
                 self.log.write("\n")
 
-        # flush the buffer to ensure that we have complete lines if we hit ctrl-C
-        self.log.flush()
+                alerts += self.get_alerts(nframe, cnam, ccdaper, reses)
+
+        # flush the buffers to ensure that we have complete lines and records
+        # if we hit ctrl-C
+        if self.log is not None:
+            self.log.flush()
+        for blog in self.blogs.values():
+            blog.flush()
 
         # Return with the accumulated list of alerts.
         return alerts
 
-    def write_header(self):
+    def get_alerts(self, nframe, cnam, ccdaper, reses):
+        """Returns a list of messages about any problems with the apertures of
+        CCD 'cnam' which are being monitored."""
+        monitor = self.rfile["monitor"]
+        alerts = []
+        for apnam in ccdaper:
+            if apnam in monitor:
+                # accumulate any problems with particular targets
+                bitmasks = monitor[apnam]
+                flag = reses[apnam]["flag"]
+                messes = []
+                for bitmask in bitmasks:
+                    if (flag & bitmask) and bitmask in hcam.FLAG_MESSAGES:
+                        messes.append(hcam.FLAG_MESSAGES[bitmask])
+
+                if len(messes):
+                    alerts.append(
+                        " *** WARNING: Frame {:d}, CCD {:s}, aperture {:s}: {:s}".format(
+                            nframe, cnam, apnam, ", ".join(messes)
+                        )
+                    )
+        return alerts
+
+    def write_records(self, cnam, res):
+        """Appends the results for CCD 'cnam' from a group of frames to its
+        binary log as one record per frame. 'res' is as in write_results.
+        Values are converted to NaN exactly as they are in the ASCII log.
+        """
+        recs = np.empty(len(res), dtype=self.dtypes[cnam])
+        for n, (
+                nframe, store, ccdaper, reses, mjdint, mjdfrac, mjdok, expose
+        ) in enumerate(res):
+            mfwhm, mbeta = store["mfwhm"], store["mbeta"]
+            row = [
+                nframe, (mjdint - self.toffset) + mjdfrac, mjdok, expose,
+                NaN if mfwhm == -1. else mfwhm, NaN if mbeta == -1. else mbeta
+            ]
+            for apnam in ccdaper:
+                r = reses[apnam]
+                row += [r[item] for item in LOG_APER_ITEMS]
+                if r["fwhme"] == -1.:
+                    row[-11] = NaN
+            recs[n] = tuple(row)
+
+        self.blogs[cnam].write(recs.tobytes())
+
+    def write_header(self, log):
+        """Writes the header of the ASCII log, which also serves as that of
+        the binary log, to the file object 'log'."""
 
         # first, a general description
-        self.log.write(
+        log.write(
             """#
 # This is a logfile produced by the HiPERCAM pipeline command 'reduce'. It consists
 # of one line per reduced CCD per exposure. Each line contains all the information
@@ -3034,10 +3825,10 @@ class LogWriter:
 
         # second, list the command-line inputs to the logfile
         for line in self.plist:
-            self.log.write("# {:s}".format(line))
+            log.write("# {:s}".format(line))
 
         # third, list the reduce file
-        self.log.write(
+        log.write(
             """#
 # and here is a minimal version of the reduce file used ['rfile' above] with
 # all between-line comments removed for compactness:
@@ -3059,12 +3850,12 @@ class LogWriter:
                             continue
                         else:
                             skip = False
-                        self.log.write("#\n#   {:s}".format(line))
+                        log.write("#\n#   {:s}".format(line))
                     elif not skip:
-                        self.log.write("#   {:s}".format(line))
+                        log.write("#   {:s}".format(line))
 
         # fourth, write the apertures
-        self.log.write(
+        log.write(
             """#
 # Next here is the aperture file used in JSON-style format that (without
 # the initial comment hashes) is readable by setaper and reduce:
@@ -3077,11 +3868,11 @@ class LogWriter:
             "#   {:s}\n".format(line) for line in self.rfile.aper.toString().split("\n")
         ]
         for line in lines:
-            self.log.write(line)
+            log.write(line)
 
         # fifth the column names for each CCD which has any
         # apertures
-        self.log.write(
+        log.write(
             """#
 # Now follow column name definitions for each CCD. These include all apertures
 # of the CCD. Since there are 15 items stored per aperture and each column name
@@ -3147,10 +3938,10 @@ class LogWriter:
                     "counts_{0:s} countse_{0:s} sky_{0:s} skye_{0:s} "
                     "nsky_{0:s} nrej_{0:s} cmax_{0:s} flag_{0:s} ".format(apnam)
                 )
-            self.log.write(cnames + "\n")
+            log.write(cnames + "\n")
 
         # now the datatypes for building into structured arrays
-        self.log.write(
+        log.write(
             """#
 # End of column name definitions
 #
@@ -3169,11 +3960,11 @@ class LogWriter:
                 # apertures
                 continue
 
-            self.log.write(
+            log.write(
                 "# {:s} = s i4 f8 ? f4 f4 f4 {:s}\n".format(cnam, len(ccdaper) * atypes)
             )
 
-        self.log.write(
+        log.write(
             """#
 # End of data type definitions
 #
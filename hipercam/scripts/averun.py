@@ -268,6 +268,7 @@ def averun(args=None):
                 adjust,
                 "usemean=yes",
                 "plot=no",
+                "memory=1000",
                 "yes" if clobber else "no",
                 output,
             ]
@@ -284,6 +285,7 @@ def averun(args=None):
                 adjust,
                 "usemean=yes",
                 "plot=no",
+                "memory=1000",
                 "yes" if clobber else "no",
                 output,
             ]
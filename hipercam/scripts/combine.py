@@ -20,8 +20,8 @@ __all__ = [
 
 
 def combine(args=None):
-    """``combine list bias dark flat method (sigma) adjust (usemean) [plot clobber]
-    output``
+    """``combine list bias dark flat method (sigma) adjust (usemean) [plot
+    memory clobber] output``
 
     Combines a series of images defined by a list using median or clipped
     mean combination. Only combines those CCDs for which is_data() is true
@@ -66,6 +66,11 @@ def combine(args=None):
            make a plot of the mean versus frame number. This can provide a
            quick check that the frames are not too different.
 
+        memory : float [hidden]
+           memory to use for the frames being combined, MB. The frames are
+           combined in strips of rows small enough for all frames to fit
+           within this limit. This does not affect the result.
+
         clobber : bool [hidden]
            clobber any pre-existing output files
 
@@ -82,9 +87,13 @@ def combine(args=None):
 
     .. Note::
 
-       This routine reads all inputs into memory, so can be a bit of a
-       hog. However, it does so one CCD at a time to alleviate this. It will
-       fail if it cannot find a valid frame for any CCD.
+       This routine reads through the inputs one CCD at a time, first to
+       measure any adjustments, and then in strips of rows to combine them,
+       so that its memory use is set by 'memory' rather than the number of
+       frames. It will fail if it cannot find a valid frame for any CCD.
+       If a dark is subtracted, the bias and scaled dark are added together
+       before they are subtracted from each frame, which can change the
+       result in the last bit compared to subtracting them one by one.
 
     """
 
@@ -103,6 +112,7 @@ def combine(args=None):
         cl.register("adjust", Cline.LOCAL, Cline.PROMPT)
         cl.register("usemean", Cline.LOCAL, Cline.PROMPT)
         cl.register("plot", Cline.LOCAL, Cline.HIDE)
+        cl.register("memory", Cline.LOCAL, Cline.HIDE)
         cl.register("clobber", Cline.LOCAL, Cline.HIDE)
         cl.register("output", Cline.LOCAL, Cline.PROMPT)
 
@@ -178,6 +188,10 @@ def combine(args=None):
             plot = False
             usemean = False
 
+        memory = cl.get_value(
+            "memory", "memory to use for combining the frames [MB]", 1000.0, 1.0
+        )
+
         clobber = cl.get_value(
             "clobber", "clobber any pre-existing files on output", False
         )
@@ -204,106 +218,77 @@ def combine(args=None):
 
     template = hcam.MCCD.read(utils.add_extension(template_name, hcam.HCAM))
 
-    if bias is not None:
-        # crop the bias
-        bias = bias.crop(template)
-
-    if dark is not None:
-        # crop the dark
-        dark = dark.crop(template)
-
-    if flat is not None:
-        # crop the flat
-        flat = flat.crop(template)
+    # to apply the bias, dark and flat. It crops them to the format of the
+    # data.
+    calib = hcam.Calibrator(bias, dark, flat)
 
     # Now process each file CCD by CCD to reduce the memory
     # footprint
     for cnam in template:
 
-        # Read files into memory, insisting that they
-        # all have the same set of CCDs
-        print("\nLoading all CCDs labelled '{:s}' from {:s}".format(cnam, flist))
+        # First pass through the files, one at a time, to find those
+        # with data and any adjustments to make.
+        print("\nScanning all CCDs labelled '{:s}' from {:s}".format(cnam, flist))
 
-        ccds, means = [], []
+        fnames, scales, adjusts, means = [], [], [], []
         nrej, ntot = 0, 0
         with spooler.HcamListSpool(flist, cnam) as spool:
 
-            if bias is not None:
-                # extract relevant CCD from the bias
-                bccd = bias[cnam]
-                bexpose = bias.head.get("EXPTIME", 0.0)
-            else:
-                bexpose = 0.0
-
-            if dark is not None:
-                # extract relevant CCD from the dark
-                dccd = dark[cnam]
-                dexpose = dark.head["EXPTIME"]
-
-            if flat is not None:
-                # extract relevant CCD from the flat
-                fccd = flat[cnam]
-
             mean = None
             for ccd in spool:
 
                 if ccd.is_data():
 
-                    if bias is not None:
-                        # subtract bias
-                        ccd -= bccd
+                    fnames.append(ccd.head["FILENAME"])
+                    scales.append(calib.scale(ccd))
 
-                    if dark is not None:
-                        # subtract dark
-                        scale = (ccd.head["EXPTIME"] - bexpose) / dexpose
-                        ccd -= scale * dccd
+                    if adjust == "b" or adjust == "n":
 
-                    if flat is not None:
-                        # apply flat
-                        ccd /= fccd
+                        # calibrate in place, without caching the offsets
+                        # as each frame may have its own dark scale factor
+                        for wnam, wind in ccd.items():
+                            offset, fdata = calib.prepare_rows(
+                                cnam, ccd, wnam, 0, wind.ny, scales[-1]
+                            )
+                            calib.apply(wind.data, offset, fdata, wind.data)
 
-                    # keep the result
-                    ccds.append(ccd)
-
-                    if (adjust == "b" or adjust == "n") and mean is None:
-                        # store the first mean [median]
+                        # store the mean [median]
                         if usemean:
-                            mean = ccd.mean()
+                            cmean = ccd.mean()
                         else:
-                            mean = ccd.median()
+                            cmean = ccd.median()
+
+                        if mean is None:
+                            # the first one is the reference
+                            mean = cmean
+                        means.append(cmean)
 
-            if len(ccds) == 0:
+            if len(fnames) == 0:
                 raise hcam.HipercamError(
                     "Found no valid examples of CCD {:s}"
                     " in list = {:s}".format(cnam, flist)
                 )
 
             else:
-                print("Loaded {:d} CCDs".format(len(ccds)))
+                print("Found {:d} CCDs".format(len(fnames)))
 
         if adjust == "b" or adjust == "n":
 
-            # adjust the means
-            print("Computing and adjusting their mean levels")
-
-            # now carry out the adjustments
-            for ccd in ccds:
-                if usemean:
-                    cmean = ccd.mean()
-                else:
-                    cmean = ccd.median()
-
-                means.append(cmean)
-                if adjust == "b":
-                    ccd += mean - cmean
-                elif adjust == "n":
-                    ccd *= mean / cmean
+            # the adjustments to make
+            print("Computed their mean levels")
+            if adjust == "b":
+                adjusts = [mean - cmean for cmean in means]
+            elif adjust == "n":
+                adjusts = [mean / cmean for cmean in means]
 
             if plot:
                 plt.plot(means)
                 plt.plot(means, ".k")
                 plt.text(len(means) + 1, means[-1], cnam, va="center", ha="left")
 
+        else:
+            adjusts = len(fnames) * [None]
+
         # Finally, combine
         if method == "m":
             print("Combining them (median) and storing the result")
@@ -312,35 +297,72 @@ def combine(args=None):
         else:
             raise NotImplementedError("method = {:s} not implemented".format(method))
 
+        # Locate the windows of the CCD in each file once so that the strips
+        # below can be read directly
+        layouts = [
+            hcam.get_hcm_layout(utils.add_extension(fname, hcam.HCAM), cnam)
+            for fname in fnames
+        ]
+
         for wnam, wind in template[cnam].items():
 
-            # build list of all data arrays
-            arrs = [ccd[wnam].data for ccd in ccds]
-            arr3d = np.stack(arrs)
-
-            # at this point, arr3d is a 3D array, with the first dimension
-            # (axis=0) running over the images. We want to average / median
-            # over this axis.
-
-            if method == "m":
-                # median
-                wind.data = np.median(arr3d, axis=0)
-
-            elif method == "c":
-                # Cython routine avgstd requires np.float32 input
-                arr3d = arr3d.astype(np.float32)
-                if sigma > 0.0:
-                    avg, std, num = support.avgstd(arr3d, sigma)
-                    nrej += len(ccds) * num.size - num.sum()
-                    ntot += len(ccds) * num.size
-                else:
-                    avg = np.mean(arr3d, axis=0)
-                wind.data = avg
+            # The frames are combined in strips of rows small enough to
+            # keep the 3D array of all frames within the memory limit.
+            # Everything is done pixel by pixel, so the result is the
+            # same as combining whole windows.
+            nrow = int(memory * 1024 ** 2) // (
+                len(fnames) * wind.nx * wind.data.itemsize
+            )
+            nrow = min(max(1, nrow), wind.ny)
+
+            data = None
+            for y1 in range(0, wind.ny, nrow):
+                y2 = min(y1 + nrow, wind.ny)
+
+                # Read and calibrate the strip of each frame, building a
+                # 3D array with the first dimension (axis=0) running over
+                # the images. We want to average / median over this axis.
+                # The calibration is computed for the strip alone to stay
+                # within the memory limit.
+                arr3d = None
+                for n, fname in enumerate(fnames):
+                    strip = read_strip(fname, layouts[n], cnam, wnam, y1, y2)
+                    offset, fdata = calib.prepare_rows(
+                        cnam, template[cnam], wnam, y1, y2, scales[n]
+                    )
+                    calib.apply(strip, offset, fdata, strip)
+                    if adjust == "b":
+                        strip += adjusts[n]
+                    elif adjust == "n":
+                        strip *= adjusts[n]
+
+                    if arr3d is None:
+                        arr3d = np.empty((len(fnames),) + strip.shape, strip.dtype)
+                    arr3d[n] = strip
+
+                if method == "m":
+                    # median. arr3d is ours to overwrite.
+                    avg = np.median(arr3d, axis=0, overwrite_input=True)
+
+                elif method == "c":
+                    # Cython routine avgstd takes float32 or float64 input
+                    if sigma > 0.0:
+                        avg, std, num = support.avgstd(arr3d, sigma)
+                        nrej += len(fnames) * num.size - num.sum()
+                        ntot += len(fnames) * num.size
+                    else:
+                        avg = np.mean(arr3d, axis=0)
+
+                if data is None:
+                    data = np.empty((wind.ny, wind.nx), avg.dtype)
+                data[y1:y2] = avg
+
+            wind.data = data
 
         # Add history
         if method == "m":
             template[cnam].head.add_history(
-                "Median combine of {:d} images".format(len(ccds))
+                "Median combine of {:d} images".format(len(fnames))
             )
         elif method == "c":
             print(
@@ -350,7 +372,7 @@ def combine(args=None):
             )
             template[cnam].head.add_history(
                 "Clipped mean combine of {:d} images, sigma = {:.1f}".format(
-                    len(ccds), sigma
+                    len(fnames), sigma
                 )
             )
 
@@ -363,3 +385,20 @@ def combine(args=None):
         plt.xlabel("Frame number")
         plt.ylabel("Mean counts")
         plt.show()
+
+
+def read_strip(fname, layout, cnam, wnam, y1, y2):
+    """Reads rows y1 to y2 (array indices, y2 excluded) of Window 'wnam' of
+    CCD 'cnam' from the hcm file 'fname', the windows of which are located
+    by 'layout', as returned by :func:`hipercam.get_hcm_layout`. Only the
+    rows needed are read. The data are converted to float32 unless they are
+    float64, as when whole frames are read."""
+
+    if wnam not in layout:
+        raise hcam.HipercamError(
+            "Could not find window {:s} of CCD {:s} in {:s}".format(wnam, cnam, fname)
+        )
+
+    return hcam.read_hcm_rows(
+        utils.add_extension(fname, hcam.HCAM), layout[wnam], y1, y2
+    )
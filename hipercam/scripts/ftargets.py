@@ -578,52 +578,43 @@ def ftargets(args=None):
 
                                 # buffer for storing the FWHMs, including NaNs
                                 # for the ones thet are skipped
-                                fwhms = np.zeros_like(peaks, dtype=np.float32)
-                                betas = np.zeros_like(peaks, dtype=np.float32)
+                                fwhms = np.full_like(peaks, np.nan, dtype=np.float32)
+                                betas = np.full_like(peaks, np.nan, dtype=np.float32)
                                 nfevs = np.zeros_like(peaks, dtype=np.int32)
 
-                                for i, (x, y, peak, fwhm) in enumerate(
-                                        zip(
-                                            objects["x"],
-                                            objects["y"],
-                                            peaks,
-                                            objects["fwhm"],
+                                # extract fit Windows of selected targets
+                                fits = []
+                                for i in sorted(dfwhms):
+                                    x, y = objects["x"][i], objects["y"][i]
+                                    try:
+                                        fwind = wind.window(
+                                            x - rmin, x + rmin, y - rmin, y + rmin
                                         )
-                                ):
-                                    # fit FWHMs of selected targets
-
-                                    if i in dfwhms:
-
-                                        try:
-                                            # extract fit Window
-                                            fwind = wind.window(
-                                                x - rmin, x + rmin, y - rmin, y + rmin
+                                        fits.append((i, fwind))
+                                    except hcam.HipercamError as err:
+                                        emessages.append(
+                                            " >> Targ {:d}: fit failed ***: {!s}".format(
+                                                i, err
                                             )
-
-                                            # fit profile
-                                            ofwhm = fwhm
-                                            obeta = beta
-                                            (
-                                                (sky, height, x, y, fwhm, beta),
-                                                epars,
-                                                (
-                                                    wfit,
-                                                    X,
-                                                    Y,
-                                                    sigma,
-                                                    chisq,
-                                                    nok,
-                                                    nrej,
-                                                    npar,
-                                                    nfev,
-                                                ),
-                                            ) = hcam.fitting.fitMoffat(
+                                        )
+                                        nfail += 1
+
+                                # fit the first profile on its own so that
+                                # its beta can seed the others, then fit the
+                                # rest all at once
+                                inds = [i for i, fwind in fits]
+                                results = []
+                                if len(fits):
+                                    i, fwind = fits[0]
+                                    try:
+                                        results.append(
+                                            hcam.fitting.fitMoffat(
                                                 fwind,
                                                 None,
-                                                peak,
-                                                x,
-                                                y,
-                                                fwhm,
+                                                peaks[i],
+                                                objects["x"][i],
+                                                objects["y"][i],
+                                                objects["fwhm"][i],
                                                 2.0,
                                                 False,
                                                 beta,
@@ -635,28 +626,61 @@ def ftargets(args=None):
                                                 1,
                                                 max_nfev,
                                             )
-                                            fwhms[i] = fwhm
-                                            betas[i] = beta
-                                            nfevs[i] = nfev
-
-                                            # keep value of beta for next round under control
-                                            beta = min(beta_max, max(beta_min, beta))
-
-                                        except hcam.HipercamError as err:
-                                            emessages.append(
-                                                " >> Targ {:d}: fit failed ***: {!s}".format(
-                                                    i, err
-                                                )
+                                        )
+                                        fbeta = results[0][0][5]
+                                        beta = min(beta_max, max(beta_min, fbeta))
+                                    except hcam.HipercamError as err:
+                                        results.append(err)
+
+                                results += hcam.fitting.fitMoffatBatch(
+                                    [fwind for i, fwind in fits[1:]],
+                                    None,
+                                    peaks[inds[1:]],
+                                    objects["x"][inds[1:]],
+                                    objects["y"][inds[1:]],
+                                    objects["fwhm"][inds[1:]],
+                                    2.0,
+                                    False,
+                                    (len(fits) - 1) * [beta],
+                                    beta_max,
+                                    False,
+                                    (len(fits) - 1) * [readout],
+                                    (len(fits) - 1) * [gain],
+                                    rej,
+                                    1,
+                                    max_nfev,
+                                )
+
+                                for i, result in zip(inds, results):
+                                    if isinstance(result, hcam.HipercamError):
+                                        emessages.append(
+                                            " >> Targ {:d}: fit failed ***: {!s}".format(
+                                                i, result
                                             )
-                                            fwhms[i] = np.nan
-                                            betas[i] = np.nan
-                                            nfevs[i] = 0
-                                            nfail += 1
+                                        )
+                                        nfail += 1
                                     else:
-                                        # skip this one
-                                        fwhms[i] = np.nan
-                                        betas[i] = np.nan
-                                        nfevs[i] = 0
+                                        (
+                                            (sky, height, x, y, fwhm, fbeta),
+                                            epars,
+                                            (
+                                                wfit,
+                                                X,
+                                                Y,
+                                                sigma,
+                                                chisq,
+                                                nok,
+                                                nrej,
+                                                npar,
+                                                nfev,
+                                            ),
+                                        ) = result
+                                        fwhms[i] = fwhm
+                                        betas[i] = fbeta
+                                        nfevs[i] = nfev
+
+                                        # keep value of beta for next round under control
+                                        beta = min(beta_max, max(beta_min, fbeta))
 
                                 # tack on frame number & window name
                                 frames = (nf + first) * np.ones(
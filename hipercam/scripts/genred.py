@@ -893,10 +893,29 @@ skipbadt = {skipbadt}
 # also an advantage in terms of reducing parallelisation overheads in
 # reading frames a few at a time before processing. This is controlled
 # using 'ngroup'. i.e. with ngroup=10, 10 full frames are read before
-# being processed. This parameter is ignored if ncpu==1
+# being processed. This parameter is ignored if ncpu==1. Setting
+# 'shared = yes' passes the frames to the parallel processes through
+# shared memory instead of copying them which cuts the overheads
+# further, especially for large frames. If the apertures are fixed
+# (see location in the [apertures] section), each frame can be
+# reduced independently and 'parallel = frame' splits the ngroup
+# frames of each CCD between the CPUs too, so that more CPUs than
+# CCDs can be used. Set ngroup to a good multiple of ncpu in this
+# case. 'parallel = ccd' is the default.
 
 ncpu = {ncpu}
 ngroup = {ngroup}
+shared = no
+parallel = ccd
+
+# The results can be written to the ASCII log, to a binary log, or
+# both ('logformat' = 'ascii', 'binary' or 'both'). The binary log has
+# the name of the ASCII log but extension '.hlb', and holds the same
+# header; each CCD's results go to a file of fixed-width records with
+# '.<CCD label>' added. It is much faster to load, which can be done
+# with hipercam.hlog.Hlog.rbinary.
+
+logformat = ascii
 
 # The next section '[apertures]' defines how the apertures are
 # re-positioned from frame to frame. Apertures are re-positioned
@@ -981,6 +1000,22 @@ ngroup = {ngroup}
 # by 'fit_diff'. If exceeded, then the entire extraction will be
 # aborted and positions held fixed.
 
+# Setting location = xcorr can save a lot of time on fast cadence
+# runs. The profile fits are then only carried out every 'xcorr_refit'
+# frames. In between, all apertures are moved by the shift of the
+# frame measured by cross-correlating the data around the reference
+# apertures ('search_half_width' sets the size) with the data of the
+# last frame fitted. The fits are carried out again whenever this
+# fails. The relative positions of the apertures are held fixed in
+# between fits.
+
+# Setting fit_track = yes starts the fit of each aperture from the
+# results of its last successful fit. The fit is then skipped if a
+# single linearised step predicts that the aperture will move by less
+# than 'fit_skip_tol' (unbinned pixels; 0 to always fit). 'fit_max_reject'
+# caps the number of passes of pixel rejection per fit (-1 for no limit).
+# The numbers of fits carried out and skipped are reported at the end.
+
 # To get and idea of the right values of some of these parameters, in
 # particular the 'search_half_width', the height thresholds,
 # 'fit_max_shift' and 'fit_diff', the easiest approach is probably to
@@ -988,7 +1023,8 @@ ngroup = {ngroup}
 
 [apertures]
 aperfile = {apfile} # file of software apertures for each CCD
-location = {location} # aperture locations: 'fixed' or 'variable'
+location = {location} # aperture locations: 'fixed', 'variable' or 'xcorr'
+xcorr_refit = 20 # frames between profile fits if location = 'xcorr'
 
 search_half_width = {search_half_width:d} # for initial search for objects around previous position, unbinned pixels
 search_smooth_fwhm = {smooth_fwhm:.1f} # smoothing FWHM, binned pixels
@@ -1009,6 +1045,9 @@ fit_height_min_nrf = {height_min_nrf:.1f} # minimum height to accept a fit, non-
 fit_max_shift = {fit_max_shift:.1f} # max. non-ref. shift, unbinned pixels.
 fit_alpha = {fit_alpha:.2f} # Fraction of non-reference aperture shift to apply
 fit_diff = {fit_diff:.2f} # Maximum differential shift of multiple reference apertures
+fit_track = no # start fits from the last fit of each aperture
+fit_skip_tol = 0.0 # skip fits predicted to move less than this, unbinned pixels
+fit_max_reject = -1 # maximum passes of pixel rejection per fit, -1 for no limit
 
 # The next lines define how the apertures will be re-sized and how the
 # flux will be extracted from the aperture. There is one line per CCD
@@ -182,7 +182,7 @@ def grab(args=None):
     total_time = 0  # time waiting for new frame
     nframe = first
     root = os.path.basename(resource)
-    bframe = None
+    calib = None
 
     # Finally, we can go
     if temp:
@@ -194,7 +194,7 @@ def grab(args=None):
         )
         os.makedirs(tdir, exist_ok=True)
 
-    with spooler.data_source(source, resource, first) as spool:
+    with spooler.data_source(source, resource, first, prefetch=2, mmap=True) as spool:
 
         try:
 
@@ -219,17 +219,13 @@ def grab(args=None):
                     hcam.ccd.trim_ultracam(mccd, ncol, nrow)
 
                 if bias is not None:
-                    # read bias after first frame so we can
-                    # chop the format
-                    if bframe is None:
+                    # read bias after first frame. The calibrator
+                    # chops it to the format of the data.
+                    if calib is None:
+                        calib = hcam.Calibrator(hcam.MCCD.read(bias))
 
-                        # read the bias frame
-                        bframe = hcam.MCCD.read(bias)
-
-                        # reformat
-                        bframe = bframe.crop(mccd)
-
-                    mccd -= bframe
+                    # subtract it in place
+                    calib(mccd, mccd)
 
                 if dtype == "u16":
                     mccd.uint16()
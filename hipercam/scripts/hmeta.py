@@ -42,7 +42,10 @@ def hmeta(args=None):
     It also know about the different amplifier outputs of the
     instruments and starts by subtracting the medians of each
     amplifier output to avoif being disturbed by variable mean bias
-    offsets.
+    offsets. For ULTRACAM and ULTRASPEC it also writes an index file
+    (.idx) next to each run's .dat file if there is not an up-to-date
+    one already. This holds the times of every frame, which allows
+    later random access reads of the run to have reliable times.
 
     hmeta takes a good while to run, so be nice when running it.
 
@@ -143,6 +146,13 @@ def hmeta(args=None):
             try:
                 if itype == 'U':
                     rdat = hcam.ucam.Rdata(dfile)
+                    if rdat.index is None:
+                        # index the run so that the frames sampled below,
+                        # and later random access reads, get reliable times
+                        try:
+                            rdat.index = hcam.ucam.make_index(dfile)
+                        except OSError as err:
+                            print(f'  {dfile} -- could not write index: {err}')
                 else:
                     rdat = hcam.hcam.Rdata(dfile, 1, False, False)
                 print(f"  {dfile}")
@@ -196,6 +196,7 @@ has been determined with respect to clears."""
             "b",
             "yes",
             "yes" if plot else "no",
+            "1000",
             "yes",
             output,
         ]
@@ -195,6 +195,7 @@ has been determined with respect to clears."""
             "c",
             str(sigma),
             "i",
+            "1000",
             "yes",
             output,
         ]
@@ -854,8 +854,8 @@ def extractFlux(cnam, ccd, rccd, read, gain, ccdwin, rfile, store):
     y2 = max([ap.y + ap.rsky2 + wdata.ybin for ap in ccdaper.values()])
 
     # extract sub-Windows
-    swdata = wdata.window(x1, x2, y1, y2)
-    swraw = wraw.window(x1, x2, y1, y2)
+    swdata = wdata.view(x1, x2, y1, y2)
+    swraw = wraw.view(x1, x2, y1, y2)
 
     # compute pixel positions of apertures in windows
     xpos, ypos = zip(
@@ -3,6 +3,7 @@ import sys
 import multiprocessing
 import numpy as np
 import warnings
+from numba import jit
 
 import hipercam as hcam
 from hipercam import cline, utils, spooler, fitting
@@ -388,9 +389,6 @@ def reduce(args=None):
         rfile, ccds, nx, plot_lims, implot, lplot
     )
 
-    # a couple of initialisations
-    total_time = 0  # time waiting for new frame
-
     if lplot:
         lbuffer, xbuffer, ybuffer, tbuffer, sbuffer = setup_plot_buffers(rfile)
     else:
@@ -408,19 +406,23 @@ def reduce(args=None):
         else:
             pool = None
 
-        # whether some parameters have been initialised
-        initialised = False
+        # The frames pass through a pipeline of stages, each running in its
+        # own thread: reading (within the spooler), calibration, aperture
+        # re-positioning and extraction, and writing to the log file. The
+        # plots are updated in this thread. 'state' holds what the stages
+        # need to share.
+        state = {"processor": None, "calibrator": None}
 
-        # containers for the processed and raw MCCD groups
-        # and their frame numbers
-        pccds, mccds, nframes = [], [], []
+        def calibrate_stage(spool):
+            """Generator of groups of calibrated frames and their raw
+            counterparts and frame numbers"""
 
-        ##############################################
-        #
-        # Finally, start winding through the frames
-        #
+            # containers for the processed and raw MCCD groups
+            # and their frame numbers
+            pccds, mccds, nframes = [], [], []
 
-        with spooler.data_source(source, resource, first, full=False) as spool:
+            # time waiting for new frame
+            total_time = 0
 
             # 'spool' is an iterable source of MCCDs
             for nf, mccd in enumerate(spool):
@@ -433,58 +435,8 @@ def reduce(args=None):
                     )
 
                     if give_up:
-                        # Giving up, but need to handle any partially filled
-                        # frame group
-
-                        if len(mccds):
-                            # finish processing remaining frames. This step
-                            # will only occur if we have at least once passed
-                            # to later stages during which read and gain will
-                            # be set up
-                            results = processor(pccds, mccds, nframes)
-
-                            # write out results to the log file
-                            alerts = logfile.write_results(results)
-
-                            # print out any accumulated alert messages
-                            if len(alerts):
-                                print("\n".join(alerts))
-
-                            update_plots(
-                                results,
-                                rfile,
-                                implot,
-                                lplot,
-                                imdev,
-                                lcdev,
-                                pccd,
-                                ccds,
-                                msub,
-                                nx,
-                                iset,
-                                plo,
-                                phi,
-                                ilo,
-                                ihi,
-                                xlo,
-                                xhi,
-                                ylo,
-                                yhi,
-                                lpanel,
-                                xpanel,
-                                ypanel,
-                                tpanel,
-                                spanel,
-                                tkeep,
-                                lbuffer,
-                                xbuffer,
-                                ybuffer,
-                                tbuffer,
-                                sbuffer,
-                            )
-                            mccds = []
-
-                        print("reduce finished")
+                        # Giving up, but any partially filled frame group
+                        # is still passed on below
                         break
 
                     elif try_again:
@@ -505,54 +457,7 @@ def reduce(args=None):
 
                 if source != "hf" and last and nframe > last:
                     # finite last frame number
-
-                    if len(mccds):
-                        # finish processing remaining frames
-                        results = processor(pccds, mccds, nframes)
-
-                        # write out results to the log file
-                        alerts = logfile.write_results(results)
-
-                        # print out any accumulated alert messages
-                        if len(alerts):
-                            print("\n".join(alerts))
-
-                        update_plots(
-                            results,
-                            rfile,
-                            implot,
-                            lplot,
-                            imdev,
-                            lcdev,
-                            pccd,
-                            ccds,
-                            msub,
-                            nx,
-                            iset,
-                            plo,
-                            phi,
-                            ilo,
-                            ihi,
-                            xlo,
-                            xhi,
-                            ylo,
-                            yhi,
-                            lpanel,
-                            xpanel,
-                            ypanel,
-                            tpanel,
-                            spanel,
-                            tkeep,
-                            lbuffer,
-                            xbuffer,
-                            ybuffer,
-                            tbuffer,
-                            sbuffer,
-                        )
-                        mccds = []
-
                     print("\nHave reduced up to the last frame set.")
-                    print("reduce finished")
                     break
 
                 print(
@@ -564,100 +469,80 @@ def reduce(args=None):
                     end="" if implot else "\n",
                 )
 
-                if not initialised:
+                if state["processor"] is None:
                     # This is the first frame  which allows us to make
                     # some checks and initialisations.
                     read, gain, ok = initial_checks(mccd, rfile)
+                    if not ok:
+                        return
 
                     # Define the CCD processor function object
-                    processor = ProcessCCDs(rfile, read, gain, ccdproc, pool)
+                    state["processor"] = ProcessCCDs(
+                        rfile,
+                        read,
+                        gain,
+                        ccdproc,
+                        pool,
+                        rfile["general"]["shared"],
+                        ncpu if rfile["general"]["parallel"] == "frame" else 1,
+                    )
 
-                    # set flag to show we are set
-                    if not ok:
-                        break
-                    initialised = True
-
-                # De-bias the data. Retain a copy of the raw data as 'mccd'
-                # in order to judge saturation. Processed data called 'pccd'
-                if rfile.bias is not None:
-                    # subtract bias
-                    pccd = mccd - rfile.bias
-                    bexpose = rfile.bias.head.get("EXPTIME", 0.0)
-                else:
-                    # no bias subtraction
-                    pccd = mccd.copy()
-                    bexpose = 0.0
-
-                if rfile.dark is not None:
-                    # subtract dark, CCD by CCD
-                    dexpose = rfile.dark.head["EXPTIME"]
-                    for cnam in pccd:
-                        ccd = pccd[cnam]
-                        cexpose = ccd.head["EXPTIME"]
-                        scale = (cexpose - bexpose) / dexpose
-                        ccd -= scale * rfile.dark[cnam]
-
-                if rfile.flat is not None:
-                    # apply flat field to processed frame
-                    pccd /= rfile.flat
-
-                if rfile["focal_mask"]["demask"]:
-                    # attempt to correct for poorly placed frame
-                    # transfer mask causing a step illumination in the
-                    # y-direction. Loop through all windows of all
-                    # CCDs. Also include a stage where we average in
-                    # the Y direction to try to eliminate high pixels.
-                    dthresh = rfile["focal_mask"]["dthresh"]
-
-                    for cnam, ccd in pccd.items():
-                        for wnam, wind in ccd.items():
-
-                            # form mean in Y direction, then try to
-                            # mask out high pixels
-                            ymean = np.mean(wind.data, 0)
-                            xmask = ymean == ymean
-                            while 1:
-                                # rejection cycle, rejecting
-                                # overly positive pixels
-                                ave = ymean[xmask].mean()
-                                rms = ymean[xmask].std()
-                                diff = ymean - ave
-                                diff[~xmask] = 0
-                                imax = np.argmax(diff)
-                                if diff[imax] > dthresh * rms:
-                                    xmask[imax] = False
-                                else:
-                                    break
-
-                            # form median in X direction
-                            xmedian = np.median(wind.data[:, xmask], 1)
-
-                            # subtract it's median to avoid removing
-                            # general background
-                            xmedian -= np.median(xmedian)
-
-                            # now subtract from 2D image using
-                            # broadcasting rules
-                            wind.data -= xmedian.reshape((len(xmedian), 1))
+                    # and the calibrator, after initial_checks has cropped
+                    # the calibration frames
+                    state["calibrator"] = hcam.Calibrator(
+                        rfile.bias, rfile.dark, rfile.flat
+                    )
 
                 # Acummulate frames into processing groups for faster
-                # parallelisation
-                pccds.append(pccd)
+                # parallelisation. Retain the raw data as 'mccd' in order
+                # to judge saturation.
+                pccds.append(calibrate(mccd, rfile, state["calibrator"]))
                 mccds.append(mccd)
                 nframes.append(nframe)
 
                 if len(pccds) == rfile["general"]["ngroup"]:
-                    # parallel processing. This should usually be the first
-                    # points at which it takes place
-                    results = processor(pccds, mccds, nframes)
+                    yield pccds, mccds, nframes
+
+                    # Reset the frame buffers
+                    pccds, mccds, nframes = [], [], []
+
+            if len(pccds):
+                # remaining frames
+                yield pccds, mccds, nframes
+
+        def extract_stage(groups):
+            """Generator of the last processed frame and the reduction results
+            of each group of frames"""
+            for pccds, mccds, nframes in groups:
+                # parallel processing
+                yield pccds[-1], state["processor"](pccds, mccds, nframes)
+
+        def log_stage(reduced):
+            """Writes out the results to the log file, passing them on"""
+            for pccd, results in reduced:
+                alerts = logfile.write_results(results)
 
-                    # write out results to the log file
-                    alerts = logfile.write_results(results)
+                # print out any accumulated alert messages
+                if len(alerts):
+                    print("\n".join(alerts))
 
-                    # print out any accumulated alert messages
-                    if len(alerts):
-                        print("\n".join(alerts))
+                yield pccd, results
 
+        ##############################################
+        #
+        # Finally, start winding through the frames
+        #
+
+        # frames are read ahead on a separate thread by the spooler
+        with spooler.data_source(
+            source, resource, first, prefetch=2, full=False, mmap=True
+        ) as spool:
+
+            with spooler.Pipeline(
+                spool, (calibrate_stage, extract_stage, log_stage), 2
+            ) as pipe:
+
+                for pccd, results in pipe:
                     update_plots(
                         results,
                         rfile,
@@ -665,7 +550,7 @@ def reduce(args=None):
                         lplot,
                         imdev,
                         lcdev,
-                        pccds[-1],
+                        pccd,
                         ccds,
                         msub,
                         nx,
@@ -691,55 +576,20 @@ def reduce(args=None):
                         sbuffer,
                     )
 
-                    # Reset the frame buffers
-                    pccds, mccds, nframes = [], [], []
-
-        if len(mccds):
-            # out of loop now. Finish processing any remaining
-            # frames.
-            results = processor(pccds, mccds, nframes)
-
-            # write out results to the log file
-            alerts = logfile.write_results(results)
-
-            # print out any accumulated alert messages
-            if len(alerts):
-                print("\n".join(alerts))
+        if state["processor"] is not None:
+            print("reduce finished")
 
-            update_plots(
-                results,
-                rfile,
-                implot,
-                lplot,
-                imdev,
-                lcdev,
-                pccd,
-                ccds,
-                msub,
-                nx,
-                iset,
-                plo,
-                phi,
-                ilo,
-                ihi,
-                xlo,
-                xhi,
-                ylo,
-                yhi,
-                lpanel,
-                xpanel,
-                ypanel,
-                tpanel,
-                spanel,
-                tkeep,
-                lbuffer,
-                xbuffer,
-                ybuffer,
-                tbuffer,
-                sbuffer,
-            )
+            if rfile["apertures"]["fit_track"]:
+                # report on the profile fits saved
+                for cnam, store in state["processor"].store.items():
+                    print(
+                        "CCD {:s}: {:d} profile fits performed, {:d} skipped".format(
+                            cnam, store.get("nfit", 0), store.get("nskip", 0)
+                        )
+                    )
 
-            print("reduce finished")
+            # release any shared memory
+            state["processor"].close()
 
 
 ###################################################################
@@ -748,6 +598,63 @@ def reduce(args=None):
 # the same name but different action are located in psf_reduce
 
 
+def calibrate(mccd, rfile, calib=None):
+    """Returns a calibrated copy of the raw frame 'mccd', i.e. de-biassed,
+    dark-subtracted and flat-fielded according to the reduce file 'rfile',
+    and de-masked if so set. 'calib' is a :class:`hipercam.Calibrator` set
+    up with the calibration frames of 'rfile', which should be kept from
+    frame to frame so that its cropped frames are re-used. One is created
+    if it is not set.
+    """
+
+    if calib is None:
+        calib = hcam.Calibrator(rfile.bias, rfile.dark, rfile.flat)
+
+    # bias, dark and flat in one pass
+    pccd = calib(mccd)
+
+    if rfile["focal_mask"]["demask"]:
+        # attempt to correct for poorly placed frame
+        # transfer mask causing a step illumination in the
+        # y-direction. Loop through all windows of all
+        # CCDs. Also include a stage where we average in
+        # the Y direction to try to eliminate high pixels.
+        dthresh = rfile["focal_mask"]["dthresh"]
+
+        for cnam, ccd in pccd.items():
+            for wnam, wind in ccd.items():
+
+                # form mean in Y direction, then try to
+                # mask out high pixels
+                ymean = np.mean(wind.data, 0)
+                xmask = ymean == ymean
+                while 1:
+                    # rejection cycle, rejecting
+                    # overly positive pixels
+                    ave = ymean[xmask].mean()
+                    rms = ymean[xmask].std()
+                    diff = ymean - ave
+                    diff[~xmask] = 0
+                    imax = np.argmax(diff)
+                    if diff[imax] > dthresh * rms:
+                        xmask[imax] = False
+                    else:
+                        break
+
+                # form median in X direction
+                xmedian = np.median(wind.data[:, xmask], 1)
+
+                # subtract it's median to avoid removing
+                # general background
+                xmedian -= np.median(xmedian)
+
+                # now subtract from 2D image using
+                # broadcasting rules
+                wind.data -= xmedian.reshape((len(xmedian), 1))
+
+    return pccd
+
+
 def ccdproc(cnam, ccds, rccds, nframes, read, gain, ccdwin, rfile, store):
     """Processing steps for a sequential set of images from the same
     CCD. This is designed for parallelising the processing across CCDs
@@ -816,12 +723,14 @@ def ccdproc(cnam, ccds, rccds, nframes, read, gain, ccdwin, rfile, store):
         # extractFlux for compatibility with multiprocessing. Note
         results = extractFlux(cnam, ccd, rccd, read, gain, ccdwin, rfile, store)
 
-        # Save the essentials
+        # Save the essentials. The store and apertures are copied as they
+        # stand for this frame since the next frames change them in place
+        # while these results are logged and plotted.
         res.append(
             (
                 nframe,
-                store,
-                rfile.aper[cnam],
+                dict(store),
+                rfile.aper[cnam].copy(),
                 results,
                 ccd.head["MJDINT"],
                 ccd.head["MJDFRAC"],
@@ -833,6 +742,367 @@ def ccdproc(cnam, ccds, rccds, nframes, read, gain, ccdwin, rfile, store):
     return (cnam, res)
 
 
+# Caches used by aperture_geometry: of aperture geometries, keyed on the
+# Window format and the aperture position and shape, and of the pixel grids
+# of the sub-windows around apertures, keyed on the Window format and the
+# integer pixel position of the sub-window. Each is cleared if it grows
+# beyond GEOMETRY_CACHE_SIZE entries.
+_geometry_cache = {}
+_grid_cache = {}
+GEOMETRY_CACHE_SIZE = 1000
+
+
+def aperture_geometry(wind, aper):
+    """Works out which pixels of the Window 'wind' are needed to extract the
+    flux in Aperture 'aper', and with what weights. These depend only upon the
+    format of the Window and the position and radii of the Aperture and so are
+    cached to avoid re-computing them when these do not change from one frame
+    to the next, as is the case for fixed apertures. Apertures that move
+    usually stay within the same pixels, so the pixel grid and indices of
+    the region around them are cached separately, keyed on its integer pixel
+    position, leaving only the distances and weights to be computed for
+    each new position. Each set is returned as a dictionary with:
+
+       'flag' : int
+          bitmask with SKY_AT_EDGE and TARGET_AT_EDGE set as appropriate.
+
+       'sky' : tuple
+          (iy,ix), the array indices of the sky pixels within the Window,
+          accounting for masks and extra apertures.
+
+       'targ' : tuple
+          (iy,ix), the array indices of the target pixels within the Window,
+          including those of extra apertures.
+
+       'tsel' : array
+          bool array selecting those of the target pixels that lie in the
+          target aperture itself, as used to check for saturation.
+
+       'wtarg' : array
+          the weights of the target pixels, tapered as they approach the
+          edge of the aperture.
+
+       'xtarg', 'ytarg' : array
+          X and Y offsets from the aperture centre of the target pixels.
+
+    The arrays are shared between calls and must not be modified. Raises a
+    HipercamError if the Aperture does not overlap the Window.
+    """
+
+    key = (
+        wind.llx,
+        wind.lly,
+        wind.nx,
+        wind.ny,
+        wind.xbin,
+        wind.ybin,
+        aper.x,
+        aper.y,
+        aper.rtarg,
+        aper.rsky1,
+        aper.rsky2,
+        tuple(tuple(mask) for mask in aper.mask),
+        tuple(tuple(extra) for extra in aper.extra),
+    )
+
+    geom = _geometry_cache.get(key)
+    if geom is not None:
+        return geom
+
+    # this is the region of interest
+    x1, x2, y1, y2 = (
+        aper.x - aper.rsky2 - wind.xbin,
+        aper.x + aper.rsky2 + wind.xbin,
+        aper.y - aper.rsky2 - wind.ybin,
+        aper.y + aper.rsky2 + wind.ybin,
+    )
+
+    # sub-window. Only its format is needed
+    swind = hcam.Wingeom.window(wind, x1, x2, y1, y2)
+
+    gkey = key[:6] + (swind.llx, swind.lly, swind.nx, swind.ny)
+    grid = _grid_cache.get(gkey)
+    if grid is None:
+        # X, Y arrays of the pixel centres over the sub-window, and the
+        # offsets of the sub-window within the Window
+        XP, YP = np.meshgrid(swind.x(np.arange(swind.nx)), swind.y(np.arange(swind.ny)))
+        grid = (
+            XP,
+            YP,
+            (swind.llx - wind.llx) // wind.xbin,
+            (swind.lly - wind.lly) // wind.ybin,
+        )
+        if len(_grid_cache) >= GEOMETRY_CACHE_SIZE:
+            _grid_cache.clear()
+        _grid_cache[gkey] = grid
+    XP, YP, ix, iy = grid
+
+    # some checks for possible problems. bitmask flags will be set if
+    # they are encountered.
+    flag = hcam.ALL_OK
+    xlo, xhi, ylo, yhi = swind.extent()
+    if (
+        xlo > aper.x - aper.rsky2
+        or xhi < aper.x + aper.rsky2
+        or ylo > aper.y - aper.rsky2
+        or yhi < aper.y + aper.rsky2
+    ):
+        # the sky aperture overlaps the edge of the window
+        flag |= hcam.SKY_AT_EDGE
+
+    if (
+        xlo > aper.x - aper.rtarg
+        or xhi < aper.x + aper.rtarg
+        or ylo > aper.y - aper.rtarg
+        or yhi < aper.y + aper.rtarg
+    ):
+        # the target aperture overlaps the edge of the window
+        flag |= hcam.TARGET_AT_EDGE
+
+    for xoff, yoff in aper.extra:
+        rout = np.sqrt(xoff ** 2 + yoff ** 2) + aper.rtarg
+        if (
+            xlo > aper.x - rout
+            or xhi < aper.x + rout
+            or ylo > aper.y - rout
+            or yhi < aper.y + rout
+        ):
+            # an extra target aperture overlaps the edge of the window
+            flag |= hcam.TARGET_AT_EDGE
+
+    # compute X, Y arrays over the sub-window relative to the centre
+    # of the aperture and the distance squared from the centre (Rsq)
+    # to save a little effort.
+    X, Y = XP - aper.x, YP - aper.y
+    Rsq = X ** 2 + Y ** 2
+
+    # squared aperture radii for comparison
+    R1sq, R2sq, R3sq = aper.rtarg ** 2, aper.rsky1 ** 2, aper.rsky2 ** 2
+
+    # sky selection, accounting for masks and extra (which we assume
+    # acts like a sky mask as well)
+    sok = (Rsq > R2sq) & (Rsq < R3sq)
+    for xoff, yoff, radius in aper.mask:
+        sok &= (X - xoff) ** 2 + (Y - yoff) ** 2 > radius ** 2
+    for xoff, yoff in aper.extra:
+        sok &= (X - xoff) ** 2 + (Y - yoff) ** 2 > R1sq
+
+    # size of a pixel which is used to taper pixels as they approach
+    # the edge of the aperture to reduce pixellation noise
+    size = np.sqrt(wind.xbin * wind.ybin)
+
+    # target selection, accounting for extra apertures and allowing
+    # pixels to contribute if their centres are as far as size/2 beyond
+    # the edge of the circle (but with a tapered weight)
+    tok = Rsq < (aper.rtarg + size / 2.0) ** 2
+    dok = tok.copy()
+
+    # Pixellation amelioration:
+    #
+    # The weight of a pixel is set to 1 at the most and then linearly
+    # declines as it approaches the edge of the aperture. The scale over
+    # which it declines is set by 'size', the geometric mean of the
+    # binning factors. A pixel with its centre exactly on the edge
+    # gets a weight of 0.5.
+    wgt = np.minimum(1, np.maximum(0, (aper.rtarg + size / 2.0 - np.sqrt(Rsq)) / size))
+    for xoff, yoff in aper.extra:
+        rsq = (X - xoff) ** 2 + (Y - yoff) ** 2
+        dok |= rsq < (aper.rtarg + size / 2.0) ** 2
+        wg = np.minimum(
+            1, np.maximum(0, (aper.rtarg + size / 2.0 - np.sqrt(rsq)) / size)
+        )
+        wgt = np.maximum(wgt, wg)
+
+    sy, sx = np.nonzero(sok)
+    dy, dx = np.nonzero(dok)
+    geom = {
+        "flag": flag,
+        "sky": (sy + iy, sx + ix),
+        "targ": (dy + iy, dx + ix),
+        "tsel": tok[dok],
+        "wtarg": wgt[dok],
+        "xtarg": X[dok],
+        "ytarg": Y[dok],
+    }
+
+    if len(_geometry_cache) >= GEOMETRY_CACHE_SIZE:
+        # moving apertures rarely repeat themselves exactly
+        _geometry_cache.clear()
+    _geometry_cache[key] = geom
+
+    return geom
+
+
+@jit(nopython=True, cache=True)
+def pairwise_sum(arr):
+    """Sums a 1D array, adding the elements in exactly the same order as
+    numpy does (pairwise summation) so that the result is identical. The
+    result has the same type as the array.
+    """
+    n = len(arr)
+    if n < 8:
+        res = arr[0] - arr[0]
+        for i in range(n):
+            res += arr[i]
+        return res
+
+    elif n <= 128:
+        r0, r1, r2, r3 = arr[0], arr[1], arr[2], arr[3]
+        r4, r5, r6, r7 = arr[4], arr[5], arr[6], arr[7]
+        i = 8
+        while i < n - n % 8:
+            r0 += arr[i]
+            r1 += arr[i + 1]
+            r2 += arr[i + 2]
+            r3 += arr[i + 3]
+            r4 += arr[i + 4]
+            r5 += arr[i + 5]
+            r6 += arr[i + 6]
+            r7 += arr[i + 7]
+            i += 8
+        res = ((r0 + r1) + (r2 + r3)) + ((r4 + r5) + (r6 + r7))
+        while i < n:
+            res += arr[i]
+            i += 1
+        return res
+
+    else:
+        n2 = n // 2
+        n2 -= n2 % 8
+        return pairwise_sum(arr[:n2]) + pairwise_sum(arr[n2:])
+
+
+@jit(nopython=True, cache=True)
+def clipped_skies(dsky, soff, thresh):
+    """Computes clipped mean sky levels for a set of apertures at once. The
+    sky pixels of aperture n are dsky[soff[n]:soff[n+1]]. For each aperture
+    the mean and RMS are computed, pixels more than thresh*RMS from the mean
+    are rejected, and this is repeated until no more pixels are rejected. The
+    arithmetic follows that of numpy's mean and std exactly.
+
+    Returns (slevels, srmss, nskys, nrejs), the mean, RMS, number of pixels
+    retained and number rejected in the final cycle for each aperture. If all
+    are rejected, or there are no sky pixels, nsky = 0 and the others are
+    undefined.
+    """
+    napers = len(soff) - 1
+    slevels = np.zeros(napers, dsky.dtype)
+    srmss = np.zeros(napers, dsky.dtype)
+    nskys = np.zeros(napers, np.int64)
+    nrejs = np.zeros(napers, np.int64)
+
+    # used to round values to the type of the data as numpy does
+    buf = np.empty(1, dsky.dtype)
+
+    for nap in range(napers):
+        dsk = dsky[soff[nap] : soff[nap + 1]]
+        if len(dsk) == 0:
+            continue
+
+        ok = np.ones(len(dsk), np.bool_)
+        work = np.empty(len(dsk), dsky.dtype)
+        nok = len(dsk)
+        nrej = 1
+        while nrej:
+            nsky = 0
+            for i in range(len(dsk)):
+                if ok[i]:
+                    work[nsky] = dsk[i]
+                    nsky += 1
+
+            # mean
+            total = pairwise_sum(work[:nsky])
+            buf[0] = total / nsky
+            slevel = buf[0]
+
+            # RMS, with the mean computed differently as in numpy
+            buf[0] = nsky
+            amean = total / buf[0]
+            for i in range(nsky):
+                diff = work[i] - amean
+                work[i] = diff * diff
+            buf[0] = pairwise_sum(work[:nsky]) / nsky
+            srms = np.sqrt(buf[0])
+
+            # reject
+            buf[0] = thresh * srms
+            nok = 0
+            for i in range(len(dsk)):
+                ok[i] = ok[i] and abs(dsk[i] - slevel) < buf[0]
+                if ok[i]:
+                    nok += 1
+            nrej = nsky - nok
+            if nok == 0:
+                nrej = 0
+
+        slevels[nap] = slevel
+        srmss[nap] = srms
+        nskys[nap] = nok
+        nrejs[nap] = nrej
+
+    return (slevels, srmss, nskys, nrejs)
+
+
+@jit(nopython=True, cache=True)
+def target_sums(dtarg, dread, dgain, draw, wtarg, tsel, toff, slevels, override, rd2s):
+    """Computes the sums needed for the fluxes of a set of apertures at once.
+    The target pixels of aperture n are given by the elements toff[n] to
+    toff[n+1]-1 of 'dtarg' (data), 'dread' (readout noise), 'dgain' (gain),
+    'draw' (raw data), 'wtarg' (weights) and 'tsel' (in the target aperture
+    itself rather than an extra one). 'slevels' are the sky levels, and
+    'override' indicates when the readout noise is to be replaced by
+    sqrt(rd2s). The arithmetic follows that of the equivalent numpy array
+    operations exactly.
+
+    Returns (counts, variances, wsums, tany, cmaxs), the counts above sky,
+    their variance (without the sky uncertainty term), the sum of the
+    weights, whether there are any pixels in the target aperture itself and
+    the maximum raw value of them, for each aperture.
+    """
+    napers = len(toff) - 1
+    counts = np.zeros(napers)
+    variances = np.zeros(napers)
+    wsums = np.zeros(napers)
+    tany = np.zeros(napers, np.bool_)
+    cmaxs = np.zeros(napers, draw.dtype)
+
+    for nap in range(napers):
+        n1, n2 = toff[nap], toff[nap + 1]
+        slevel = slevels[nap]
+        rd2 = rd2s[nap]
+
+        cwork = np.empty(n2 - n1)
+        vwork = np.empty(n2 - n1)
+        for i in range(n1, n2):
+            wgt = wtarg[i]
+            diff = dtarg[i] - slevel
+            cwork[i - n1] = wgt * diff
+            if override[nap]:
+                # sky-subtracted counts above sky
+                pos = diff
+                if diff < 0:
+                    pos = diff - diff
+                vwork[i - n1] = (wgt * wgt) * (rd2 + pos / dgain[i])
+            else:
+                # the data, without removal of the sky
+                pos = dtarg[i]
+                if pos < 0:
+                    pos = pos - pos
+                vwork[i - n1] = (wgt * wgt) * (dread[i] * dread[i] + pos / dgain[i])
+
+            if tsel[i]:
+                if not tany[nap] or draw[i] > cmaxs[nap]:
+                    cmaxs[nap] = draw[i]
+                tany[nap] = True
+
+        if n2 > n1:
+            counts[nap] = pairwise_sum(cwork)
+            variances[nap] = pairwise_sum(vwork)
+            wsums[nap] = pairwise_sum(wtarg[n1:n2])
+
+    return (counts, variances, wsums, tany, cmaxs)
+
+
 def extractFlux(cnam, ccd, rccd, read, gain, ccdwin, rfile, store):
     """This extracts the flux of all apertures of a given CCD.
 
@@ -966,288 +1236,15 @@ def extractFlux(cnam, ccd, rccd, read, gain, ccdwin, rfile, store):
             " aperture resizing options".format(cnam)
         )
 
-    # apertures have been positioned in moveApers and now re-sized. Finally
-    # we can extract something.
+    # apertures have been positioned in moveApers and now re-sized. Work out
+    # which pixels each of them needs, skipping any that do not overlap
+    # their Window.
+    geoms = {}
     for apnam, aper in ccdaper.items():
-
-        # initialise flag
-        flag = hcam.ALL_OK
-
-        # extract Windows relevant for this aperture
-        wnam = ccdwin[apnam]
-
-        wdata = ccd[wnam]
-        wread = read[wnam]
-        wgain = gain[wnam]
-        wraw = rccd[wnam]
-
-        # extract sub-windows that include all of the pixels that could
-        # conceivably affect the aperture. We have to check that 'extra'
-        # apertures do not go beyond rsky2 which would normally be expected to
-        # be the default outer radius
-        rmax = aper.rsky2
-        for xoff, yoff in aper.extra:
-            rmax = max(rmax, np.sqrt(xoff ** 2 + yoff ** 2) + aper.rtarg)
-
-        # this is the region of interest
-        x1, x2, y1, y2 = (
-            aper.x - aper.rsky2 - wdata.xbin,
-            aper.x + aper.rsky2 + wdata.xbin,
-            aper.y - aper.rsky2 - wdata.ybin,
-            aper.y + aper.rsky2 + wdata.ybin,
-        )
-
         try:
-
-            # extract sub-Windows
-            swdata = wdata.window(x1, x2, y1, y2)
-            swread = wread.window(x1, x2, y1, y2)
-            swgain = wgain.window(x1, x2, y1, y2)
-            swraw = wraw.window(x1, x2, y1, y2)
-
-            # some checks for possible problems. bitmask flags will be set if
-            # they are encountered.
-            xlo, xhi, ylo, yhi = swdata.extent()
-            if (
-                xlo > aper.x - aper.rsky2
-                or xhi < aper.x + aper.rsky2
-                or ylo > aper.y - aper.rsky2
-                or yhi < aper.y + aper.rsky2
-            ):
-                # the sky aperture overlaps the edge of the window
-                flag |= hcam.SKY_AT_EDGE
-
-            if (
-                xlo > aper.x - aper.rtarg
-                or xhi < aper.x + aper.rtarg
-                or ylo > aper.y - aper.rtarg
-                or yhi < aper.y + aper.rtarg
-            ):
-                # the target aperture overlaps the edge of the window
-                flag |= hcam.TARGET_AT_EDGE
-
-            for xoff, yoff in aper.extra:
-                rout = np.sqrt(xoff ** 2 + yoff ** 2) + aper.rtarg
-                if (
-                    xlo > aper.x - rout
-                    or xhi < aper.x + rout
-                    or ylo > aper.y - rout
-                    or yhi < aper.y + rout
-                ):
-                    # an extra target aperture overlaps the edge of the window
-                    flag |= hcam.TARGET_AT_EDGE
-
-            # compute X, Y arrays over the sub-window relative to the centre
-            # of the aperture and the distance squared from the centre (Rsq)
-            # to save a little effort.
-            x = swdata.x(np.arange(swdata.nx)) - aper.x
-            y = swdata.y(np.arange(swdata.ny)) - aper.y
-            X, Y = np.meshgrid(x, y)
-            Rsq = X ** 2 + Y ** 2
-
-            # squared aperture radii for comparison
-            R1sq, R2sq, R3sq = aper.rtarg ** 2, aper.rsky1 ** 2, aper.rsky2 ** 2
-
-            # sky selection, accounting for masks and extra (which we assume
-            # acts like a sky mask as well)
-            sok = (Rsq > R2sq) & (Rsq < R3sq)
-            for xoff, yoff, radius in aper.mask:
-                sok &= (X - xoff) ** 2 + (Y - yoff) ** 2 > radius ** 2
-            for xoff, yoff in aper.extra:
-                sok &= (X - xoff) ** 2 + (Y - yoff) ** 2 > R1sq
-
-            # sky data
-            dsky = swdata.data[sok]
-
-            if len(dsky):
-
-                # we have some sky!
-
-                if rfile["sky"]["method"] == "clipped":
-
-                    # clipped mean. Take average, compute RMS,
-                    # reject pixels > thresh*rms from the mean.
-                    # repeat until no new pixels are rejected.
-
-                    thresh = rfile["sky"]["thresh"]
-                    ok = np.ones_like(dsky, dtype=bool)
-                    nrej = 1
-                    while nrej:
-                        slevel = dsky[ok].mean()
-                        srms = dsky[ok].std()
-                        nold = len(dsky[ok])
-                        ok = ok & (np.abs(dsky - slevel) < thresh * srms)
-                        nrej = nold - len(dsky[ok])
-                        if len(dsky[ok]) == 0:
-                            # no sky. will still return the flux in
-                            # the aperture but set flag and the sky
-                            # uncertainty to -1
-                            flag |= hcam.NO_SKY
-                            slevel = 0
-                            serror = -1
-                            nrej = 0
-                            break
-
-                    nsky = len(dsky[ok])
-                    if nsky:
-                        # serror -- error in the sky estimate.
-                        serror = srms / np.sqrt(nsky)
-
-                else:
-
-                    # 'median' goes with 'photon'
-                    slevel = dsky.median()
-                    nsky = len(dsky)
-                    nrej = 0
-
-                    # read*gain/flat and flat over sky region
-                    dread = swread.data[sok]
-                    dgain = swgain.data[sok]
-
-                    serror = np.sqrt(
-                        (dread ** 2 + np.max(0, dsky) / dgain).sum() / nsky ** 2
-                    )
-
-            else:
-                # no sky. will still return the flux in the aperture but set
-                # flag and the sky uncertainty to -1
-                flag |= hcam.NO_SKY
-                slevel = NaN
-                serror = NaN
-                nsky = 0
-                nrej = 0
-
-            # size of a pixel which is used to taper pixels as they approach
-            # the edge of the aperture to reduce pixellation noise
-            size = np.sqrt(wdata.xbin * wdata.ybin)
-
-            # target selection, accounting for extra apertures and allowing
-            # pixels to contribute if their centres are as far as size/2 beyond
-            # the edge of the circle (but with a tapered weight)
-            dok = Rsq < (aper.rtarg + size / 2.0) ** 2
-
-            if not dok.any():
-                # check there are some valid pixels
-                flag |= hcam.NO_DATA
-                raise hcam.HipercamError("no valid pixels in aperture")
-
-            # check for saturation and nonlinearity
-            cmax = int(swraw.data[dok].max())
-            if cnam in rfile.warn:
-                if cmax >= rfile.warn[cnam]["saturation"]:
-                    flag |= hcam.TARGET_SATURATED
-
-                if cmax >= rfile.warn[cnam]["nonlinear"]:
-                    flag |= hcam.TARGET_NONLINEAR
-
-            else:
-                warnings.warn(
-                    "CCD {:s} has no nonlinearity or saturation levels set".format(cnam)
-                )
-
-            # Pixellation amelioration:
-            #
-            # The weight of a pixel is set to 1 at the most and then linearly
-            # declines as it approaches the edge of the aperture. The scale over
-            # which it declines is set by 'size', the geometric mean of the
-            # binning factors. A pixel with its centre exactly on the edge
-            # gets a weight of 0.5.
-            wgt = np.minimum(
-                1, np.maximum(0, (aper.rtarg + size / 2.0 - np.sqrt(Rsq)) / size)
-            )
-            for xoff, yoff in aper.extra:
-                rsq = (X - xoff) ** 2 + (Y - yoff) ** 2
-                dok |= rsq < (aper.rtarg + size / 2.0) ** 2
-                wg = np.minimum(
-                    1, np.maximum(0, (aper.rtarg + size / 2.0 - np.sqrt(rsq)) / size)
-                )
-                wgt = np.maximum(wgt, wg)
-
-            # the values needed to extract the flux.
-            dtarg = swdata.data[dok]
-            dread = swread.data[dok]
-            dgain = swgain.data[dok]
-            wtarg = wgt[dok]
-
-            # 'override' to indicate we want to override the readout noise.
-            if nsky and rfile["sky"]["error"] == "variance":
-                # from sky variance
-                rd = srms
-                override = True
-            else:
-                rd = dread
-                override = False
-
-            # count above sky
-            diff = dtarg - slevel
-
-            if extype == "normal" or extype == "optimal":
-
-                if extype == "optimal":
-                    # optimal extraction. Need the profile
-                    warnings.warn(
-                        "Transmission plot is not reliable" " with optimal extraction"
-                    )
-
-                    mbeta = store["mbeta"]
-                    if mbeta > 0.0:
-                        prof = fitting.moffat(
-                            X[dok],
-                            Y[dok],
-                            0.0,
-                            1.0,
-                            0.0,
-                            0.0,
-                            mfwhm,
-                            mbeta,
-                            wdata.xbin,
-                            wdata.ybin,
-                            rfile["apertures"]["fit_ndiv"],
-                        )
-                    else:
-                        prof = fitting.gaussian(
-                            X[dok],
-                            Y[dok],
-                            0.0,
-                            1.0,
-                            0.0,
-                            0.0,
-                            mfwhm,
-                            wdata.xbin,
-                            wdata.ybin,
-                            rfile["apertures"]["fit_ndiv"],
-                        )
-
-                    # multiply weights by the profile
-                    wtarg *= prof
-
-                # now extract
-                counts = (wtarg * diff).sum()
-
-                if override:
-                    # in this case, the "readout noise" includes the component
-                    # due to the sky background so we use the sky-subtracted
-                    # counts above sky for the object contribution.
-                    var = (wtarg ** 2 * (rd ** 2 + np.maximum(0, diff) / dgain)).sum()
-                else:
-                    # in this case we are using the true readout noise and we
-                    # just use the data (which should be debiassed) without
-                    # removal of the sky.
-                    var = (wtarg ** 2 * (rd ** 2 + np.maximum(0, dtarg) / dgain)).sum()
-
-                if serror > 0:
-                    # add in factor due to uncertainty in sky estimate
-                    var += (wtarg.sum() * serror) ** 2
-
-                countse = np.sqrt(var)
-
-            else:
-                raise hcam.HipercamError(
-                    "extraction type = {:s} not recognised".format(extype)
-                )
-
+            geoms[apnam] = aperture_geometry(ccd[ccdwin[apnam]], aper)
+        except hcam.HipercamError:
             info = store[apnam]
-
             results[apnam] = {
                 "x": aper.x,
                 "xe": info["xe"],
@@ -1257,20 +1254,186 @@ def extractFlux(cnam, ccd, rccd, read, gain, ccdwin, rfile, store):
                 "fwhme": info["fwhme"],
                 "beta": info["beta"],
                 "betae": info["betae"],
-                "counts": counts,
-                "countse": countse,
-                "sky": slevel,
-                "skye": serror,
-                "nsky": nsky,
-                "nrej": nrej,
-                "flag": flag,
-                "cmax": cmax,
+                "counts": NaN,
+                "countse": NaN,
+                "sky": NaN,
+                "skye": NaN,
+                "nsky": 0,
+                "nrej": 0,
+                "flag": hcam.NO_EXTRACTION,
+                "cmax": 0,
             }
 
-        except hcam.HipercamError as err:
+    if len(geoms) == 0:
+        return results
+
+    # Gather the pixels of all apertures into single arrays, a Window at a
+    # time, so that they can all be extracted at once.
+    apnams, dsky, dtarg, dread, dgain, draw, wtarg, tsel = ([] for n in range(8))
+    sread, sgain = [], []
+    for wnam in ccd:
+        wapnams = [apnam for apnam in geoms if ccdwin[apnam] == wnam]
+        if len(wapnams) == 0:
+            continue
+        wgeoms = [geoms[apnam] for apnam in wapnams]
+        apnams += wapnams
+
+        sky = tuple(
+            np.concatenate([geom["sky"][n] for geom in wgeoms]) for n in (0, 1)
+        )
+        targ = tuple(
+            np.concatenate([geom["targ"][n] for geom in wgeoms]) for n in (0, 1)
+        )
+        dsky.append(ccd[wnam].data[sky])
+        dtarg.append(ccd[wnam].data[targ])
+        dread.append(read[wnam].data[targ])
+        dgain.append(gain[wnam].data[targ])
+        draw.append(rccd[wnam].data[targ])
+        tsel.append(np.concatenate([geom["tsel"] for geom in wgeoms]))
+        wgt = np.concatenate([geom["wtarg"] for geom in wgeoms])
+
+        if extype == "optimal":
+            # optimal extraction. Need the profile. Multiply weights by it.
+            mbeta = store["mbeta"]
+            wdata = ccd[wnam]
+            xtarg = np.concatenate([geom["xtarg"] for geom in wgeoms])
+            ytarg = np.concatenate([geom["ytarg"] for geom in wgeoms])
+            if mbeta > 0.0:
+                prof = fitting.moffat(
+                    xtarg,
+                    ytarg,
+                    0.0,
+                    1.0,
+                    0.0,
+                    0.0,
+                    mfwhm,
+                    mbeta,
+                    wdata.xbin,
+                    wdata.ybin,
+                    rfile["apertures"]["fit_ndiv"],
+                )
+            else:
+                prof = fitting.gaussian(
+                    xtarg,
+                    ytarg,
+                    0.0,
+                    1.0,
+                    0.0,
+                    0.0,
+                    mfwhm,
+                    wdata.xbin,
+                    wdata.ybin,
+                    rfile["apertures"]["fit_ndiv"],
+                )
+            wgt = wgt * prof
+        wtarg.append(wgt)
+
+        if rfile["sky"]["method"] == "median":
+            sread.append(read[wnam].data[sky])
+            sgain.append(gain[wnam].data[sky])
+
+    # offsets of the pixels of each aperture in the gathered arrays
+    soff = np.cumsum([0] + [len(geoms[apnam]["sky"][0]) for apnam in apnams])
+    toff = np.cumsum([0] + [len(geoms[apnam]["tsel"]) for apnam in apnams])
+    dsky, dtarg, dread, dgain, draw, wtarg, tsel = (
+        np.concatenate(arrs)
+        for arrs in (dsky, dtarg, dread, dgain, draw, wtarg, tsel)
+    )
 
-            info = store[apnam]
-            flag |= hcam.NO_EXTRACTION
+    if rfile["sky"]["method"] == "clipped":
+        # clipped mean. Take average, compute RMS, reject pixels >
+        # thresh*rms from the mean. repeat until no new pixels are
+        # rejected.
+        slevels, srmss, nskys, nrejs = clipped_skies(
+            dsky, soff, rfile["sky"]["thresh"]
+        )
+    else:
+        # 'median' goes with 'photon'
+        sread, sgain = np.concatenate(sread), np.concatenate(sgain)
+
+    # the sky levels, their uncertainties, etc, aperture by aperture. Also
+    # the squared "readout noise" if it is to be overridden by the sky
+    # variance.
+    skies, flags = [], []
+    override = np.zeros(len(apnams), dtype=bool)
+    rd2s = np.zeros(len(apnams), np.result_type(dtarg, dgain))
+    for nap, apnam in enumerate(apnams):
+        flag = geoms[apnam]["flag"]
+        nsky = soff[nap + 1] - soff[nap]
+
+        if nsky:
+
+            # we have some sky!
+
+            if rfile["sky"]["method"] == "clipped":
+
+                nsky, nrej = int(nskys[nap]), int(nrejs[nap])
+                if nsky:
+                    slevel, srms = slevels[nap], srmss[nap]
+                    # serror -- error in the sky estimate.
+                    serror = srms / np.sqrt(nsky)
+                else:
+                    # no sky. will still return the flux in the
+                    # aperture but set flag and the sky
+                    # uncertainty to -1
+                    flag |= hcam.NO_SKY
+                    slevel = 0
+                    serror = -1
+
+            else:
+
+                ds = slice(soff[nap], soff[nap + 1])
+                slevel = np.median(dsky[ds])
+                nrej = 0
+
+                # read*gain/flat and flat over sky region
+                serror = np.sqrt(
+                    (sread[ds] ** 2 + np.maximum(0, dsky[ds]) / sgain[ds]).sum()
+                    / nsky ** 2
+                )
+
+        else:
+            # no sky. will still return the flux in the aperture but set
+            # flag and the sky uncertainty to -1
+            flag |= hcam.NO_SKY
+            slevel = NaN
+            serror = NaN
+            nrej = 0
+
+        if nsky and rfile["sky"]["error"] == "variance":
+            # 'override' the readout noise with the sky variance
+            override[nap] = True
+            rd2s[nap] = srms ** 2
+
+        skies.append((slevel, serror, int(nsky), nrej))
+        flags.append(flag)
+
+    # the target sums
+    counts, variances, wsums, tany, cmaxs = target_sums(
+        dtarg,
+        dread,
+        dgain,
+        draw,
+        wtarg,
+        tsel,
+        toff,
+        np.array([sky[0] for sky in skies], dtarg.dtype),
+        override,
+        rd2s,
+    )
+
+    if extype == "optimal" and tany.any():
+        warnings.warn("Transmission plot is not reliable with optimal extraction")
+
+    for nap, apnam in enumerate(apnams):
+        aper = ccdaper[apnam]
+        info = store[apnam]
+        slevel, serror, nsky, nrej = skies[nap]
+        flag = flags[nap]
+
+        if not tany[nap]:
+            # check there are some valid pixels
+            flag |= hcam.NO_DATA | hcam.NO_EXTRACTION
 
             results[apnam] = {
                 "x": aper.x,
@@ -1290,6 +1453,45 @@ def extractFlux(cnam, ccd, rccd, read, gain, ccdwin, rfile, store):
                 "flag": flag,
                 "cmax": 0,
             }
+            continue
+
+        # check for saturation and nonlinearity
+        cmax = int(cmaxs[nap])
+        if cnam in rfile.warn:
+            if cmax >= rfile.warn[cnam]["saturation"]:
+                flag |= hcam.TARGET_SATURATED
+
+            if cmax >= rfile.warn[cnam]["nonlinear"]:
+                flag |= hcam.TARGET_NONLINEAR
+
+        else:
+            warnings.warn(
+                "CCD {:s} has no nonlinearity or saturation levels set".format(cnam)
+            )
 
-    # finally, we are done
-    return results
+        var = variances[nap]
+        if serror > 0:
+            # add in factor due to uncertainty in sky estimate
+            var += (wsums[nap] * serror) ** 2
+
+        results[apnam] = {
+            "x": aper.x,
+            "xe": info["xe"],
+            "y": aper.y,
+            "ye": info["ye"],
+            "fwhm": info["fwhm"],
+            "fwhme": info["fwhme"],
+            "beta": info["beta"],
+            "betae": info["betae"],
+            "counts": counts[nap],
+            "countse": np.sqrt(var),
+            "sky": slevel,
+            "skye": serror,
+            "nsky": nsky,
+            "nrej": nrej,
+            "flag": flag,
+            "cmax": cmax,
+        }
+
+    # finally, we are done. Return results in the order of the apertures
+    return {apnam: results[apnam] for apnam in ccdaper}
@@ -579,8 +579,10 @@ def rtplot(args=None):
     fpos = []  # list of target positions to fit
     fframe = True  # waiting for first valid frame with profit
 
-    # plot images
-    with spooler.data_source(source, resource, first, full=False) as spool:
+    # plot images, reading ahead on a separate thread
+    with spooler.data_source(
+        source, resource, first, prefetch=2, full=False, reuse=1
+    ) as spool:
 
         # 'spool' is an iterable source of MCCDs
         nframe = 0
@@ -830,7 +832,9 @@ def rtplot(args=None):
 
             if ccd.is_data():
 
-                # carry out fits. Nothing happens if fpos is empty
+                # carry out fits. Nothing happens if fpos is empty. The
+                # searches are carried out first, then all the fits together.
+                stamps = []
                 for fpar in fpos:
                     # switch to the image plot
                     imdev.select()
@@ -855,28 +859,51 @@ def rtplot(args=None):
                         # crude estimate of sky background
                         sky = np.percentile(fwind.data, 50)
 
-                        # refine the Aperture position by fitting the profile
+                        stamps.append((fpar, fwind, peak, (sky, peak - sky, x, y)))
+
+                    except hcam.HipercamError as err:
+                        stamps.append((fpar, None, None, err))
+
+                # refine the Aperture positions by fitting the profiles
+                fits = [stamp for stamp in stamps if stamp[1] is not None]
+                results = iter(
+                    hcam.fitting.combFitBatch(
+                        [fwind for fpar, fwind, peak, start in fits],
+                        method,
+                        [start[0] for fpar, fwind, peak, start in fits],
+                        [start[1] for fpar, fwind, peak, start in fits],
+                        [start[2] for fpar, fwind, peak, start in fits],
+                        [start[3] for fpar, fwind, peak, start in fits],
+                        [fpar.fwhm for fpar, fwind, peak, start in fits],
+                        fwhm_min,
+                        False,
+                        [fpar.beta for fpar, fwind, peak, start in fits],
+                        20.,
+                        False,
+                        len(fits) * [read],
+                        len(fits) * [gain],
+                        thresh,
+                    )
+                )
+
+                for fpar, fwind, peak, start in stamps:
+                    # switch to the image plot
+                    imdev.select()
+
+                    try:
+                        if fwind is None:
+                            # the search failed
+                            raise start
+
+                        result = next(results)
+                        if isinstance(result, hcam.HipercamError):
+                            raise result
+
                         (
                             (sky, height, x, y, fwhm, beta),
                             epars,
                             (wfit, X, Y, sigma, chisq, nok, nrej, npar, nfev, message),
-                        ) = hcam.fitting.combFit(
-                            fwind,
-                            method,
-                            sky,
-                            peak - sky,
-                            x,
-                            y,
-                            fpar.fwhm,
-                            fwhm_min,
-                            False,
-                            fpar.beta,
-                            20.,
-                            False,
-                            read,
-                            gain,
-                            thresh,
-                        )
+                        ) = result
 
                         print("Targ {:d}: {:s}".format(fpar.ntarg, message))
 
@@ -174,21 +174,13 @@ def tanalysis(args=None):
         # the header of the original run to know how many bytes to
         # read and how to interpret them.
         rhead = hcam.ucam.Rhead(run)
-        with open(tfile, "rb") as fin:
-            atbytes, mjds, tflags, gflags = [], [], [], []
-            nframe = 0
-            while 1:
-                tbytes = fin.read(rhead.ntbytes)
-                if len(tbytes) != rhead.ntbytes:
-                    break
-                nframe += 1
-                atbytes.append(tbytes)
-
-                # interpret times
-                mjd, tflag, gflag, uformat = u_tbytes_to_mjd(tbytes, rhead, nframe)
-                mjds.append(mjd)
-                tflags.append(tflag)
-                gflags.append(gflag)
+        tbarr = np.fromfile(tfile, np.uint8)
+        nframe = len(tbarr) // rhead.ntbytes
+        tbarr = tbarr[: nframe * rhead.ntbytes].reshape(nframe, rhead.ntbytes)
+        atbytes = [tbytes.tobytes() for tbytes in tbarr]
+
+        # interpret times, all in one go
+        mjds, tflags, gflags, uformat = u_tbytes_to_mjds(tbarr, rhead)
 
     else:
         raise NotImplementedError("source = {} not yet implemented".format(source))
@@ -583,6 +575,21 @@ def u_tbytes_to_mjd(tbytes, rtbytes, nframe):
         return (ret[1]["gps"], True, True, ret[1]["format"])
 
 
+def u_tbytes_to_mjds(tbarr, rhead):
+    """Array version of u_tbytes_to_mjd for an (nframe,ntbytes) array of
+    timing bytes starting from the first frame of a run. Returns arrays of
+    MJDs, NotNull and GoodTime flags plus the format code.
+    """
+    info = hcam.ucam.utimers(tbarr, rhead)[3]
+    mjds = info["gps"]
+    if tbarr.shape[1] == 32:
+        tflags = (tbarr[:, 12:] != 0).any(axis=1)
+    else:
+        tflags = np.ones(len(tbarr), dtype=bool)
+    gflags = tflags & (mjds >= 52395)
+    return (mjds, tflags, gflags, info["format"])
+
+
 def h_tbytes_to_mjd(tbytes, nframe):
     """Translates set of HiPERCAM timing bytes into an MJD"""
 
@@ -18,6 +18,8 @@ interested in accessing data in a specific manner.
 """
 
 import time
+import queue
+import threading
 from abc import ABC, abstractmethod
 from collections import OrderedDict
 
@@ -37,6 +39,7 @@ __all__ = (
     "HcamListSpool",
     "get_ccd_pars",
     "hang_about",
+    "Pipeline",
     "HcamServSpool",
     "HcamDiskSpool",
     "UcamTbytesSpool",
@@ -99,13 +102,178 @@ class SpoolerBase(ABC):
         pass
 
 
+class _Prefetch:
+    """Wraps an iterator, reading up to 'nmax' items ahead of the caller on a
+    worker thread into a bounded queue. It is used by the disk-based spoolers
+    to overlap reading and de-multiplexing of frames with their processing.
+
+    Iterators over growing files can return None to indicate that no new frame
+    is ready yet (see :func:`hang_about`). When this happens, the worker
+    passes on the None and then waits until it is asked for another item
+    before trying again, so the caller's waiting game works exactly as it
+    does without prefetching. Exceptions raised by the iterator are re-raised
+    in the caller's thread.
+
+    Attributes of the iterator, e.g. the frame counter of an :class:`Rdata`,
+    are deliberately not available through this wrapper since the worker
+    will in general have moved them on beyond the item last returned. Any
+    such information needed must travel with the items themselves, e.g. in
+    the headers of the frames.
+    """
+
+    _END = object()
+
+    def __init__(self, source, nmax):
+        self._source = source
+        self._queue = queue.Queue(nmax)
+        self._resume = threading.Event()
+        self._stop = threading.Event()
+        self._waiting = False
+        self._done = False
+        self._thread = threading.Thread(target=self._work, daemon=True)
+        self._thread.start()
+
+    def _put(self, item):
+        # put with a timeout so that a stop request is not missed when
+        # the queue is full.
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _work(self):
+        while not self._stop.is_set():
+            try:
+                item = next(self._source)
+            except StopIteration:
+                self._put(self._END)
+                return
+            except Exception as err:
+                self._put(err)
+                return
+
+            if not self._put(item):
+                return
+
+            if item is None:
+                # nothing new yet; wait to be asked again
+                self._resume.wait()
+                self._resume.clear()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._done:
+            raise StopIteration
+
+        if self._waiting:
+            # the caller has come back for more after a None
+            self._waiting = False
+            self._resume.set()
+
+        while True:
+            try:
+                item = self._queue.get(timeout=0.1)
+                break
+            except queue.Empty:
+                if self._stop.is_set():
+                    # closed while waiting
+                    self._done = True
+                    raise StopIteration
+
+        if item is self._END:
+            self._done = True
+            raise StopIteration
+        elif isinstance(item, Exception):
+            self._done = True
+            raise item
+
+        self._waiting = item is None
+        return item
+
+    def close(self):
+        """Stops the worker thread"""
+        self._stop.set()
+        self._resume.set()
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        return self._source.__exit__(*args)
+
+
+class Pipeline:
+    """Runs a chain of processing stages concurrently, each on its own thread,
+    with bounded queues between them. Each stage is a function which takes an
+    iterator over the output of the stage before it (the first stage takes
+    'source') and returns an iterator, typically a generator, over its own
+    output. Iterating over the Pipeline returns the output of the last stage.
+    Used as a context manager it stops all the stages on exit, e.g.::
+
+      with Pipeline(spool, (calibrate, extract), 2) as pipe:
+          for result in pipe:
+             ...
+
+    As long as no stage is much slower than the others, this takes about as
+    long as the slowest stage rather than the sum of all of them. The stages
+    must not return None.
+
+    Arguments::
+
+       source : iterable
+          the items to feed into the first stage
+
+       stages : sequence of functions
+          the stages, in the order they are to be applied
+
+       nmax : int
+          maximum number of items waiting between any two stages
+    """
+
+    def __init__(self, source, stages, nmax):
+        self._stages = []
+        items = iter(source)
+        for stage in stages:
+            items = _Prefetch(stage(items), nmax)
+            self._stages.append(items)
+        self._items = items
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._items)
+
+    def close(self):
+        """Stops all the stages"""
+        # stop all first so that none is left blocked waiting on another
+        for stage in self._stages:
+            stage._stop.set()
+            stage._resume.set()
+        for stage in self._stages:
+            stage._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
 class UcamDiskSpool(SpoolerBase):
 
     """Provides an iterable context manager to loop through frames within
     a raw ULTRACAM or ULTRASPEC disk file.
     """
 
-    def __init__(self, run, first=1):
+    def __init__(self, run, first=1, prefetch=0):
         """Attaches the UcamDiskSpool to a run.
 
         Arguments::
@@ -117,8 +285,15 @@ class UcamDiskSpool(SpoolerBase):
            first : (int)
               The first frame to access.
 
+           prefetch : (int)
+              If > 0, up to this many frames are read ahead on a separate
+              thread while the current one is being processed. Ignored
+              if first == 0.
+
         """
         self._iter = ucam.Rdata(run, first, False)
+        if prefetch > 0 and first != 0:
+            self._iter = _Prefetch(self._iter, prefetch)
 
     def __exit__(self, *args):
         self._iter.__exit__(args)
@@ -199,7 +374,7 @@ class HcamDiskSpool(SpoolerBase):
     a raw HiPERCAM file.
     """
 
-    def __init__(self, run, first=1, full=True):
+    def __init__(self, run, first=1, full=True, mmap=False, prefetch=0, reuse=0):
         """Attaches the HcamDiskSpool to a run.
 
         Arguments::
@@ -211,8 +386,35 @@ class HcamDiskSpool(SpoolerBase):
            first : (int)
               The first frame to access.
 
+           full : (bool)
+              True for full headers, False for the bare minimum.
+
+           mmap : (bool)
+              True to memory-map the run rather than reading it frame by
+              frame. See :class:`hipercam.hcam.Rdata`.
+
+           prefetch : (int)
+              If > 0, up to this many frames are read ahead on a separate
+              thread while the current one is being processed. Ignored
+              if first == 0.
+
+           reuse : (int)
+              If > 0, the arrays of old frames are re-used for new ones, with
+              up to this many frames valid at once on the caller's side. 1
+              suits callers which finish with each frame before asking for
+              the next. See :class:`hipercam.hcam.Rdata`.
+
         """
-        self._iter = hcam.Rdata(run, first, False, full)
+        prefetch = prefetch if first != 0 else 0
+        if reuse > 0:
+            # frames waiting in the prefetch queue, and the one the prefetch
+            # thread may hold while waiting for space in it, must not be
+            # overwritten either.
+            reuse += prefetch + 1 if prefetch > 0 else 0
+
+        self._iter = hcam.Rdata(run, first, False, full, mmap, reuse)
+        if prefetch > 0:
+            self._iter = _Prefetch(self._iter, prefetch)
 
     def __exit__(self, *args):
         self._iter.__exit__(args)
@@ -238,10 +440,11 @@ class HcamListSpool(SpoolerBase):
             for ccd in spool:
                 ...
 
-    to get :class:`CCD` objects.
+    to get :class:`CCD` objects. The files are read with the fast readers
+    :meth:`MCCD.rhcm` and :meth:`CCD.rhcm`.
     """
 
-    def __init__(self, lname, cnam=None):
+    def __init__(self, lname, cnam=None, prefetch=0):
         """Attaches the :class:`HcamListSpool` to a list of files
 
         Arguments::
@@ -254,6 +457,10 @@ class HcamListSpool(SpoolerBase):
            cnam  : string or None
               CCD label if you want to return individual CCDs rather than
               MCCDs. This is used in 'combine' to save memory.
+
+           prefetch : int
+              If > 0, up to this many files are read ahead on a separate
+              thread while the current one is being processed.
         """
         if isinstance(lname, str):
             self._iter = open(lname)
@@ -263,13 +470,34 @@ class HcamListSpool(SpoolerBase):
             self._file = False
 
         self.cnam = cnam
+        if prefetch > 0:
+            self._prefetch = _Prefetch(self._read_iter(), prefetch)
+        else:
+            self._prefetch = None
 
     def __exit__(self, *args):
+        if self._prefetch is not None:
+            self._prefetch.close()
+
         if self._file:
             # close in the case of file lists
             self._iter.close()
 
+    def _read_iter(self):
+        # generator of the files for the prefetch thread
+        while True:
+            try:
+                yield self._read()
+            except StopIteration:
+                return
+
     def __next__(self):
+        if self._prefetch is None:
+            return self._read()
+        else:
+            return next(self._prefetch)
+
+    def _read(self):
         # returns next image from a list. adds in the file name
         # as a header parameter
         if self._file:
@@ -286,11 +514,11 @@ class HcamListSpool(SpoolerBase):
                 raise StopIteration
 
         if self.cnam is None:
-            mccd = ccd.MCCD.read(utils.add_extension(fname.strip(), core.HCAM))
+            mccd = ccd.MCCD.rhcm(utils.add_extension(fname.strip(), core.HCAM))
             mccd.head["FILENAME"] = fname.strip()
             return mccd
         else:
-            ccd1 = ccd.CCD.read(
+            ccd1 = ccd.CCD.rhcm(
                 utils.add_extension(fname.strip(), core.HCAM), self.cnam
             )
             ccd1.head["FILENAME"] = fname.strip()
@@ -354,7 +582,7 @@ class HcamTbytesSpool(SpoolerBase):
         return self._iter.__next__()
 
 
-def data_source(source, resource, first=1, **kwargs):
+def data_source(source, resource, first=1, prefetch=0, **kwargs):
     """Returns a context manager needed to run through a set of exposures.
     This is basically a wrapper around the various context managers that
     hook off the SpoolerBase class.
@@ -380,6 +608,11 @@ def data_source(source, resource, first=1, **kwargs):
           to get the last. See also 'hang_about' in this case. This parameter
           is ignored if source=='hf'.
 
+       prefetch : int
+          number of frames to read ahead on a separate thread, 0 to read them
+          only as they are needed. Only used for local disk files ('hl',
+          'ul' and 'hf'). See e.g. :class:`HcamDiskSpool`.
+
        kwargs : dictionary of keyword arguments
           some of the spooler classes support extra arguments. e.g. HcamDiskSpool.
           These are passed via kwargs
@@ -400,13 +633,13 @@ def data_source(source, resource, first=1, **kwargs):
     if source == "us":
         return UcamServSpool(resource, first)
     elif source == "ul":
-        return UcamDiskSpool(resource, first)
+        return UcamDiskSpool(resource, first, prefetch)
     elif source == "hs":
         return HcamServSpool(resource, first)
     elif source == "hl":
-        return HcamDiskSpool(resource, first, **kwargs)
+        return HcamDiskSpool(resource, first, prefetch=prefetch, **kwargs)
     elif source == "hf":
-        return HcamListSpool(resource)
+        return HcamListSpool(resource, prefetch=prefetch)
     else:
         raise ValueError("{!s} is not a recognised data source".format(source))
 
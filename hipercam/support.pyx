@@ -2,11 +2,14 @@
 Cython routines
 """
 
+import os
 import numpy as np
 cimport numpy as np
 cimport cython
+from cython.parallel cimport parallel, prange
 
-from libc.math cimport sqrt
+from libc.math cimport sqrt, fabs
+from libc.stdlib cimport malloc, free, qsort
 
 FTYPE = np.float32
 ctypedef np.float32_t FTYPE_t
@@ -14,11 +17,133 @@ ctypedef np.float32_t FTYPE_t
 DTYPE = np.float64
 ctypedef np.float64_t DTYPE_t
 
-# Next two decorators reduce time from 108ms to 75ms
-# in the test I carried out.
+# Data types accepted by avgstd
+ctypedef fused CTYPE_t:
+    np.float32_t
+    np.float64_t
+    np.uint16_t
+
+cdef int _cmp_double(const void* a, const void* b) noexcept nogil:
+    # comparison function for qsort
+    cdef double da = (<const double*>a)[0]
+    cdef double db = (<const double*>b)[0]
+    return (da > db) - (da < db)
+
+@cython.cdivision(True)
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef void _clip_pixel(
+        const double* vals, unsigned char* ok, double* work, Py_ssize_t nf,
+        double sigma, Py_ssize_t nlow, Py_ssize_t nhigh, bint median,
+        bint single, double* avg, double* std, int* nok) noexcept nogil:
+    """Clipped mean of the nf values 'vals' of one pixel. 'ok' and 'work' are
+    scratch arrays of length nf. If 'single', the mean and standard deviation
+    are rounded to single precision at each step."""
+
+    cdef Py_ssize_t iz, n, iext
+    cdef Py_ssize_t num, numt
+    cdef double tavg, tstd, centre, thresh, sum
+
+    for iz in range(nf):
+        ok[iz] = 1
+    num = nf
+
+    # min / max rejection
+    for n in range(nlow + nhigh):
+        if num == 1:
+            break
+        iext = -1
+        for iz in range(nf):
+            if ok[iz] and (
+                    iext < 0
+                    or (n < nlow and vals[iz] < vals[iext])
+                    or (n >= nlow and vals[iz] > vals[iext])
+            ):
+                iext = iz
+        ok[iext] = 0
+        num -= 1
+
+    # initial mean and standard deviation
+    sum = 0.
+    for iz in range(nf):
+        if ok[iz]:
+            sum += vals[iz]
+    tavg = sum / num
+    if single:
+        tavg = <float>tavg
+
+    sum = 0.
+    for iz in range(nf):
+        if ok[iz]:
+            sum += (vals[iz]-tavg)**2
+    if num > 1:
+        tstd = sqrt(sum/(num-1))
+    else:
+        tstd = 0.
+    if single:
+        tstd = <float>tstd
+
+    # Now the rejection loop. Keep rejecting if number of rejections is
+    # positive
+    while num > 1:
+
+        if median:
+            # the centre is the median of the values left
+            n = 0
+            for iz in range(nf):
+                if ok[iz]:
+                    work[n] = vals[iz]
+                    n += 1
+            qsort(work, n, sizeof(double), _cmp_double)
+            if n % 2:
+                centre = work[n // 2]
+            else:
+                centre = (work[n // 2 - 1] + work[n // 2]) / 2.
+        else:
+            centre = tavg
+
+        # pre-compute rejection threshold
+        thresh = sigma*tstd
+        if single:
+            thresh = <float>thresh
+        sum = 0.
+        numt = 0
+        for iz in range(nf):
+            if fabs(vals[iz]-centre) > thresh:
+                ok[iz] = 0
+
+            if ok[iz]:
+                sum += vals[iz]
+                numt += 1
+
+        tavg = sum / numt
+        if single:
+            tavg = <float>tavg
+        sum = 0.
+        for iz in range(nf):
+            if ok[iz]:
+                sum += (vals[iz]-tavg)**2
+        if numt > 1:
+            tstd = sqrt(sum/(numt-1))
+        else:
+            tstd = 0.
+        if single:
+            tstd = <float>tstd
+
+        if numt == num:
+            break
+        num = numt
+
+    avg[0] = tavg
+    std[0] = tstd
+    nok[0] = num
+
 @cython.cdivision(True)
 @cython.boundscheck(False)
-def avgstd(np.ndarray[FTYPE_t, ndim=3] cube, float sigma):
+@cython.wraparound(False)
+def avgstd(
+        const CTYPE_t[:,:,:] cube, double sigma, int nlow=0, int nhigh=0,
+        bint median=False, int nthreads=0):
     """
     Given a 3D cube of dimensions (nf,ny,nx) which can be thought of as 'nf'
     frames each of dimension (ny,nx), avgstd computes the mean, standard
@@ -27,104 +152,94 @@ def avgstd(np.ndarray[FTYPE_t, ndim=3] cube, float sigma):
     returns three 2D frames each of dimension (ny,nx). The rejection is
     carried out in a cycle until no more rejection occurs.
 
-    This routine is heavily cythonised and runs much faster than a pure-python
-    implementation, but that comes with a restriction on the data type of
-    'cube' as listed below.
+    This routine is cythonised and runs much faster than a pure-python
+    implementation. The rows of pixels are shared between threads, and the
+    cube is read as it is, without conversion.
 
     Arguments::
 
-      cube : (3D numpy array, dtype=np.float32)
+      cube : (3D numpy array, dtype=np.float32, np.float64 or np.uint16)
            the set of frames to process.
 
       sigma : (float)
            the rejection threshold. 3 to 4 goodish value. Must be > 1.
 
-    Returns (avg,std,num) the average, standard deviation and number
-    of contributing frames.
+      nlow : (int)
+           number of the lowest values of each pixel to reject before the
+           clipping starts.
+
+      nhigh : (int)
+           number of the highest values of each pixel to reject before the
+           clipping starts. One value at least is always kept.
+
+      median : (bool)
+           True to clip about the median of the values left at each cycle
+           rather than their mean. This is more robust when there are few
+           frames. The mean is still returned.
+
+      nthreads : (int)
+           number of threads to use. 0 for one per core. Without OpenMP
+           (see setup.py), only one is used.
+
+    Returns (avg,std,num) the average, standard deviation and number of
+    contributing frames. 'avg' and 'std' are float64 if 'cube' is, else
+    float32; 'num' is int32.
     """
 
     # Dimensions and indices
-    cdef unsigned int nf = cube.shape[0]
-    cdef unsigned int ny = cube.shape[1]
-    cdef unsigned int nx = cube.shape[2]
-    cdef unsigned int ix, iy, iz
+    cdef Py_ssize_t nf = cube.shape[0]
+    cdef Py_ssize_t ny = cube.shape[1]
+    cdef Py_ssize_t nx = cube.shape[2]
+    cdef Py_ssize_t ix, iy, iz
 
     # Sanity checks
-    assert (cube.dtype == FTYPE) and (sigma > 1.)
-
-    # Output arrays: average, standard deviation and numbers of frames
-    cdef np.ndarray[FTYPE_t, ndim=2] avg = np.empty((ny,nx), dtype=FTYPE)
-    cdef np.ndarray[FTYPE_t, ndim=2] std = np.empty((ny,nx), dtype=FTYPE)
-    cdef np.ndarray[int, ndim=2] nfm = np.empty((ny,nx), dtype=np.int32)
-
-    # Temporary arrays for storing values and rejection flags
-    cdef np.ndarray[FTYPE_t, ndim=1] vals = np.empty((nf,), dtype=FTYPE)
-    cdef np.ndarray[int, ndim=1] ok = np.empty((nf,), dtype=np.int32)
-
-    # Other temporaries
-    cdef FTYPE_t tavg, tstd, thresh
-    cdef unsigned int num, numt
-    cdef double sum
-
-    # The main loop starts. Anything inside this is done nx*ny
-    # times and better be fast...
-    for iy in xrange(ny):
-        for ix in xrange(nx):
-
-            # extract values of given pixel for all frames, set flags to 1
-            for iz in xrange(nf):
-                vals[iz] = cube[iz,iy,ix]
-                ok[iz] = 1
-
-            # calculate initial values of tavg, tstd and num
-            num = nf
-            sum = 0.
-            for iz in xrange(nf):
-                sum += vals[iz]
-            tavg = sum / num
-            sum = 0.
-            for iz in xrange(nf):
-                sum += (vals[iz]-tavg)**2
-            if num > 1:
-                tstd = sqrt(sum/(num-1))
-            else:
-                tstd = 0.
-                break
-
-            # Now the rejection loop. Keep rejecting if
-            # number of rejections is positive
-            while True:
-                # pre-compute rejection threshold
-                thresh = sigma*tstd
-                sum = 0.
-                numt = 0
-                for iz in xrange(nf):
-                    if abs(vals[iz]-tavg) > thresh:
-                        ok[iz] = 0
-
-                    if ok[iz]:
-                        sum += vals[iz]
-                        numt += 1
-
-                tavg = sum / numt
-                sum = 0.
-                for iz in xrange(nf):
-                    if ok[iz]:
-                        sum += (vals[iz]-tavg)**2
-                if numt > 1:
-                    tstd = sqrt(sum/(numt-1))
-                else:
-                    tstd = 0.
-                    break
-
-                if numt == num:
-                  break
-                num = numt
-
-            # store the final numbers
-            avg[iy,ix] = tavg
-            std[iy,ix] = tstd
-            nfm[iy,ix] = num
+    assert (nf > 0) and (sigma > 1.) and (nlow >= 0) and (nhigh >= 0)
+
+    # Output arrays: average, standard deviation and numbers of frames.
+    # The first two are computed in double precision.
+    cdef bint single
+    if CTYPE_t is np.float64_t:
+        single = False
+    else:
+        single = True
+    avg = np.empty((ny,nx), dtype=np.float64)
+    std = np.empty((ny,nx), dtype=np.float64)
+    nfm = np.empty((ny,nx), dtype=np.int32)
+    cdef double[:,::1] tavg = avg
+    cdef double[:,::1] tstd = std
+    cdef int[:,::1] num = nfm
+
+    # Per-thread scratch arrays for the values of a pixel, the rejection
+    # flags and sorting
+    cdef double* vals
+    cdef double* work
+    cdef unsigned char* ok
+
+    if nthreads <= 0:
+        nthreads = os.cpu_count() or 1
+
+    with nogil, parallel(num_threads=nthreads):
+        vals = <double*> malloc(2*nf*sizeof(double))
+        work = vals + nf
+        ok = <unsigned char*> malloc(nf*sizeof(unsigned char))
+
+        for iy in prange(ny, schedule='static'):
+            for ix in range(nx):
+                # extract values of given pixel for all frames
+                for iz in range(nf):
+                    vals[iz] = cube[iz,iy,ix]
+
+                _clip_pixel(
+                    vals, ok, work, nf, sigma, nlow, nhigh, median, single,
+                    &tavg[iy,ix], &tstd[iy,ix], &num[iy,ix]
+                )
+
+        free(vals)
+        free(ok)
+
+    if single:
+        avg = avg.astype(np.float32)
+        std = std.astype(np.float32)
 
     # return the frames
     return (avg,std,nfm)
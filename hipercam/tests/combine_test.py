@@ -0,0 +1,119 @@
+import unittest
+import os
+import tempfile
+
+import numpy as np
+
+import hipercam as hcam
+from hipercam import support
+from hipercam.scripts.combine import combine
+
+def make_frame(fname, texp, level, rng):
+    """Writes an MCCD with two CCDs, each with a large float32 window and a
+    small float64 one, and returns it"""
+    ccds = []
+    for cnam in ('1', '2'):
+        winds = [
+            ('E1', hcam.Window(
+                hcam.Winhead(1, 1, 300, 250, 1, 1, 'LL'),
+                rng.normal(level, 10, (250, 300)).astype(np.float32)
+            )),
+            ('E2', hcam.Window(
+                hcam.Winhead(401, 1, 40, 30, 1, 1, 'LR'),
+                rng.normal(level, 10, (30, 40))
+            )),
+        ]
+        ccd = hcam.CCD(winds, 500, 250, 0, 0)
+        ccd.head['EXPTIME'] = texp
+        ccds.append((cnam, ccd))
+    mccd = hcam.MCCD(ccds, hcam.Header())
+    mccd.head['EXPTIME'] = texp
+    mccd.write(fname, True)
+    return mccd
+
+class TestCombine(unittest.TestCase):
+    """Tests combine, which works in strips of rows, against combination
+    of whole windows"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.env = os.environ.get('HIPERCAM_ENV')
+        os.environ['HIPERCAM_ENV'] = os.path.join(self.tmpdir.name, 'env')
+
+        rng = np.random.default_rng(1)
+        path = lambda name: os.path.join(self.tmpdir.name, name)
+        self.bias = make_frame(path('bias.hcm'), 0., 50., rng)
+        self.dark = make_frame(path('dark.hcm'), 10., 20., rng)
+        self.frames, fnames = [], []
+        for n in range(9):
+            fnames.append(path('frame{:d}.hcm'.format(n)))
+            self.frames.append(make_frame(fnames[-1], 1.+n, 100., rng))
+        self.flist = path('frames.lis')
+        with open(self.flist, 'w') as fout:
+            fout.write('\n'.join(fnames) + '\n')
+        self.output = path('output.hcm')
+
+    def tearDown(self):
+        if self.env is None:
+            del os.environ['HIPERCAM_ENV']
+        else:
+            os.environ['HIPERCAM_ENV'] = self.env
+        self.tmpdir.cleanup()
+
+    def run_combine(self, bias, dark, method):
+        """Runs combine with 1 MB of memory, which needs three strips
+        for the first window of each CCD, and returns the result"""
+        args = [
+            'combine', self.flist, bias, dark, 'none', method, 'i',
+            'memory=1', 'clobber=yes', self.output
+        ]
+        if method == 'c':
+            args.insert(6, '3.')
+        combine(args)
+        return hcam.MCCD.read(self.output)
+
+    def stack(self, cnam, wnam, dark):
+        """Returns the calibrated frames as a 3D array"""
+        return np.array([
+            frame[cnam][wnam].data - self.bias[cnam][wnam].data -
+            (0. if dark is None else frame.head['EXPTIME']/10*dark[cnam][wnam].data)
+            for frame in self.frames
+        ])
+
+    def test_median(self):
+        out = self.run_combine(
+            os.path.join(self.tmpdir.name, 'bias'), 'none', 'm'
+        )
+        for cnam in ('1', '2'):
+            for wnam in ('E1', 'E2'):
+                self.assertTrue(np.array_equal(
+                    out[cnam][wnam].data,
+                    np.median(self.stack(cnam, wnam, None), axis=0)
+                ))
+
+    def test_clipped_mean(self):
+        out = self.run_combine('none', 'none', 'c')
+        for cnam in ('1', '2'):
+            for wnam in ('E1', 'E2'):
+                arr = np.array([frame[cnam][wnam].data for frame in self.frames])
+                self.assertTrue(np.array_equal(
+                    out[cnam][wnam].data, support.avgstd(arr, 3.)[0]
+                ))
+
+    def test_dark(self):
+        # the bias and scaled dark are added before subtraction, which
+        # can change the last bit
+        out = self.run_combine(
+            os.path.join(self.tmpdir.name, 'bias'),
+            os.path.join(self.tmpdir.name, 'dark'), 'm'
+        )
+        for cnam in ('1', '2'):
+            for wnam in ('E1', 'E2'):
+                self.assertTrue(np.allclose(
+                    out[cnam][wnam].data,
+                    np.median(self.stack(cnam, wnam, self.dark), axis=0),
+                    rtol=0., atol=1.e-4
+                ))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import unittest
+
+import numpy as np
+
+import hipercam as hcam
+from hipercam.fitting import moffat, dmoffat, fitMoffat, fitMoffatBatch
+from hipercam.fitting import profileStep
+from hipercam.fitting import _subpixels, _moffat_jac
+
+def star(xc, yc, nx, ny, fwhm, beta, rng):
+    """Returns a Window containing a noisy Moffat profile"""
+    wind = hcam.Window(
+        hcam.Winhead(1, 1, nx, ny, 1, 1, 'LL'), np.zeros((ny,nx))
+    )
+    X, Y = np.meshgrid(wind.x(np.arange(nx)), wind.y(np.arange(ny)))
+    prof = moffat(X, Y, 50., 1000., xc, yc, fwhm, beta, 1, 1, 0)
+    wind.data = rng.poisson(prof) + rng.normal(0, 3, prof.shape)
+    return wind
+
+class TestMoffatJac(unittest.TestCase):
+    """Tests the fused Moffat profile and derivative kernel"""
+
+    def test_moffat_jac(self):
+        X, Y = np.meshgrid(np.arange(1., 22., 2.), np.arange(1., 20., 2.))
+        for ndiv in (0, 1, 3):
+            for pars in (
+                    (10., 100., 10.3, 9.6, 3.5, 2.5),
+                    (0., 50., 11.1, 10.2, 2., 0.005)
+            ):
+                model = np.empty_like(X)
+                derivs = np.empty((6,) + X.shape)
+                xoffs, yoffs = _subpixels(2, 2, ndiv)
+                _moffat_jac(X, Y, *pars, xoffs, yoffs, model, derivs)
+                self.assertTrue(
+                    np.allclose(model, moffat(X, Y, *pars, 2, 2, ndiv),
+                                rtol=1.e-12, atol=0.)
+                )
+                for deriv, dmoff in zip(
+                        derivs, dmoffat(X, Y, *pars, 2, 2, ndiv, True, True)
+                ):
+                    self.assertTrue(
+                        np.allclose(deriv, dmoff, rtol=1.e-10, atol=1.e-12)
+                    )
+
+class TestFitMoffatBatch(unittest.TestCase):
+    """Tests that batched Moffat fits match those carried out one by one"""
+
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        self.winds = [
+            star(10.7, 11.2, 21, 21, 4., 3., rng),
+            star(8.1, 9.6, 17, 19, 5., 4., rng),
+            star(12.3, 10.9, 23, 21, 3.5, 2.5, rng),
+        ]
+        # a cosmic ray to be rejected
+        self.winds[1].data[3,4] += 5000.
+        self.starts = [
+            (50., 900., 11., 11., 4.5, 3.),
+            (50., 900., 9., 10., 4.5, 3.),
+            (50., 900., 12., 11., 4.5, 3.),
+        ]
+
+    def test_batch(self):
+        skys, heights, xs, ys, fwhms, betas = zip(*self.starts)
+        results = fitMoffatBatch(
+            self.winds, skys, heights, xs, ys, fwhms, 1.5, False, betas, 10.,
+            False, 3*[3.], 3*[1.], 4., 0
+        )
+        for wind, start, result in zip(self.winds, self.starts, results):
+            pars, epars, extras = fitMoffat(
+                wind, *start[:5], 1.5, False, start[5], 10., False, 3., 1., 4., 0
+            )
+            for par, epar, bpar in zip(pars, epars, result[0]):
+                self.assertAlmostEqual(par, bpar, delta=0.01*epar)
+            for epar, bepar in zip(epars, result[1]):
+                self.assertAlmostEqual(epar, bepar, delta=0.01*epar)
+            self.assertEqual(extras[5:8], result[2][5:8])
+            self.assertEqual(result[2][0].data.shape, wind.data.shape)
+
+        self.assertGreater(results[1][2][6], 0, 'cosmic ray not rejected')
+
+    def test_errors(self):
+        skys, heights, xs, ys, fwhms, betas = zip(*self.starts)
+        results = fitMoffatBatch(
+            self.winds, skys, heights, xs, ys, (4.5, 1., 4.5), 1.5, False,
+            betas, 10., False, 3*[3.], 3*[1.], 4., 0
+        )
+        self.assertIsInstance(results[1], hcam.HipercamError)
+        self.assertNotIsInstance(results[0], hcam.HipercamError)
+
+class TestProfileStep(unittest.TestCase):
+    """Tests the prediction of parameter changes from an earlier fit"""
+
+    def test_step(self):
+        wind = star(10.7, 11.2, 21, 21, 4., 3., np.random.default_rng(2))
+        pars, epars, extras = fitMoffat(
+            wind, 50., 900., 11., 11., 4.5, 1.5, False, 3., 10., False,
+            3., 1., 4., 0
+        )
+
+        # no move from the best fit, ignoring the pixels it rejected
+        X, Y, sigma = extras[1:4]
+        rejected = (X[sigma < 0], Y[sigma < 0])
+        step = profileStep(wind, 'm', pars, 3., 1., rejected=rejected)
+        self.assertLess(np.hypot(step[2], step[3]), 0.01*epars[2])
+
+        # the step back from an offset position
+        old = (pars[0], pars[1], pars[2]-0.2, pars[3]+0.1, pars[4], pars[5])
+        step = profileStep(wind, 'm', old, 3., 1., rejected=rejected)
+        self.assertAlmostEqual(step[2], 0.2, delta=0.05)
+        self.assertAlmostEqual(step[3], -0.1, delta=0.05)
+
+        # a fixed FWHM does not move, and limits are applied
+        step = profileStep(
+            wind, 'm', old, 3., 1., rejected=rejected, fwhm_fix=True
+        )
+        self.assertEqual(step[4], 0.)
+        self.assertAlmostEqual(step[2], 0.2, delta=0.05)
+        step = profileStep(
+            wind, 'm', old, 3., 1., rejected=rejected, fwhm_min=pars[4]+1.,
+            beta_max=pars[5]-0.5
+        )
+        self.assertAlmostEqual(step[4], 1.)
+        self.assertAlmostEqual(step[5], -0.5)
+
+if __name__ == '__main__':
+    unittest.main()
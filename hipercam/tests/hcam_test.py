@@ -0,0 +1,223 @@
+import unittest
+import os
+import struct
+import tempfile
+
+import numpy as np
+from astropy.io import fits
+
+from hipercam import hcam
+
+def make_run(fname, nframe, nx=6, ny=4, seed=1, pscan=False, oscan=False):
+    """Writes a small, fake one-window HiPERCAM raw run to 'fname' and returns
+    the pixel values as an (nframe,ccd,quadrant,y,x) array in the order
+    they are multiplexed in the file. 'pscan' and 'oscan' add pre- and
+    over-scans to the nx by ny windows."""
+
+    # dimensions including any pre- and over-scans
+    mnx = nx + hcam.HCM_NPSCAN if pscan else nx
+    mny = ny + hcam.HCM_NOSCAN if oscan else ny
+
+    head = fits.Header()
+    head['SIMPLE'] = True
+    head['BITPIX'] = 16
+    head['NAXIS'] = 3
+    head['NAXIS1'] = 20*mnx*mny + 18
+    head['NAXIS2'] = 1
+    head['NAXIS3'] = nframe
+    head['BSCALE'] = 1
+    head['BZERO'] = 32768
+    for key, value in (
+            ('READ CURNAME','OneWindow'), ('CLRCCD',False), ('DUMMY',False),
+            ('INCOVSCY',oscan), ('INCPRSCX',pscan), ('TDELAY',100.),
+            ('TREAD',30.), ('TFT',10.), ('BINX1',1), ('BINY1',1),
+            ('SPEED','Slow'), ('WIN1 NX',nx), ('WIN1 NY',ny), ('WIN1 YS',100),
+            ('WIN1 XSE',100), ('WIN1 XSF',100), ('WIN1 XSG',100),
+            ('WIN1 XSH',100),
+    ):
+        head['HIERARCH ESO DET ' + key] = value
+    for n in range(5):
+        head['HIERARCH ESO DET NSKIPS{:d}'.format(n+1)] = 0
+
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 65536, (nframe,5,4,mny,mnx), dtype=np.uint16)
+
+    with open(fname,'wb') as fout:
+        fout.write(head.tostring().encode())
+        for nf in range(nframe):
+            # multiplexing: pixel 1 of each quadrant of each CCD first
+            frame = pixels[nf].transpose(2,3,0,1).flatten()
+            fout.write((frame.astype(np.int32)-32768).astype('>i2').tobytes())
+
+            # timing bytes, mangled as they are in the real data
+            tstamp = struct.pack(
+                '<IIIIIIIIbb', nf, nf, 2019, 100, 3, 4, 5, 1000*nf, 6, 1
+            )
+            vals = [val - 32768 for val in struct.unpack('<17H', tstamp)]
+            fout.write(struct.pack('>17h', *vals) + b'\x00\x00')
+
+    return pixels
+
+class TestRdata(unittest.TestCase):
+    """Tests reading of raw HiPERCAM data"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.run = os.path.join(self.tmpdir.name, 'run0001')
+        self.nframe = 4
+        self.pixels = make_run(self.run + '.fits', self.nframe)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_rdata_pixels(self):
+        for nf, mccd in enumerate(hcam.Rdata(self.run)):
+            self.assertEqual(mccd.head['NFRAME'], nf+1)
+            self.assertEqual(
+                mccd['3']['E1'].data.sum(), self.pixels[nf,2,0].sum(),
+                'raw data not correctly read'
+            )
+        self.assertEqual(nf+1, self.nframe)
+
+    def test_rdata_mmap(self):
+        with hcam.Rdata(self.run) as rdat, \
+             hcam.Rdata(self.run, mmap=True) as rmap:
+            for mccd, mmccd in zip(rdat, rmap):
+                self.assertEqual(mccd.head['MJDUTC'], mmccd.head['MJDUTC'])
+                for cnam, ccd in mccd.items():
+                    for wnam, wind in ccd.items():
+                        mwind = mmccd[cnam][wnam]
+                        self.assertEqual(mwind.data.dtype, np.float32)
+                        self.assertTrue(
+                            np.array_equal(wind.data, mwind.data),
+                            'memory-mapped data differ from those read'
+                        )
+
+            self.assertEqual(rmap(2)['5']['G1'].data.sum(),
+                             self.pixels[1,4,2].sum())
+
+    def test_rdata_growing(self):
+        # a run still being written: only the first two frames are there
+        # when it is opened
+        with open(self.run + '.fits', 'rb') as fin:
+            raw = fin.read()
+        with hcam.Rdata(self.run) as rdat:
+            nbytes = rdat._hbytes + 2*rdat._framesize
+        with open(self.run + '.fits', 'wb') as fout:
+            fout.write(raw[:nbytes])
+
+        with hcam.Rdata(self.run, mmap=True) as rmap:
+            for nf in range(2):
+                mccd = rmap()
+            with open(self.run + '.fits', 'ab') as fout:
+                fout.write(raw[nbytes:])
+            for nf in range(2, self.nframe):
+                mccd = rmap()
+                self.assertEqual(mccd.head['NFRAME'], nf+1)
+                self.assertEqual(
+                    mccd['3']['E1'].data.sum(), self.pixels[nf,2,0].sum(),
+                    'frames added to the file not correctly read'
+                )
+
+    def test_rdata_block(self):
+        for mmap in (False, True):
+            with hcam.Rdata(self.run, mmap=mmap) as rdat:
+                data, nframes, mjds, texps, goods, dstatus = \
+                    rdat.read_block(2, 10)
+                self.assertEqual(data[0].shape, (self.nframe-1,5,4,4,6))
+                self.assertTrue(np.array_equal(nframes, [2,3,4]))
+                for nf, nframe in enumerate(nframes):
+                    mccd = rdat(nframe)
+                    for nccd, (cnam, ccd) in enumerate(mccd.items()):
+                        self.assertEqual(mjds[nf,nccd], ccd.head['MJDUTC'])
+                        self.assertEqual(texps[nf,nccd], ccd.head['EXPTIME'])
+                        self.assertEqual(goods[nf,nccd], ccd.head['GOODTIME'])
+                        self.assertEqual(
+                            dstatus[nf,nccd], ccd.head['DSTATUS']
+                        )
+                        for nquad, wnam in enumerate(('E1','F1','G1','H1')):
+                            self.assertTrue(
+                                np.array_equal(
+                                    data[0][nf,nccd,nquad], ccd[wnam].data
+                                ),
+                                'block data differ from those of Rdata'
+                            )
+
+    def test_rdata_reuse(self):
+        # recycled frames, with and without pre- and over-scans, should
+        # match new ones exactly
+        for pscan, oscan in ((False, False), (True, True)):
+            run = os.path.join(self.tmpdir.name, 'run0002')
+            make_run(run + '.fits', self.nframe, pscan=pscan, oscan=oscan)
+            for mmap in (False, True):
+                with hcam.Rdata(run, mmap=mmap) as rdat, \
+                     hcam.Rdata(run, mmap=mmap, reuse=1) as rreuse:
+                    last = None
+                    for mccd, rmccd in zip(rdat, rreuse):
+                        if last is not None:
+                            self.assertIs(rmccd, last)
+                        last = rmccd
+                        self.assertEqual(len(rmccd.head.cards), len(mccd.head.cards))
+                        for key in ('NFRAME', 'TIMSTAMP', 'MJDUTC'):
+                            self.assertEqual(rmccd.head[key], mccd.head[key])
+                        for cnam, ccd in mccd.items():
+                            rccd = rmccd[cnam]
+                            self.assertEqual(list(rccd), list(ccd))
+                            self.assertEqual(len(rccd.head.cards), len(ccd.head.cards))
+                            for key in ('MJDUTC', 'EXPTIME', 'DSTATUS'):
+                                self.assertEqual(rccd.head[key], ccd.head[key])
+                            for wnam, wind in ccd.items():
+                                self.assertTrue(
+                                    np.array_equal(wind.data, rccd[wnam].data),
+                                    'recycled frame differs from new one'
+                                )
+
+        # frames are only recycled when handed back, and if unchanged
+        with hcam.Rdata(self.run) as rdat:
+            mccd1 = rdat()
+            rdat.recycle(mccd1)
+            mccd2 = rdat()
+            self.assertIs(mccd2, mccd1)
+            mccd2['1']['E1'].data = mccd2['1']['E1'].data[1:]
+            rdat.recycle(mccd2)
+            self.assertIsNot(rdat(), mccd2)
+
+class TestTiming(unittest.TestCase):
+    """Tests the array versions of the timing routines"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.run = os.path.join(self.tmpdir.name, 'run0001')
+        self.nframe = 5
+        make_run(self.run + '.fits', self.nframe)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_htimers(self):
+        with hcam.Rtbytes(self.run) as rtbytes:
+            tbytes = rtbytes.read_block(1, 100)
+            self.assertEqual(tbytes.shape, (self.nframe, rtbytes.ntbytes))
+            values = hcam.htimers(tbytes)
+            for nf, tbts in enumerate(rtbytes):
+                self.assertEqual(tbts, tbytes[nf].tobytes())
+                self.assertEqual(
+                    hcam.htimer(tbts), tuple(value[nf] for value in values)
+                )
+
+    def test_timings(self):
+        with hcam.Rdata(self.run) as rdat, hcam.Rtbytes(self.run) as rtbytes:
+            nframes, tstamps, mjds, texps, goods = rdat.timings(
+                rtbytes.read_block(2, 3)
+            )
+            self.assertTrue(np.array_equal(nframes, [2,3,4]))
+            for nf, nframe in enumerate(nframes):
+                mccd = rdat(nframe)
+                self.assertEqual(tstamps[nf], mccd.head['MJDUTC'])
+                for nccd, ccd in enumerate(mccd.values()):
+                    self.assertEqual(mjds[nf,nccd], ccd.head['MJDUTC'])
+                    self.assertEqual(texps[nf,nccd], ccd.head['EXPTIME'])
+                    self.assertEqual(goods[nf,nccd], ccd.head['GOODTIME'])
+
+if __name__ == '__main__':
+    unittest.main()
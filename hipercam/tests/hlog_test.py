@@ -0,0 +1,64 @@
+import unittest
+import os
+import tempfile
+
+import numpy as np
+from astropy.io import fits
+
+from hipercam.hlog import Hlog
+
+class TestRfits(unittest.TestCase):
+    """Tests loading of selected CCDs and columns of FITS logs"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.fname = os.path.join(self.tmpdir.name, 'test.fits')
+        rng = np.random.default_rng(1)
+        hdul = [fits.PrimaryHDU()]
+        self.data = {}
+        for cnam in ('1', '2'):
+            names = ['nframe', 'MJD', 'MJDok', 'Exptim']
+            dts = ['i4', 'f8', '?', 'f4']
+            for apnam in ('1', '2'):
+                names += [f'counts_{apnam}', f'countse_{apnam}', f'flag_{apnam}']
+                dts += ['f4', 'f4', 'u4']
+            data = np.zeros(20, list(zip(names, dts)))
+            data['nframe'] = np.arange(1, 21)
+            data['MJD'] = 59000. + np.arange(20)/86400.
+            data['MJDok'] = True
+            data['Exptim'] = 1.
+            data['counts_1'] = rng.uniform(100, 200, 20)
+            data['countse_1'] = 10.
+            data['flag_1'][3] = 1
+            self.data[cnam] = data
+            hdr = fits.Header()
+            hdr['CCDNAME'] = cnam
+            hdul.append(fits.BinTableHDU(data, header=hdr))
+        fits.HDUList(hdul).writeto(self.fname)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_columns(self):
+        hlog = Hlog.rfits(
+            self.fname, ccds='2', columns=['MJD', 'counts_1', 'countse_1', 'junk']
+        )
+        self.assertEqual(list(hlog.keys()), ['2'])
+        self.assertEqual(hlog['2'].dtype.names, ('MJD', 'counts_1', 'countse_1'))
+        self.assertEqual(hlog.apnames['2'], ['1', '2'])
+        self.assertTrue(np.all(hlog['2']['counts_1'] == self.data['2']['counts_1']))
+
+        # no flags or exposure times to go on
+        ts = hlog.tseries('2', '1')
+        self.assertTrue(np.all(ts.y == self.data['2']['counts_1']))
+        self.assertEqual(ts.bmask[3], 0)
+
+    def test_all(self):
+        hlog = Hlog.rfits(self.fname)
+        self.assertEqual(sorted(hlog.keys()), ['1', '2'])
+        ts = hlog.tseries('1', '1')
+        self.assertTrue(np.all(ts.y == self.data['1']['counts_1']))
+        self.assertNotEqual(ts.bmask[3], 0)
+
+if __name__ == '__main__':
+    unittest.main()
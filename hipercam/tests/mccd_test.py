@@ -1,10 +1,13 @@
 import unittest
 import copy
+import os
+import tempfile
 
 import numpy as np
 from astropy.io import fits
 
-from hipercam import Winhead, Window, CCD, MCCD, HipercamError
+from hipercam import Winhead, Window, CCD, MCCD, Calibrator, Header, HipercamError
+from hipercam import get_hcm_layout, read_hcm_rows
 
 class TestMCCD(unittest.TestCase):
     """Provides simple tests of MCCD methods and attributes.
@@ -59,6 +62,192 @@ class TestMCCD(unittest.TestCase):
         self.assertEqual(mccd[3][1].data[0,0]+self.level1,self.mccd[3][1].data[0,0],
                          'copy.deepcopy of MCCD failed')
 
+class TestCalibrator(unittest.TestCase):
+    """Tests Calibrator against step-by-step calibration.
+
+    """
+
+    def setUp(self):
+
+        rng = np.random.default_rng(12345)
+
+        def frame(wins, nccd, exptime, level, noise):
+            ccds = []
+            for n in range(nccd):
+                winds = []
+                for wnam, (llx, lly, nx, ny) in wins.items():
+                    win = Winhead(llx, lly, nx, ny, 1, 1, 'LL')
+                    data = level + noise*rng.standard_normal((ny, nx))
+                    winds.append((wnam, Window(win, data.astype(np.float32))))
+                ccd = CCD(winds, 200, 100)
+                ccd.head['EXPTIME'] = exptime[n]
+                ccds.append((str(n+1), ccd))
+            head = Header()
+            head['EXPTIME'] = exptime[0]
+            return MCCD(ccds, head)
+
+        # calibration frames are full frame, the data are windowed
+        full = {'1' : (1, 1, 200, 100)}
+        self.bias = frame(full, 2, (0., 0.), 1000., 5.)
+        self.dark = frame(full, 2, (100., 100.), 50., 2.)
+        self.flat = frame(full, 2, (1., 1.), 1., 0.05)
+        self.mccd = frame(
+            {'E1' : (11, 21, 20, 10), 'F1' : (131, 21, 20, 10)},
+            2, (10., 5.), 1500., 20.
+        )
+
+    def calibrate(self, bias, dark, flat):
+        """Step-by-step calibration as used by reduce before Calibrator"""
+        pccd = self.mccd - bias.crop(self.mccd)
+        dark = dark.crop(self.mccd)
+        for cnam, ccd in pccd.items():
+            ccd -= (ccd.head['EXPTIME'] / dark.head['EXPTIME']) * dark[cnam]
+        pccd /= flat.crop(self.mccd)
+        return pccd
+
+    def test_calibrator(self):
+
+        calib = Calibrator(self.bias, self.dark, self.flat)
+        pccd = calib(self.mccd)
+        ref = self.calibrate(self.bias, self.dark, self.flat)
+
+        for cnam, ccd in ref.items():
+            self.assertEqual(pccd[cnam].head['EXPTIME'], ccd.head['EXPTIME'])
+            for wnam, wind in ccd.items():
+                self.assertEqual(pccd[cnam][wnam].llx, wind.llx)
+                self.assertEqual(pccd[cnam][wnam].data.dtype, np.float32)
+                self.assertTrue(np.allclose(pccd[cnam][wnam].data, wind.data,
+                                            rtol=1.e-5, atol=1.e-3),
+                                'Calibrator differs from step-by-step calibration')
+
+        # into a preallocated frame, and in place
+        out = self.mccd.copy()
+        out.set_const(0.)
+        calib(self.mccd, out)
+        calib(self.mccd, self.mccd)
+        for cnam, ccd in pccd.items():
+            for wnam, wind in ccd.items():
+                self.assertTrue(np.array_equal(out[cnam][wnam].data, wind.data))
+                self.assertTrue(np.array_equal(self.mccd[cnam][wnam].data, wind.data))
+
+    def test_calibrator_rows(self):
+
+        # strips of rows match the whole Windows, and are not cached
+        calib = Calibrator(self.bias, self.dark, self.flat)
+        for cnam, ccd in self.mccd.items():
+            arrays = calib.prepare(cnam, ccd, 2.5)
+            calib._arrays.clear()
+            for wnam, (offset, flat) in arrays.items():
+                roffset, rflat = calib.prepare_rows(cnam, ccd, wnam, 2, 5, 2.5)
+                self.assertTrue(np.array_equal(roffset, offset[2:5]))
+                self.assertTrue(np.array_equal(rflat, flat[2:5]))
+        self.assertEqual(len(calib._arrays), 0)
+
+    def test_calibrator_partial(self):
+
+        # bias only, and no calibration at all
+        pccd = Calibrator(self.bias)(self.mccd)
+        self.assertTrue(np.array_equal(
+            pccd['1']['F1'].data,
+            self.mccd['1']['F1'].data - self.bias.crop(self.mccd)['1']['F1'].data
+        ))
+
+        pccd = Calibrator()(self.mccd)
+        self.assertTrue(np.array_equal(pccd['2']['E1'].data, self.mccd['2']['E1'].data))
+        self.assertIsNot(pccd['2']['E1'].data, self.mccd['2']['E1'].data)
+
+        # the cropped frames are re-used while the format stays the same,
+        # and new ones made when it changes
+        calib = Calibrator(self.bias, None, self.flat)
+        calib(self.mccd)
+        calib(self.mccd)
+        self.assertEqual(len(calib._crops), 2)
+        win = self.mccd['1']['E1'].window(10.5, 20.5, 20.5, 25.5)
+        self.mccd['1']['E1'] = win
+        pccd = calib(self.mccd)
+        self.assertEqual(len(calib._crops), 3)
+        self.assertEqual(pccd['1']['E1'].data.shape, win.data.shape)
+
+class TestRhcm(unittest.TestCase):
+    """Tests the fast reading of hcm files"""
+
+    def setUp(self):
+        rng = np.random.default_rng(54321)
+        ccds = []
+        for cnam in ('1', '2', '3'):
+            winds = []
+            for n, (llx, lly, nx, ny) in enumerate(((11, 21, 30, 20), (101, 21, 17, 20))):
+                win = Winhead(llx, lly, nx, ny, 1, 2, 'LR')
+                data = 1000*rng.random((ny, nx))
+                if cnam == '2':
+                    data = data.astype(np.uint16)
+                elif n:
+                    data = data.astype(np.float32)
+                winds.append(('E{:d}'.format(n+1), Window(win, data)))
+            ccd = CCD(winds, 200, 100, 10, 0)
+            ccd.head['EXPTIME'] = (float(cnam), "Exposure time, O'Neill's")
+            ccds.append((cnam, ccd))
+        head = Header()
+        head['OBJECT'] = 'IP Peg'
+        head.add_history('a history line')
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.fname = os.path.join(self.tmpdir.name, 'test.hcm')
+        MCCD(ccds, head).write(self.fname)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def compare(self, ccd, fccd):
+        self.assertEqual(list(ccd), list(fccd))
+        self.assertEqual(
+            (ccd.nxtot, ccd.nytot, ccd.nxpad, ccd.nypad),
+            (fccd.nxtot, fccd.nytot, fccd.nxpad, fccd.nypad)
+        )
+        for wnam, wind in ccd.items():
+            fwind = fccd[wnam]
+            self.assertEqual(wind.format(True), fwind.format(True))
+            self.assertEqual(wind.data.dtype, fwind.data.dtype)
+            self.assertTrue(np.array_equal(wind.data, fwind.data))
+            self.assertEqual(wind.cards, fwind.cards)
+
+    def test_mccd_rhcm(self):
+        mccd = MCCD.read(self.fname)
+        fmccd = MCCD.rhcm(self.fname)
+
+        # headers are only parsed when accessed
+        self.assertIn('_raw', fmccd['1']['E1'].__dict__)
+        self.assertEqual(fmccd['1'].head['EXPTIME'], 1.)
+        self.assertNotIn('_raw', fmccd['1']['E1'].__dict__)
+
+        self.assertEqual(fmccd.head['OBJECT'], 'IP Peg')
+        self.assertNotIn('NUMCCD', fmccd.head)
+        self.assertEqual(list(mccd), list(fmccd))
+        for cnam, ccd in mccd.items():
+            self.compare(ccd, fmccd[cnam])
+
+        # float64 data are kept as such, all others become float32
+        self.assertEqual(fmccd['1']['E1'].data.dtype, np.float64)
+        self.assertEqual(fmccd['1']['E2'].data.dtype, np.float32)
+        self.assertEqual(fmccd['2']['E1'].data.dtype, np.float32)
+
+    def test_ccd_rhcm(self):
+        ccd = CCD.read(self.fname, '2')
+        fccd = CCD.rhcm(self.fname, '2')
+        self.compare(ccd, fccd)
+        self.assertEqual(fccd.head.get_comment('EXPTIME'), "Exposure time, O'Neill's")
+        self.assertRaises(HipercamError, CCD.rhcm, self.fname, '4')
+
+    def test_rows(self):
+        mccd = MCCD.read(self.fname)
+        for cnam in ('1', '2', '3'):
+            layout = get_hcm_layout(self.fname, cnam)
+            self.assertEqual(list(layout), list(mccd[cnam]))
+            for wnam, wind in mccd[cnam].items():
+                rows = read_hcm_rows(self.fname, layout[wnam], 3, 9)
+                self.assertEqual(rows.dtype, wind.data.dtype)
+                self.assertTrue(np.array_equal(rows, wind.data[3:9]))
+        self.assertRaises(HipercamError, get_hcm_layout, self.fname, '4')
+
 
 if __name__ == '__main__':
     unittest.main()
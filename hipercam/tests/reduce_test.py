@@ -0,0 +1,40 @@
+import unittest
+
+import numpy as np
+
+from hipercam.scripts.reduce import pairwise_sum, clipped_skies
+
+class TestKernels(unittest.TestCase):
+    """Tests that the extraction kernels match numpy exactly"""
+
+    def setUp(self):
+        self.rng = np.random.default_rng(1)
+
+    def test_pairwise_sum(self):
+        for dtype in (np.float32, np.float64):
+            for n in (1, 7, 8, 9, 127, 128, 129, 1000, 4099):
+                arr = self.rng.normal(100, 30, n).astype(dtype)
+                self.assertEqual(pairwise_sum(arr), arr.sum())
+
+    def test_clipped_skies(self):
+        dsky = self.rng.normal(100, 10, 600).astype(np.float32)
+        dsky[::37] += 200
+        soff = np.array([0, 0, 10, 250, 600])
+        slevels, srmss, nskys, nrejs = clipped_skies(dsky, soff, 2.5)
+        self.assertEqual(nskys[0], 0)
+        for nap in range(1, len(soff)-1):
+            dsk = dsky[soff[nap]:soff[nap+1]]
+            ok = np.ones_like(dsk, dtype=bool)
+            nrej = 1
+            while nrej:
+                slevel = dsk[ok].mean()
+                srms = dsk[ok].std()
+                nold = len(dsk[ok])
+                ok = ok & (np.abs(dsk - slevel) < 2.5 * srms)
+                nrej = nold - len(dsk[ok])
+            self.assertEqual(slevels[nap], slevel)
+            self.assertEqual(srmss[nap], srms)
+            self.assertEqual(nskys[nap], ok.sum())
+
+if __name__ == '__main__':
+    unittest.main()
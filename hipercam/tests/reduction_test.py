@@ -0,0 +1,258 @@
+import unittest
+import os
+import tempfile
+
+import numpy as np
+
+import hipercam as hcam
+from hipercam.reduction import xcorrStamps, xcorrApers, moveApers, LogWriter
+from hipercam.hlog import Hlog
+
+def star_field(x0, y0, nx=60, ny=50, seed=1):
+    """Returns a CCD with one window containing two stars, one at x0,y0 and
+    the other offset from it by 20,10"""
+    rng = np.random.default_rng(seed)
+    x = np.arange(1, nx+1)
+    y = np.arange(1, ny+1)
+    X, Y = np.meshgrid(x, y)
+    data = 100 + rng.normal(0, 1, (ny, nx))
+    for xc, yc in ((x0, y0), (x0+20, y0+10)):
+        data += 1000*np.exp(-((X-xc)**2+(Y-yc)**2)/(2*1.5**2))
+    wind = hcam.Window(hcam.Winhead(1, 1, nx, ny, 1, 1, 'LL'), data)
+    return hcam.CCD([('1', wind)], nx, ny, 0, 0)
+
+class Rfile(dict):
+    pass
+
+class TestXcorr(unittest.TestCase):
+    """Tests tracking of apertures by cross-correlation"""
+
+    def setUp(self):
+        self.rfile = Rfile(apertures={'fit_diff': 2.})
+        self.rfile.aper = hcam.MccdAper(
+            [('1', hcam.CcdAper(
+                [('1', hcam.Aperture(20., 20., 4., 8., 12., True)),
+                 ('2', hcam.Aperture(40., 30., 4., 8., 12., True)),
+                 ('3', hcam.Aperture(30., 15., 4., 8., 12., False))]
+            ))]
+        )
+        self.ccdwin = {'1': '1', '2': '1', '3': '1'}
+        self.xcorr = xcorrStamps(
+            star_field(20., 20.), self.ccdwin, self.rfile.aper['1'], 12
+        )
+
+    def test_shift(self):
+        store = {}
+        ccd = star_field(22.3, 18.6, seed=2)
+        self.assertTrue(xcorrApers('1', ccd, self.rfile, store, self.xcorr))
+        ccdaper = self.rfile.aper['1']
+        self.assertAlmostEqual(ccdaper['1'].x, 22.3, delta=0.15)
+        self.assertAlmostEqual(ccdaper['1'].y, 18.6, delta=0.15)
+        self.assertAlmostEqual(ccdaper['3'].x, 32.3, delta=0.15)
+        self.assertAlmostEqual(store['3']['dx'], 2.3, delta=0.15)
+
+    def test_failure(self):
+        # shifted too far to be trusted; nothing should change
+        store = {}
+        ccd = star_field(30., 20.)
+        self.assertFalse(xcorrApers('1', ccd, self.rfile, store, self.xcorr))
+        self.assertEqual(self.rfile.aper['1']['1'].x, 20.)
+        self.assertEqual(len(store), 0)
+
+class TestMoveApers(unittest.TestCase):
+    """Tests re-positioning of apertures by profile fits"""
+
+    def setUp(self):
+        self.rfile = Rfile(
+            apertures={
+                'location': 'variable', 'search_half_width': 8,
+                'fit_half_width': 10, 'search_smooth_fwhm': 3.,
+                'search_smooth_fft': False, 'fit_height_min_ref': 100.,
+                'fit_height_min_nrf': 50., 'fit_fwhm': 3., 'fit_fwhm_min': 1.5,
+                'fit_fwhm_fixed': False, 'fit_beta': 4., 'fit_beta_max': 20.,
+                'fit_thresh': 8., 'fit_ndiv': 0, 'fit_diff': 2.,
+                'fit_max_shift': 5., 'fit_alpha': 1., 'fit_track': False,
+                'fit_skip_tol': 0., 'fit_max_reject': None
+            }
+        )
+        self.rfile.method = 'm'
+        self.rfile.aper = hcam.MccdAper(
+            [('1', hcam.CcdAper(
+                [('1', hcam.Aperture(20., 20., 4., 8., 12., True)),
+                 ('2', hcam.Aperture(40., 30., 4., 8., 12., False)),
+                 ('3', hcam.Aperture(30., 45., 4., 8., 12., False))]
+            ))]
+        )
+
+    def test_move(self):
+        ccd = star_field(21.3, 19.6, seed=2)
+        read, gain = ccd.copy(), ccd.copy()
+        read.set_const(3.)
+        gain.set_const(1.)
+        store = {'mfwhm': -1., 'mbeta': -1.}
+        self.assertTrue(
+            moveApers(
+                '1', ccd, read, gain, {'1': '1', '2': '1', '3': '1'},
+                self.rfile, store
+            )
+        )
+        ccdaper = self.rfile.aper['1']
+        self.assertAlmostEqual(ccdaper['1'].x, 21.3, delta=0.05)
+        self.assertAlmostEqual(ccdaper['2'].x, 41.3, delta=0.05)
+        self.assertAlmostEqual(ccdaper['2'].y, 29.6, delta=0.05)
+        self.assertGreater(store['2']['fwhme'], 0.)
+
+        # nothing to fit for aperture 3, which should just be shifted
+        self.assertTrue(np.isnan(store['3']['xe']))
+        self.assertAlmostEqual(ccdaper['3'].x, 31.3, delta=0.05)
+
+    def test_track(self):
+        # the second frame is identical, so tracked fits should be skipped
+        self.rfile['apertures']['fit_track'] = True
+        self.rfile['apertures']['fit_skip_tol'] = 0.01
+        ccd = star_field(21.3, 19.6, seed=2)
+        read, gain = ccd.copy(), ccd.copy()
+        read.set_const(3.)
+        gain.set_const(1.)
+        store = {'mfwhm': -1., 'mbeta': -1.}
+        ccdwin = {'1': '1', '2': '1', '3': '1'}
+        self.assertTrue(
+            moveApers('1', ccd, read, gain, ccdwin, self.rfile, store)
+        )
+        self.assertEqual((store['nfit'], store['nskip']), (2, 0))
+        self.assertTrue(
+            moveApers('1', ccd, read, gain, ccdwin, self.rfile, store)
+        )
+        self.assertEqual((store['nfit'], store['nskip']), (2, 2))
+        ccdaper = self.rfile.aper['1']
+        self.assertAlmostEqual(ccdaper['1'].x, 21.3, delta=0.05)
+        self.assertAlmostEqual(ccdaper['2'].y, 29.6, delta=0.05)
+        self.assertGreater(store['2']['fwhme'], 0.)
+
+    def test_track_fixed(self):
+        # skipped fits must keep a fixed FWHM, as the fits do
+        self.rfile['apertures']['fit_track'] = True
+        self.rfile['apertures']['fit_skip_tol'] = 0.01
+        self.rfile['apertures']['fit_fwhm_fixed'] = True
+        ccd = star_field(21.3, 19.6, seed=2)
+        read, gain = ccd.copy(), ccd.copy()
+        read.set_const(3.)
+        gain.set_const(1.)
+        store = {'mfwhm': -1., 'mbeta': -1.}
+        ccdwin = {'1': '1', '2': '1', '3': '1'}
+        for nframe in range(3):
+            self.assertTrue(
+                moveApers('1', ccd, read, gain, ccdwin, self.rfile, store)
+            )
+            self.assertEqual(store['1']['fwhm'], 3.)
+            self.assertEqual(store['2']['fwhm'], 3.)
+        self.assertEqual((store['nfit'], store['nskip']), (2, 4))
+
+# decimal places of the columns of the ASCII log rounded by LogWriter
+DECIMALS = {
+    'mfwhm': 2, 'mbeta': 2, 'x': 4, 'xe': 4, 'y': 4, 'ye': 4, 'fwhm': 3,
+    'fwhme': 3, 'beta': 3, 'betae': 3, 'counts': 1, 'countse': 1, 'sky': 2,
+    'skye': 2
+}
+
+def ascii_atol(name):
+    """Returns the absolute tolerance needed to compare column 'name' of an
+    ASCII log with full precision values: half its last decimal place"""
+    item = name.split('_')[0]
+    return 0.5001*10.**(-DECIMALS[item]) if item in DECIMALS else 0.
+
+class TestLogWriter(unittest.TestCase):
+    """Tests the ASCII and binary logs written by LogWriter"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.rfile = Rfile(
+            general={'toffset': 0, 'logformat': 'both'}, monitor={}
+        )
+        self.rfile.filename = os.path.join(self.tmpdir.name, 'test.red')
+        with open(self.rfile.filename, 'w') as fout:
+            fout.write('[general]\ntoffset = 0\n')
+        self.rfile.aper = hcam.MccdAper(
+            [('1', hcam.CcdAper(
+                [('1', hcam.Aperture(20., 20., 4., 8., 12., True)),
+                 ('2', hcam.Aperture(40., 30., 4., 8., 12., False))]
+            ))]
+        )
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def results(self):
+        """Returns the results of 5 frames as written by LogWriter"""
+        rng = np.random.default_rng(1)
+        items = (
+            'x', 'xe', 'y', 'ye', 'fwhm', 'fwhme', 'beta', 'betae', 'counts',
+            'countse', 'sky', 'skye'
+        )
+        res = []
+        for nframe in range(1, 6):
+            reses = {}
+            for apnam in ('1', '2'):
+                reses[apnam] = {item: rng.uniform(1, 10) for item in items}
+                reses[apnam].update(nsky=100, nrej=nframe, cmax=1000, flag=0)
+            reses['2']['fwhme'] = -1.
+            res.append(
+                (
+                    nframe, {'mfwhm': 4.5, 'mbeta': -1.},
+                    self.rfile.aper['1'], reses, 59000, nframe/86400., True, 1.
+                )
+            )
+        return res
+
+    def test_binary(self):
+        res = self.results()
+        log = os.path.join(self.tmpdir.name, 'test.log')
+        with LogWriter(log, self.rfile, 'test', []) as logfile:
+            logfile.write_results([('1', res[:2])])
+            logfile.write_results([('1', res[2:])])
+
+        alog = Hlog.rascii(log)
+        blog = Hlog.rbinary(os.path.join(self.tmpdir.name, 'test.hlb'))
+        self.assertEqual(alog.cnames, blog.cnames)
+        self.assertEqual(alog.apnames, blog.apnames)
+        self.assertEqual(len(blog['1']), 5)
+        for name in alog['1'].dtype.names:
+            self.assertTrue(
+                np.allclose(
+                    alog['1'][name], blog['1'][name], rtol=1.e-6,
+                    atol=ascii_atol(name), equal_nan=True
+                ), name
+            )
+        self.assertTrue(np.isnan(blog['1']['mbeta']).all())
+        self.assertTrue(np.isnan(blog['1']['fwhme_2']).all())
+
+    def test_follow(self):
+        log = os.path.join(self.tmpdir.name, 'test.log')
+        res = self.results()
+        with LogWriter(log, self.rfile, 'test', []) as logfile:
+            afollow = Hlog.follow(log)
+            bfollow = Hlog.follow(os.path.join(self.tmpdir.name, 'test.hlb'))
+            for follower in (afollow, bfollow):
+                self.assertEqual(len(follower.poll()), 0)
+
+            logfile.write_results([('1', res[:2])])
+            for follower in (afollow, bfollow):
+                self.assertEqual(len(follower.poll()['1']), 2)
+
+            logfile.write_results([('1', res[2:])])
+            for follower in (afollow, bfollow):
+                self.assertEqual(len(follower.poll()['1']), 3)
+                self.assertEqual(len(follower.poll()), 0)
+
+        alog = Hlog.rascii(log)
+        for follower in (afollow, bfollow):
+            self.assertEqual(alog.cnames, follower.hlog.cnames)
+            self.assertTrue(
+                np.allclose(
+                    alog['1']['counts_2'], follower.hlog['1']['counts_2'],
+                    rtol=1.e-6, atol=ascii_atol('counts_2')
+                )
+            )
+
+if __name__ == '__main__':
+    unittest.main()
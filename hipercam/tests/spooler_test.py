@@ -0,0 +1,107 @@
+import unittest
+import os
+import tempfile
+
+import numpy as np
+
+from hipercam import spooler
+from hipercam.tests.hcam_test import make_run
+
+class Growing:
+    """Fake iterator over a growing file: returns None until frames are
+    added, then the frames, then stops when closed"""
+
+    def __init__(self):
+        self.frames = []
+        self.calls = 0
+        self.closed = False
+
+    def __next__(self):
+        self.calls += 1
+        if self.frames:
+            return self.frames.pop(0)
+        elif self.closed:
+            raise StopIteration
+        return None
+
+    def __exit__(self, *args):
+        pass
+
+class TestPrefetch(unittest.TestCase):
+    """Tests reading ahead on a separate thread"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.run = os.path.join(self.tmpdir.name, 'run0001')
+        self.nframe = 5
+        make_run(self.run + '.fits', self.nframe)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_disk_prefetch(self):
+        with spooler.data_source('hl', self.run, 2) as spool, \
+             spooler.data_source('hl', self.run, 2, prefetch=2) as pspool:
+            nf = 0
+            for mccd, pmccd in zip(spool, pspool):
+                nf += 1
+                self.assertEqual(mccd.head['NFRAME'], pmccd.head['NFRAME'])
+                self.assertTrue(
+                    np.array_equal(mccd['2']['E1'].data, pmccd['2']['E1'].data)
+                )
+            self.assertEqual(nf, self.nframe-1)
+            self.assertRaises(StopIteration, next, pspool)
+
+    def test_hang_about(self):
+        source = Growing()
+        with spooler._Prefetch(source, 3) as pref:
+            # the iterator's state is not exposed as it runs ahead
+            self.assertRaises(AttributeError, getattr, pref, 'frames')
+
+            # nothing there yet: no more reads until asked again
+            self.assertIsNone(next(pref))
+            self.assertEqual(source.calls, 1)
+
+            source.frames = [1, 2]
+            self.assertEqual(next(pref), 1)
+            self.assertEqual(next(pref), 2)
+            self.assertIsNone(next(pref))
+
+            source.closed = True
+            self.assertRaises(StopIteration, next, pref)
+
+def pairs(items):
+    group = []
+    for item in items:
+        group.append(item)
+        if len(group) == 2:
+            yield group
+            group = []
+    if len(group):
+        yield group
+
+def sums(groups):
+    for group in groups:
+        if min(group) < 0:
+            raise ValueError('negative value')
+        yield sum(group)
+
+class TestPipeline(unittest.TestCase):
+    """Tests the chaining of threaded processing stages"""
+
+    def test_pipeline(self):
+        with spooler.Pipeline(range(7), (pairs, sums), 1) as pipe:
+            self.assertEqual(list(pipe), [1, 5, 9, 6])
+
+    def test_errors(self):
+        with spooler.Pipeline([1, 2, -1, 4], (pairs, sums), 1) as pipe:
+            self.assertEqual(next(pipe), 3)
+            self.assertRaises(ValueError, next, pipe)
+
+    def test_close(self):
+        # stopping early with all the queues full
+        with spooler.Pipeline(range(1000), (pairs, pairs), 1) as pipe:
+            self.assertEqual(next(pipe), [[0, 1], [2, 3]])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+
+import numpy as np
+
+from hipercam.support import avgstd
+
+def clipped(vals, sigma, nlow, nhigh, median):
+    """Straightforward clipped mean of one pixel for comparison"""
+    ok = np.ones(len(vals), dtype=bool)
+    order = np.argsort(vals, kind='stable')
+    ok[order[:nlow]] = False
+    ok[order[len(vals)-nhigh:]] = False
+    num = ok.sum()
+    avg, std = vals[ok].mean(), vals[ok].std(ddof=1)
+    while num > 1:
+        centre = np.median(vals[ok]) if median else avg
+        ok &= np.abs(vals - centre) <= sigma*std
+        numt = ok.sum()
+        avg = vals[ok].mean()
+        std = vals[ok].std(ddof=1) if numt > 1 else 0.
+        if numt == num:
+            break
+        num = numt
+    return avg, std, num
+
+class TestAvgstd(unittest.TestCase):
+    """Tests the clipped mean combination of frames"""
+
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        self.cube = rng.normal(100., 10., (25, 6, 7))
+        self.cube[::5,3,4] += 1000.
+
+    def test_avgstd(self):
+        for dtype in (np.float32, np.float64, np.uint16):
+            cube = self.cube.astype(dtype)
+            for nlow, nhigh, median in ((0, 0, False), (0, 0, True), (2, 3, False)):
+                avg, std, num = avgstd(cube, 3., nlow, nhigh, median, 2)
+                self.assertEqual(
+                    avg.dtype, np.float64 if dtype == np.float64 else np.float32
+                )
+                for iy in range(cube.shape[1]):
+                    for ix in range(cube.shape[2]):
+                        ravg, rstd, rnum = clipped(
+                            cube[:,iy,ix].astype(np.float64), 3., nlow, nhigh,
+                            median
+                        )
+                        self.assertAlmostEqual(avg[iy,ix], ravg, delta=1.e-3)
+                        self.assertAlmostEqual(std[iy,ix], rstd, delta=1.e-3)
+                        self.assertEqual(num[iy,ix], rnum)
+        self.assertEqual(num[3,4], 20)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,165 @@
+import unittest
+import os
+import struct
+import tempfile
+import warnings
+from types import SimpleNamespace
+
+import numpy as np
+
+from hipercam import ucam
+
+def make_tbytes(nframe, frmat, t0, dt, seed=1):
+    """Returns a list of fake ULTRACAM timing bytes, one per frame, with a
+    break in the frame numbers half-way through."""
+
+    rng = np.random.default_rng(seed)
+    tbytes, fnum = [], 1
+    for n in range(nframe):
+        if n == nframe // 2:
+            fnum += 2
+        tbts = bytearray(32)
+        tbts[0] = 0xff if rng.random() < 0.5 else 0
+        tbts[4:8] = struct.pack('<I', fnum)
+        time = t0 + dt*n + rng.normal(0, 1.e-4)
+        nsec = int(time)
+        nnsec = int(1.e9*(time-nsec))
+        if frmat == 1:
+            tbts[9:17] = struct.pack('<II', nsec % 86400, nnsec)
+            tbts[17:21] = struct.pack('<BBH', 5, 3, 2004)
+            tbts[21:23] = struct.pack('<h', 5 if rng.random() < 0.8 else -1)
+        else:
+            tbts[8:12] = struct.pack('<I', 100)
+            tbts[12:20] = struct.pack('<II', nsec, nnsec // 100)
+            tbts[24:26] = struct.pack(
+                '<H', ucam.PCPS_SYNCD if rng.random() < 0.8 else 0
+            )
+        tbytes.append(bytes(tbts))
+        fnum += 1
+    return tbytes
+
+XML = """<?xml version="1.0"?>
+<data_status framesize="{framesize:d}">
+ <header_status headerwords="16"/>
+ <instrument_status>
+  <name>ULTRACAM</name>
+  <application_status id="SDSU Exec" name="ap3_fullframe"/>
+  <parameter_status name="X_BIN" value="8"/>
+  <parameter_status name="Y_BIN" value="8"/>
+  <parameter_status name="EXPOSE_TIME" value="100"/>
+  <parameter_status name="NO_EXPOSURES" value="-1"/>
+  <parameter_status name="GAIN_SPEED" value="3293"/>
+  <parameter_status name="V_FT_CLK" value="{v_ft_clk:d}"/>
+  <parameter_status name="NBLUE" value="3"/>
+  <parameter_status name="REVISION" value="140331"/>
+ </instrument_status>
+</data_status>
+"""
+
+def make_ucam_run(run, nframe):
+    """Writes a small, fake full-frame ULTRACAM run 'run' (.xml and .dat)
+    binned 8x8 and returns the timing bytes"""
+    framesize = 32 + 12*64*128
+    with open(run + '.xml', 'w') as fout:
+        fout.write(XML.format(framesize=framesize, v_ft_clk=140 << 16))
+
+    tbytes = make_tbytes(nframe, 2, 1.3e9, 0.11)
+    with open(run + '.dat', 'wb') as fout:
+        for tbts in tbytes:
+            fout.write(tbts)
+            fout.write(bytes(framesize-32))
+    return tbytes
+
+class TestIndex(unittest.TestCase):
+    """Tests the sidecar index of ULTRACAM runs"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.run = os.path.join(self.tmpdir.name, 'run001')
+        self.tbytes = make_ucam_run(self.run, 10)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_index(self):
+        self.assertIsNone(ucam.read_index(self.run))
+        ucam.make_index(self.run)
+        index = ucam.read_index(self.run)
+        self.assertEqual(index['nframe'], 10)
+        self.assertEqual(index['datsize'], 10*index['framesize'])
+
+        rhead = ucam.Rhead(self.run)
+        arr = np.array([np.frombuffer(tbts, np.uint8) for tbts in self.tbytes])
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            times = ucam.utimers(arr, rhead)
+        self.assertTrue(np.array_equal(index['mjds'], times[0]))
+        self.assertTrue(np.array_equal(index['bgoods'], times[6]))
+        self.assertTrue(np.array_equal(index['junk'], times[7]))
+
+        with ucam.Rdata(self.run) as rdat:
+            self.assertEqual(rdat.index['nframe'], 10)
+
+        # a frame read just after a seek gets its time from the index
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            with ucam.Rdata(self.run, 7) as rdat:
+                mccd = rdat()
+        self.assertEqual(mccd.head['NFRAME'], 7)
+        self.assertEqual(mccd.head['MJDUTC'], index['mjds'][6])
+
+        # a partial frame makes it out of date
+        with open(self.run + '.dat', 'ab') as fout:
+            fout.write(bytes(index['framesize']//2))
+        self.assertIsNone(ucam.read_index(self.run))
+
+class TestUtimers(unittest.TestCase):
+    """Checks the array version of utimer against utimer"""
+
+    def setUp(self):
+        win = SimpleNamespace
+        self.rhead = SimpleNamespace(
+            instrument='ULTRACAM', run='run001', timeUnits=0.001,
+            exposeTime=0.1, nblue=3, whichRun='', v_ft_clk=140,
+            gainSpeed='cdd', xbin=2, ybin=2, en_clr=False,
+            win=[win(llx=1,lly=1,nx=100,ny=100),
+                 win(llx=700,lly=1,nx=100,ny=100)],
+        )
+
+    def compare(self, tbytes):
+        arr = np.array([np.frombuffer(tbts, np.uint8) for tbts in tbytes])
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            times = ucam.utimers(arr, self.rhead)
+            ucam.utimer.__dict__.clear()
+            for nf, tbts in enumerate(tbytes):
+                time = ucam.utimer(tbts, self.rhead, nf+1)
+                self.assertEqual(times[0][nf], time[0].mjd)
+                self.assertEqual(times[1][nf], time[0].expose)
+                self.assertEqual(times[2][nf], time[0].good)
+                self.assertEqual(times[3]['gps'][nf], time[1]['gps'])
+                if self.rhead.instrument == 'ULTRACAM':
+                    self.assertAlmostEqual(times[4][nf], time[2].mjd, 12)
+                    self.assertAlmostEqual(times[5][nf], time[2].expose, 6)
+                    self.assertEqual(times[6][nf], time[2].good)
+                    self.assertEqual(times[7][nf], time[3])
+
+    def test_ultracam(self):
+        for frmat, version, t0 in ((1, 80127, 50000.), (2, 140331, 1.3e9)):
+            self.rhead.version = version
+            tbytes = make_tbytes(20, frmat, t0, 0.11)
+            for mode in ('FFCLR', '1-PCLR', 'FFNCLR', '1-PAIR', 'DRIFT'):
+                self.rhead.mode = mode
+                self.compare(tbytes)
+
+    def test_ultraspec(self):
+        self.rhead.instrument = 'ULTRASPEC'
+        self.rhead.version = 140331
+        for t0 in (1.3e9, 1.4e9):
+            tbytes = make_tbytes(20, 2, t0, 0.11)
+            for mode in ('USPEC', 'UDRIFT'):
+                self.rhead.mode = mode
+                self.compare(tbytes)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,7 +2,8 @@ import unittest
 import copy
 
 import numpy as np
-from hipercam import Winhead
+from astropy.convolution import Gaussian2DKernel, convolve_fft
+from hipercam import Wingeom, Winhead, Window, smooth_fft
 
 class TestWinhead(unittest.TestCase):
     """
@@ -118,5 +119,55 @@ class TestWinhead(unittest.TestCase):
         win = self.win.copy()
         self.assertFalse(self.win != win)
 
+class TestWinview(unittest.TestCase):
+    """Tests the header-free views of Windows"""
+
+    def setUp(self):
+        win = Winhead(3, 4, 40, 30, 2, 2, 'LL')
+        win['OBJECT'] = 'test'
+        self.wind = Window(win, np.arange(1200.).reshape(30,40))
+
+    def test_view_matches_window(self):
+        view = self.wind.view(20.5, 50.5, 30.5, 50.5)
+        wind = self.wind.window(20.5, 50.5, 30.5, 50.5)
+        self.assertTrue(view == wind)
+        self.assertTrue(np.all(view.data == wind.data))
+        self.assertEqual(view.mean(), wind.mean())
+        self.assertEqual(view.extent(), wind.extent())
+
+    def test_view_shares_data(self):
+        view = self.wind.view(None, None, 30.5, 50.5)
+        view.data[0,0] = -1.
+        self.assertEqual(self.wind.data[view.lly//2-2,0], -1.)
+
+    def test_geometry_slots(self):
+        view = self.wind.view(20.5, 50.5, 30.5, 50.5)
+        geom = Wingeom.window(self.wind, 20.5, 50.5, 30.5, 50.5)
+        self.assertTrue(geom == view)
+        self.assertFalse(hasattr(geom, '__dict__'))
+        self.assertFalse(hasattr(view, '__dict__'))
+
+class TestSmoothFFT(unittest.TestCase):
+    """Tests the cached FFT smoothing used by Window.search"""
+
+    def test_smooth_fft(self):
+        rng = np.random.default_rng(3)
+        data = rng.normal(100., 10., (2, 25, 31)).astype(np.float32)
+        sigma = 2.5/np.sqrt(8*np.log(2))
+        for n in range(2):
+            # twice to check the cached kernel
+            for img, back in zip(data, (100., 90.)):
+                cimg = convolve_fft(img, Gaussian2DKernel(sigma), 'fill', back)
+                self.assertTrue(
+                    np.allclose(smooth_fft(img, sigma, back), cimg, atol=1.e-8)
+                )
+
+        # several images at once
+        cimgs = smooth_fft(data, sigma, [100., 90.])
+        for img, back, cimg in zip(data, (100., 90.), cimgs):
+            self.assertTrue(
+                np.allclose(smooth_fft(img, sigma, back), cimg, atol=1.e-8)
+            )
+
 if __name__ == '__main__':
     unittest.main()
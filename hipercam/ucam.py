@@ -25,9 +25,10 @@ from hipercam import (
     gregorian_to_mjd,
     mjd_to_gregorian,
     fday_to_hms,
+    IDX,
 )
 
-__all__ = ["Rhead", "Rdata", "Rtime", "Rtbytes"]
+__all__ = ["Rhead", "Rdata", "Rtime", "Rtbytes", "make_index", "read_index"]
 
 # First come a set of constants to do with timing and various changes that
 # occurred to ULTRACAM over time.
@@ -695,6 +696,22 @@ class Utime:
         return ret
 
 
+def _index_time(index, prefix, nframe, utime):
+    """Returns the Utime of frame 'nframe' stored in an index (see
+    :func:`make_index`), taking the reason for a bad time from the
+    Utime 'utime' returned by :func:`utimer` for the same frame.
+    prefix is "" for the standard times, "b" for the blue times.
+    """
+    good = bool(index[prefix + "goods"][nframe - 1])
+    reason = "" if good else (utime.reason or "unreliable time in index")
+    return Utime(
+        float(index[prefix + "mjds"][nframe - 1]),
+        float(index[prefix + "exposes"][nframe - 1]),
+        good,
+        reason,
+    )
+
+
 class Rdata(Rhead):
     """Callable, iterable object to represent ULTRACAM/SPEC raw data files.
 
@@ -759,6 +776,7 @@ class Rdata(Rhead):
         self.nframe = nframe
         self._ccd = ccd
         self._tstamp = []
+        self.index = read_index(run, self)
 
         if not self.server:
             # If it's not via a server, then we must access a local disk
@@ -801,7 +819,7 @@ class Rdata(Rhead):
         if nframe == 0:
             # work out last frame
             if self.server:
-                self.nframe = get_nframe_from_server(self.run)
+                self.nframe = self.ntotal()
             else:
                 # wind to end of file, work out where we are
                 # to deduce number of frames
@@ -826,7 +844,11 @@ class Rdata(Rhead):
         Returns the total number of frames in data file
         """
         if self.server:
-            ntot = get_nframe_from_server(self.run)
+            if self.index is not None:
+                # a complete run was indexed; no need to ask the server
+                ntot = self.index["nframe"]
+            else:
+                ntot = get_nframe_from_server(self.run)
         else:
             self.fp.seek(0, 2)
             ntot = self.fp.tell() // self.framesize
@@ -986,6 +1008,15 @@ class Rdata(Rhead):
         elif self.instrument == "ULTRASPEC":
             time, info = utimer(tbytes, self, self.nframe)
 
+        if self.index is not None and self.nframe <= self.index["nframe"]:
+            # the index was made with the full timestamp history of the run,
+            # which utimer lacks for the first frames after a seek, so its
+            # times and junk blue frame flags take precedence.
+            time = _index_time(self.index, "", self.nframe, time)
+            if self.instrument == "ULTRACAM":
+                blueTime = _index_time(self.index, "b", self.nframe, blueTime)
+                badBlue = bool(self.index["junk"][self.nframe - 1])
+
         # add some specifics for the frame to the header
         self.header["RUN"] = (self.run, "run number")
         self.header["NFRAME"] = (self.nframe, "frame number within run")
@@ -1624,6 +1655,34 @@ class Rtbytes(Rhead):
 
         return tbytes
 
+    def read_block(self, first, n):
+        """Returns the timing bytes of up to n consecutive frames starting from
+        frame number first (starts from 1) as an (nframe,ntbytes) array of
+        unsigned bytes ready for :func:`utimers`. Fewer than n frames are
+        returned if the end of the file is reached. The file pointer is not
+        moved. Only available for local files.
+
+        Arguments::
+
+          first -- first frame number to get, starting at 1.
+
+          n -- maximum number of frames to get.
+        """
+        if self.server:
+            raise UltracamError("read_block is not available for server access")
+
+        nframes = os.fstat(self.fp.fileno()).st_size // self.framesize
+        n = min(n, nframes - first + 1)
+        if first < 1 or n < 1:
+            raise UendError("failed to read timing bytes")
+
+        # map the frames, only the timing bytes at the start of each frame
+        # are then read.
+        raw = np.memmap(
+            self.fp, np.uint8, "r", self.framesize * (first - 1), (n, self.framesize)
+        )
+        return np.array(raw[:, : self.ntbytes])
+
 
 class Rtime(Rtbytes):
     """
@@ -1649,6 +1708,136 @@ class Rtime(Rtbytes):
         return tinfo
 
 
+def _tformat(rhead):
+    """Returns the integer code of the format of the timing bytes of a run"""
+    if rhead.instrument == "ULTRASPEC" and rhead.version == -1:
+        return 2
+    elif rhead.version == -1 or rhead.version == 70514 or rhead.version == 80127:
+        return 1
+    elif (
+        rhead.version == 100222
+        or rhead.version == 110921
+        or rhead.version == 111205
+        or rhead.version == 120716
+        or rhead.version == 120813
+        or rhead.version == 130303
+        or rhead.version == 130317
+        or rhead.version == 130417
+        or rhead.version == 140331
+    ):
+        return 2
+    else:
+        raise UltracamError("version = " + str(rhead.version) + " unrecognised.")
+
+
+def _readout_time(rhead, VCLOCK_STORAGE, VIDEO):
+    """Returns the time taken to read out the CCD (seconds) for the ULTRACAM
+    modes with frame-transfer readouts other than drift mode. VCLOCK_STORAGE
+    can be an array to compute several times at once"""
+
+    if rhead.mode == "FFCLR" or rhead.mode == "FFNCLR":
+        readoutTime = (
+            (1024 / rhead.ybin)
+            * (
+                VCLOCK_STORAGE * rhead.ybin
+                + 536 * HCLOCK
+                + (512 / rhead.xbin + 2) * VIDEO
+            )
+            / 1.0e6
+        )
+    elif rhead.mode == "FFOVER" or rhead.mode == "FFOVNC":
+        readoutTime = (
+            (1032 / rhead.ybin)
+            * (
+                VCLOCK_STORAGE * rhead.ybin
+                + 540 * HCLOCK
+                + (540 / rhead.xbin + 2) * VIDEO
+            )
+            / 1.0e6
+        )
+    elif rhead.mode == "1-PCLR":
+        nxb = rhead.win[1].nx
+        nxu = rhead.xbin * nxb
+        nyb = rhead.win[1].ny
+        xleft = rhead.win[0].llx
+        xright = rhead.win[1].llx + nxu - 1
+        diff_shift = abs(xleft - 1 - (1024 - xright))
+        num_hclocks = (
+            nxu + diff_shift + (1024 - xright) + 8
+            if (xleft - 1 > 1024 - xright)
+            else nxu + diff_shift + (xleft - 1) + 8
+        )
+        readoutTime = (
+            nyb
+            * (
+                VCLOCK_STORAGE * rhead.ybin
+                + num_hclocks * HCLOCK
+                + (nxb + 2) * VIDEO
+            )
+            / 1.0e6
+        )
+    else:
+
+        readoutTime = 0.0
+        xbin = rhead.xbin
+        ybin = rhead.ybin
+        ystart_old = -1
+        for wl, wr in zip(rhead.win[::2], rhead.win[1::2]):
+
+            nxu = xbin * wl.nx
+            nyu = ybin * wl.ny
+
+            ystart = wl.lly
+            xleft = wl.llx
+            xright = wr.llx + nxu - 1
+
+            if ystart_old > -1:
+                ystart_m = ystart_old
+                nyu_m = nyu_old
+                y_shift = (ystart - ystart_m - nyu_m) * VCLOCK_STORAGE
+            else:
+                ystart_m = 1
+                nyu_m = 0
+                y_shift = (ystart - 1) * VCLOCK_STORAGE
+
+            # store for next time
+            ystart_old = ystart
+            nyu_old = nyu
+
+            # Number of columns to shift whichever window is further from
+            # the edge of the readout to get ready for simultaneous
+            # readout.
+            diff_shift = abs(xleft - 1 - (1024 - xright))
+
+            # Time taken to dump any pixels in a row that come after the
+            # ones we want.  The '8' is the number of HCLOCKs needed to
+            # open the serial register dump gates If the left window is
+            # further from the left edge than the right window is from the
+            # right edge, then the diffshift will move it to be the same
+            # as the right window, and so we use the right window
+            # parameters to determine the number of hclocks needed, and
+            # vice versa.
+            num_hclocks = (
+                nxu + diff_shift + (1024 - xright) + 8
+                if (xleft - 1 > 1024 - xright)
+                else nxu + diff_shift + (xleft - 1) + 8
+            )
+
+            # Time taken to read one line. The extra 2 is required to fill
+            # the video pipeline buffer
+            line_read = (
+                VCLOCK_STORAGE * ybin
+                + num_hclocks * HCLOCK
+                + (nxu / xbin + 2) * VIDEO
+            )
+
+            readoutTime += y_shift + (nyu / ybin) * line_read
+
+        readoutTime /= 1.0e6
+
+    return readoutTime
+
+
 def utimer(tbytes, rhead, fnum):
     """Computes the MJD corresponding of the most recently read frame,
     None if no frame has been read. For the Time to be reliable
@@ -1725,24 +1914,7 @@ def utimer(tbytes, rhead, fnum):
     goodTime = True
     reason = ""
 
-    if rhead.instrument == "ULTRASPEC" and rhead.version == -1:
-        frmat = 2
-    elif rhead.version == -1 or rhead.version == 70514 or rhead.version == 80127:
-        frmat = 1
-    elif (
-        rhead.version == 100222
-        or rhead.version == 110921
-        or rhead.version == 111205
-        or rhead.version == 120716
-        or rhead.version == 120813
-        or rhead.version == 130303
-        or rhead.version == 130317
-        or rhead.version == 130417
-        or rhead.version == 140331
-    ):
-        frmat = 2
-    else:
-        raise UltracamError("version = " + str(rhead.version) + " unrecognised.")
+    frmat = _tformat(rhead)
 
     frameNumber = struct.unpack("<I", tbytes[4:8])[0]
     if frameNumber != fnum:
@@ -1974,47 +2146,7 @@ def utimer(tbytes, rhead, fnum):
             clearTime = (1033.0 + 1027) * vclock_frame
 
             # Time taken to read CCD (assuming cdd mode)
-            if rhead.mode == "FFCLR":
-                readoutTime = (
-                    (1024 / rhead.ybin)
-                    * (
-                        VCLOCK_STORAGE * rhead.ybin
-                        + 536 * HCLOCK
-                        + (512 / rhead.xbin + 2) * VIDEO
-                    )
-                    / 1.0e6
-                )
-            elif rhead.mode == "FFOVER":
-                readoutTime = (
-                    (1032 / rhead.ybin)
-                    * (
-                        VCLOCK_STORAGE * rhead.ybin
-                        + 540 * HCLOCK
-                        + (540 / rhead.xbin + 2) * VIDEO
-                    )
-                    / 1.0e6
-                )
-            else:
-                nxb = rhead.win[1].nx
-                nxu = rhead.xbin * nxb
-                nyb = rhead.win[1].ny
-                xleft = rhead.win[0].llx
-                xright = rhead.win[1].llx + nxu - 1
-                diff_shift = abs(xleft - 1 - (1024 - xright))
-                num_hclocks = (
-                    nxu + diff_shift + (1024 - xright) + 8
-                    if (xleft - 1 > 1024 - xright)
-                    else nxu + diff_shift + (xleft - 1) + 8
-                )
-                readoutTime = (
-                    nyb
-                    * (
-                        VCLOCK_STORAGE * rhead.ybin
-                        + num_hclocks * HCLOCK
-                        + (nxb + 2) * VIDEO
-                    )
-                    / 1.0e6
-                )
+            readoutTime = _readout_time(rhead, VCLOCK_STORAGE, VIDEO)
 
             # Frame transfer time
             frameTransfer = 1033.0 * vclock_frame
@@ -2057,84 +2189,7 @@ def utimer(tbytes, rhead, fnum):
         # Time taken to move 1033 rows.
         frameTransfer = 1033.0 * vclock_frame
 
-        if rhead.mode == "FFNCLR":
-            readoutTime = (
-                (1024 / rhead.ybin)
-                * (
-                    VCLOCK_STORAGE * rhead.ybin
-                    + 536 * HCLOCK
-                    + (512 / rhead.xbin + 2) * VIDEO
-                )
-                / 1.0e6
-            )
-        elif rhead.mode == "FFOVNC":
-            readoutTime = (
-                (1032 / rhead.ybin)
-                * (
-                    VCLOCK_STORAGE * rhead.ybin
-                    + 540 * HCLOCK
-                    + (540 / rhead.xbin + 2) * VIDEO
-                )
-                / 1.0e6
-            )
-        else:
-
-            readoutTime = 0.0
-            xbin = rhead.xbin
-            ybin = rhead.ybin
-            ystart_old = -1
-            for wl, wr in zip(rhead.win[::2], rhead.win[1::2]):
-
-                nxu = xbin * wl.nx
-                nyu = ybin * wl.ny
-
-                ystart = wl.lly
-                xleft = wl.llx
-                xright = wr.llx + nxu - 1
-
-                if ystart_old > -1:
-                    ystart_m = ystart_old
-                    nyu_m = nyu_old
-                    y_shift = (ystart - ystart_m - nyu_m) * VCLOCK_STORAGE
-                else:
-                    ystart_m = 1
-                    nyu_m = 0
-                    y_shift = (ystart - 1) * VCLOCK_STORAGE
-
-                # store for next time
-                ystart_old = ystart
-                nyu_old = nyu
-
-                # Number of columns to shift whichever window is further from
-                # the edge of the readout to get ready for simultaneous
-                # readout.
-                diff_shift = abs(xleft - 1 - (1024 - xright))
-
-                # Time taken to dump any pixels in a row that come after the
-                # ones we want.  The '8' is the number of HCLOCKs needed to
-                # open the serial register dump gates If the left window is
-                # further from the left edge than the right window is from the
-                # right edge, then the diffshift will move it to be the same
-                # as the right window, and so we use the right window
-                # parameters to determine the number of hclocks needed, and
-                # vice versa.
-                num_hclocks = (
-                    nxu + diff_shift + (1024 - xright) + 8
-                    if (xleft - 1 > 1024 - xright)
-                    else nxu + diff_shift + (xleft - 1) + 8
-                )
-
-                # Time taken to read one line. The extra 2 is required to fill
-                # the video pipeline buffer
-                line_read = (
-                    VCLOCK_STORAGE * ybin
-                    + num_hclocks * HCLOCK
-                    + (nxu / xbin + 2) * VIDEO
-                )
-
-                readoutTime += y_shift + (nyu / ybin) * line_read
-
-            readoutTime /= 1.0e6
+        readoutTime = _readout_time(rhead, VCLOCK_STORAGE, VIDEO)
 
         if defTstamp:
             if frameNumber == 1:
@@ -2524,6 +2579,506 @@ def utimer(tbytes, rhead, fnum):
             "did not recognize instrument = {:s}".format(rhead.instrument)
         )
 
+def _tfield(tbytes, start, dtype):
+    """Extracts one field starting at byte 'start' from each row of a 2D array
+    of timing bytes, returning a 1D array of type 'dtype'"""
+    dtype = np.dtype(dtype)
+    field = np.ascontiguousarray(tbytes[:, start : start + dtype.itemsize])
+    return field.view(dtype)[:, 0]
+
+
+def _dates_to_mjd(year, month, day):
+    """Array version of gregorian_to_mjd. Returns the MJDs and a bool array
+    that is False for invalid dates"""
+    year = np.asarray(year, dtype=np.int64)
+    month = np.asarray(month, dtype=np.int64)
+    day = np.asarray(day, dtype=np.int64)
+    mlength = np.array([31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    ok = (year >= 1582) & (month >= 1) & (month <= 12) & (day >= 1)
+    ok &= day <= mlength[np.clip(month, 1, 12) - 1] - ((month == 2) & ~leap)
+
+    early = month < 3
+    month = np.where(early, month + 12, month)
+    year = np.where(early, year - 1, year)
+    A = year // 100
+    B = 2 - A + A // 4
+    C = np.floor(365.25 * year).astype(np.int64)
+    D = np.floor(30.6001 * (month + 1)).astype(np.int64)
+    return (B + C + D - 679006 + day, ok)
+
+
+def utimers(tbytes, rhead, fnum=1):
+    """Array version of :func:`utimer` to compute the times of many frames at
+    once. This is much faster than calling :func:`utimer` frame by frame when
+    scanning through the timing data of whole runs.
+
+     tbytes : 2D numpy.ndarray
+        (nframe,ntbytes) array of unsigned bytes, each row containing the
+        timing bytes of one frame, as returned by :meth:`Rtbytes.read_block`
+        for instance.
+
+     rhead : Rhead
+        header of data file
+
+     fnum : int
+        frame number we think the first row corresponds to. The frames are
+        expected to be consecutive. Used to test the timing bytes.
+
+    Returns (mjds,exposes,goods,info,bmjds,bexposes,bgoods,badBlue) for
+    ULTRACAM or (mjds,exposes,goods,info) for ULTRASPEC. Apart from 'info',
+    these are 1D arrays, one element per frame, equivalent to the
+    attributes mjd, expose and good of the Utime objects and the badBlue
+    flags returned by :func:`utimer`, with the blue frame equivalents prefixed
+    by 'b'. 'info' is a dictionary with the same keys as that of
+    :func:`utimer` but for "whichRun", "format" and "ntmin", the values are
+    arrays.
+
+    The times only depend upon the frames in 'tbytes': the timestamps of any
+    frames preceding the first one are not known, just as if :func:`utimer`
+    had been called for the first time on the first frame. As with
+    :func:`utimer`, the sequence is also restarted at any break in the frame
+    numbers. Invalid dates in old format timing bytes which would cause
+    :func:`utimer` to fail are assigned times based on 2000-01-01 and
+    flagged as bad.
+    """
+
+    # This follows utimer step by step, the main difference being that the
+    # list of preceding timestamps is replaced by an array of the number of
+    # stored timestamps for each frame.
+    tbytes = np.atleast_2d(tbytes)
+    nframe = len(tbytes)
+    frmat = _tformat(rhead)
+
+    fnums = fnum + np.arange(nframe)
+    frameNumber = _tfield(tbytes, 4, "<u4").astype(np.int64)
+    frameError = frameNumber != fnums
+    if frameError.any():
+        warnings.warn(
+            "ultracam.utimers: run {:s} has {:d} unexpected frame numbers".format(
+                rhead.run, frameError.sum()
+            )
+        )
+
+    # the list of stored times restarts on any break in the frame numbers;
+    # 'nhist' is the number there would be with no limit on it.
+    index = np.arange(nframe)
+    restart = np.ones(nframe, dtype=bool)
+    restart[1:] = frameNumber[1:] != frameNumber[:-1] + 1
+    nhist = index - np.maximum.accumulate(np.where(restart, index, 0)) + 1
+
+    goodTime = np.ones(nframe, dtype=bool)
+
+    if frmat == 1:
+        nsec = _tfield(tbytes, 9, "<u4").astype(np.int64)
+        nnsec = _tfield(tbytes, 13, "<u4").astype(np.int64)
+        nsat = _tfield(tbytes, 21, "<i2")
+        goodTime &= nsat > 2
+        IMAX = struct.unpack("<I", b"\xff\xff\xff\xff")[0]
+        nsec[nsec == IMAX] = 0
+        nnsec[nnsec == IMAX] = 0
+
+    elif frmat == 2:
+        nexp = _tfield(tbytes, 8, "<u4").astype(np.int64)
+        goodTime &= nexp * rhead.timeUnits == rhead.exposeTime
+        nsec = _tfield(tbytes, 12, "<u4").astype(np.int64)
+        nnsec = 100 * _tfield(tbytes, 16, "<u4").astype(np.int64)
+        nsat = None
+        tstamp = _tfield(tbytes, 24, "<u2")
+        goodTime &= (tstamp & PCPS_ANT_FAIL) == 0
+        goodTime &= (tstamp & PCPS_INVT) == 0
+        goodTime &= (tstamp & PCPS_SYNCD) != 0
+        goodTime &= (tstamp & PCPS_FREER) == 0
+
+    def tcon1(offset, nsec, nnsec):
+        """
+        Convert to MJD
+        """
+        return offset + (nsec + nnsec / 1.0e9) / DSEC
+
+    def vclock(new):
+        """
+        Vertical clocking time, 'new' for after TSTAMP_CHANGE1
+        """
+        if rhead.v_ft_clk > 127:
+            return np.where(
+                new,
+                6.0e-9 * (40 + 320 * (rhead.v_ft_clk - 128)),
+                6.0e-9 * (80 + 160 * (rhead.v_ft_clk - 128)),
+            )
+        else:
+            return np.where(
+                new,
+                6.0e-9 * (40 + 40 * rhead.v_ft_clk),
+                6.0e-9 * (80 + 20 * rhead.v_ft_clk),
+            )
+
+    if rhead.instrument == "ULTRACAM":
+        fbyte = tbytes[:, 0]
+        if rhead.nblue > 1:
+            badBlue = (fbyte & (1 << 3 if frmat == 1 else 1 << 4)) != 0
+        else:
+            badBlue = np.zeros(nframe, dtype=bool)
+
+    if frmat == 1:
+        nosat = nsat == -1
+        goodTime &= ~nosat
+    else:
+        nosat = np.zeros(nframe, dtype=bool)
+
+    mjd = np.empty(nframe)
+    mjd[nosat] = tcon1(DEFDAT, nsec[nosat], nnsec[nosat])
+    if rhead.instrument == "ULTRACAM":
+        vclock_frame = vclock(True)
+        vclock_frame = np.full(nframe, vclock_frame)
+    sat = ~nosat
+
+    if rhead.whichRun == "MAY2002" and frmat == 1:
+        # Had no date info in the timestamps of this run
+        mjd[sat] = tcon1(MAY2002, nsec[sat], nnsec[sat])
+        mjd[sat & (mjd < MAY2002 + 4)] += 7
+
+    else:
+        if frmat == 1:
+            day = tbytes[:, 17].astype(np.int64)
+            month = tbytes[:, 18].astype(np.int64)
+            year = _tfield(tbytes, 19, "<u2").astype(np.int64)
+            year[(month == 9) & (year == 263)] = 2002
+
+            early = sat & (year < 2002)
+            mjd[early] = tcon1(SEP2002, nsec[early], nnsec[early])
+
+            dates, valid = _dates_to_mjd(year, month, day)
+            sep = sat & ~early & (month == 9) & (year == 2002)
+            tdiff = dates[sep] - SEP2002
+            nweek = tdiff // 7
+            days = tdiff - 7 * nweek
+            nweek[(days > 3) & (nsec[sep] < 2 * DSEC)] += 1
+            nweek[(days <= 3) & (nsec[sep] > 5 * DSEC)] -= 1
+            mjd[sep] = tcon1(SEP2002 + 7 * nweek, nsec[sep], nnsec[sep])
+
+            rest = sat & ~early & ~sep
+            bad = rest & ~valid
+            mjd[bad] = tcon1(DEFDAT, nsec[bad], nnsec[bad])
+            goodTime &= ~bad
+            rest &= valid
+            mjd[rest] = dates[rest] + (nsec[rest] % DSEC + nnsec[rest] / 1.0e9) / DSEC
+
+        elif frmat == 2:
+            mjd[sat] = tcon1(UNIX, nsec[sat], nnsec[sat])
+
+        if rhead.instrument == "ULTRACAM":
+            vclock_frame[sat] = vclock(mjd[sat] > TSTAMP_CHANGE1)
+
+    # 'midnight bug' correction
+    def midnight(mjd, nsec):
+        return (np.trunc(mjd - 3).astype(np.int64) % 7) == ((nsec // DSEC) % 7)
+
+    if rhead.whichRun == "MAY2002" and frmat == 1:
+        # The 10 second error correction depends upon the final time of the
+        # previous frame so this one has to be done frame by frame.
+        midnightCorr = np.zeros(nframe, dtype=bool)
+        for n in range(nframe):
+            if sat[n] and nhist[n] > 1 and mjd[n] < mjd[n - 1]:
+                mjd[n] += 10.0 / DSEC
+            if sat[n] and rhead.instrument == "ULTRACAM":
+                vclock_frame[n] = 10.0e-6 if mjd[n] < MAY2002 + 5.5 else 24.46e-6
+            midnightCorr[n] = midnight(mjd[n], nsec[n])
+            if midnightCorr[n]:
+                mjd[n] += 1
+    else:
+        midnightCorr = midnight(mjd, nsec)
+        mjd[midnightCorr] += 1
+
+    if midnightCorr.any():
+        warnings.warn(
+            "ultracam.utimers: run {:s}  midnight bug detected and corrected in {:d} frames".format(
+                rhead.run, midnightCorr.sum()
+            )
+        )
+
+    # save this as the raw GPS time.
+    gps = mjd.copy()
+
+    defTstamp = (mjd < TSTAMP_CHANGE1) | ((mjd > TSTAMP_CHANGE2) & (mjd < TSTAMP_CHANGE3))
+
+    def tstamps(ntmin):
+        """Returns the number of stored times for each frame and a function
+        to get the times stored at a given position, matching utimer.tstamp"""
+        nstore = np.minimum(nhist, ntmin)
+
+        def T(k):
+            return mjd[np.maximum(index - k, 0)]
+
+        return (nstore, T)
+
+    if rhead.instrument == "ULTRACAM":
+        VCLOCK_STORAGE = vclock_frame
+        if rhead.gainSpeed == "cdd":
+            cds_time = CDS_TIME_CDD
+        elif rhead.gainSpeed == "fbb":
+            cds_time = CDS_TIME_FBB
+        elif rhead.gainSpeed == "fdd":
+            cds_time = CDS_TIME_FDD
+        else:
+            raise UltracamError(
+                "did not recognize gain speed setting = {:s}".format(rhead.gainSpeed)
+            )
+        VIDEO = SWITCH_TIME + cds_time
+
+    elif rhead.instrument == "ULTRASPEC":
+        USPEC_FT_TIME = np.where(mjd < USPEC_CHANGE, 0.0067196, 0.0149818)
+
+    else:
+        raise UltracamError(
+            "did not recognize instrument = {:s}".format(rhead.instrument)
+        )
+
+    exposeTime = rhead.exposeTime
+    first = frameNumber == 1
+
+    if rhead.instrument == "ULTRACAM" and (
+        rhead.mode == "FFCLR" or rhead.mode == "FFOVER" or rhead.mode == "1-PCLR"
+    ):
+        ntmin = 2
+        nstore, T = tstamps(ntmin)
+
+        clearTime = (1033.0 + 1027) * vclock_frame
+        readoutTime = _readout_time(rhead, VCLOCK_STORAGE, VIDEO)
+        frameTransfer = 1033.0 * vclock_frame
+
+        one = ~defTstamp & (nstore == 1)
+        mjdCentre = np.select(
+            [defTstamp, one],
+            [
+                T(0) + exposeTime / DSEC / 2.0,
+                T(0) - (frameTransfer + readoutTime + exposeTime / 2.0) / DSEC,
+            ],
+            T(1) + (clearTime + exposeTime / 2.0) / DSEC,
+        )
+        exposure = np.full(nframe, exposeTime)
+        goodTime &= ~one
+
+    elif rhead.instrument == "ULTRACAM" and (
+        rhead.mode == "FFNCLR"
+        or rhead.mode == "1-PAIR"
+        or rhead.mode == "FFOVNC"
+        or rhead.mode == "2-PAIR"
+        or rhead.mode == "3-PAIR"
+    ):
+        ntmin = 3
+        nstore, T = tstamps(ntmin)
+
+        frameTransfer = 1033.0 * vclock_frame
+        readoutTime = _readout_time(rhead, VCLOCK_STORAGE, VIDEO)
+
+        texp01 = DSEC * (T(0) - T(1)) - frameTransfer
+        texp12 = DSEC * (T(1) - T(2)) - frameTransfer
+        texpr = readoutTime + exposeTime
+
+        ndef = ~defTstamp & ~first
+        conds = [
+            defTstamp & first,
+            defTstamp & (nstore > 1),
+            defTstamp,
+            ~defTstamp & first,
+            ndef & (nstore > 2),
+            ndef & (nstore == 2),
+        ]
+        mjdCentre = np.select(
+            conds,
+            [
+                T(0) - (frameTransfer + exposeTime / 2.0) / DSEC,
+                T(1) + texp01 / 2.0 / DSEC,
+                T(0) - (frameTransfer + texpr / 2.0) / DSEC,
+                T(0) - (frameTransfer + readoutTime + exposeTime / 2.0) / DSEC,
+                T(1) + (exposeTime - texp12 / 2.0) / DSEC,
+                T(1) + (exposeTime - texp01 / 2.0) / DSEC,
+            ],
+            T(0) + (exposeTime - texpr - frameTransfer - texpr / 2.0) / DSEC,
+        )
+        exposure = np.select(
+            conds, [exposeTime, texp01, texpr, exposeTime, texp12, texp01], texpr
+        )
+        goodTime &= np.select(
+            conds, [True, True, False, False, True, False], False
+        )
+
+    elif rhead.instrument == "ULTRACAM" and rhead.mode == "DRIFT":
+
+        wl = rhead.win[0]
+        xbin = rhead.xbin
+        ybin = rhead.ybin
+        nxu = xbin * wl.nx
+        nyu = ybin * wl.ny
+        ystart = wl.lly
+        xleft = wl.llx
+        wr = rhead.win[1]
+        xright = wr.llx + nxu - 1
+
+        # see utimer for details of all these
+        nwins = int((1033.0 / nyu + 1.0) / 2.0)
+        pipe_shift = int(1033.0 - (((2.0 * nwins) - 1.0) * nyu))
+        frameTransfer = (nyu + ystart - 1) * vclock_frame
+        diff_shift = abs(xleft - 1 - (1024 - xright))
+        num_hclocks = (
+            nxu + diff_shift + (1024 - xright) + 8
+            if (xleft - 1 > 1024 - xright)
+            else nxu + diff_shift + (xleft - 1) + 8
+        )
+        line_read = (
+            VCLOCK_STORAGE * ybin + num_hclocks * HCLOCK + (nxu / xbin + 2) * VIDEO
+        )
+        readoutTime = ((nyu / ybin) * line_read + pipe_shift * VCLOCK_STORAGE) / 1.0e6
+
+        ntmin = nwins + 2
+        nstore, T = tstamps(ntmin)
+
+        texp0 = DSEC * (T(nwins - 1) - T(nwins)) - frameTransfer
+        texp1 = DSEC * (T(nwins) - T(nwins + 1)) - frameTransfer
+        conds = [
+            defTstamp & (nstore > nwins),
+            defTstamp,
+            nstore > nwins + 1,
+            nstore == nwins + 1,
+        ]
+        mjdCentre = np.select(
+            conds,
+            [
+                T(nwins) + texp0 / 2.0 / DSEC,
+                DEFDAT,
+                T(nwins) + (exposeTime - texp1 / 2.0) / DSEC,
+                T(nwins) + (exposeTime - texp0 / 2.0) / DSEC,
+            ],
+            DEFDAT,
+        )
+        exposure = np.select(conds, [texp0, exposeTime, texp1, texp0], exposeTime)
+        goodTime &= np.select(conds, [True, False, True, False], False)
+
+    elif rhead.instrument == "ULTRASPEC" and rhead.mode.startswith("USPEC"):
+
+        ntmin = 3
+        nstore, T = tstamps(ntmin)
+
+        texp01 = DSEC * (T(0) - T(1)) - USPEC_FT_TIME
+        texp12 = DSEC * (T(1) - T(2)) - USPEC_FT_TIME
+        clear = rhead.en_clr or first
+
+        early = T(0) < USPEC_CHANGE
+        late = ~early
+        conds = [
+            early & clear,
+            early & (nstore > 1),
+            early,
+            late & clear & (nstore == 1),
+            late & clear,
+            late & (nstore > 2),
+            late & (nstore == 2),
+        ]
+        mjdCentre = np.select(
+            conds,
+            [
+                T(0) - exposeTime / 2.0 / DSEC,
+                T(0) - texp01 / 2.0 / DSEC,
+                T(0) - exposeTime / 2.0 / DSEC,
+                T(0) - (-USPEC_FT_TIME - exposeTime / 2.0) / DSEC,
+                T(1) + (USPEC_CLR_TIME + exposeTime / 2.0) / DSEC,
+                T(1) + (exposeTime - texp12 / 2.0) / DSEC,
+                T(1) + (exposeTime - texp01 / 2.0) / DSEC,
+            ],
+            T(0) - (exposeTime / 2.0 + exposeTime) / DSEC,
+        )
+        exposure = np.select(
+            conds,
+            [exposeTime, texp01, exposeTime, exposeTime, exposeTime, texp12, texp01],
+            exposeTime,
+        )
+        goodTime &= np.select(
+            conds, [False, False, False, False, True, True, False], False
+        )
+
+    elif rhead.instrument == "ULTRASPEC" and rhead.mode == "UDRIFT":
+
+        ybin = rhead.ybin
+        nyu = ybin * rhead.win[0].ny
+        ystart = rhead.win[0].lly
+        nwins = int(((1037.0 / nyu) + 1.0) / 2.0)
+        frameTransfer = USPEC_FT_ROW * (ystart + nyu - 1.0) + USPEC_FT_OFF
+
+        ntmin = nwins + 2
+        nstore, T = tstamps(ntmin)
+
+        texp0 = DSEC * (T(nwins - 1) - T(nwins)) - frameTransfer
+        texp1 = DSEC * (T(nwins) - T(nwins + 1)) - frameTransfer
+        conds = [nstore > nwins + 1, nstore == nwins + 1]
+        mjdCentre = np.select(
+            conds,
+            [
+                T(nwins) + (exposeTime - texp1 / 2.0) / DSEC,
+                T(nwins) + (exposeTime - texp0 / 2.0) / DSEC,
+            ],
+            DEFDAT,
+        )
+        exposure = np.select(conds, [texp1, texp0], exposeTime)
+        goodTime &= np.select(conds, [True, False], False)
+
+    else:
+        raise UltracamError(
+            "did not recognize mode = {:s} of {:s}".format(rhead.mode, rhead.instrument)
+        )
+
+    # no times before 2000-01-01
+    early = mjdCentre < 51544.0
+    mjdCentre[early] = 51544.0
+    goodTime &= ~early
+
+    info = {
+        "nsat": nsat,
+        "format": frmat,
+        "whichRun": rhead.whichRun,
+        "defTstamp": defTstamp,
+        "gps": gps,
+        "frameError": frameError,
+        "midnightCorr": midnightCorr,
+        "ntmin": ntmin,
+        "fnum": fnums,
+    }
+
+    if rhead.instrument == "ULTRASPEC":
+        return (mjdCentre, exposure, goodTime, info)
+
+    info["vclock_frame"] = vclock_frame
+    if rhead.nblue > 1:
+        # blue times averaged over the contributing frames; see utimer
+        ncont = np.minimum(rhead.nblue, nhist)
+        fcont = index - ncont + 1
+        start = mjdCentre[fcont] - exposure[fcont] / 2.0 / DSEC
+        end = mjdCentre + exposure / 2.0 / DSEC
+        bexpose = DSEC * (end - start)
+
+        ok = ncont == rhead.nblue
+        bexpose = np.where(ok, bexpose, bexpose * (rhead.nblue / ncont))
+        start = np.where(ok, start, end - bexpose / DSEC)
+        ok &= goodTime & goodTime[fcont]
+
+        bmjdCentre = np.where(badBlue, mjdCentre, (start + end) / 2.0)
+        bexpose = np.where(badBlue, exposure, bexpose)
+        bgoodTime = np.where(badBlue, goodTime, ok)
+
+    else:
+        bmjdCentre, bexpose, bgoodTime = mjdCentre, exposure, goodTime
+
+    return (
+        mjdCentre,
+        exposure,
+        goodTime,
+        info,
+        bmjdCentre,
+        bexpose,
+        bgoodTime,
+        badBlue,
+    )
+
 
 # The ATC FileServer recognises various GET requests (look for 'action=' in
 # the code) which are accessed using urllib. The following code is to allow
@@ -2562,6 +3117,109 @@ def get_nframe_from_server(run):
         raise ValueError("failed to parse server response to " + full_url)
 
 
+def make_index(run):
+    """Writes a sidecar index file 'run' + IDX next to the .dat file of a
+    complete run. This records the number of frames, the size of the .dat
+    file, the junk blue frame flags and the times decoded from the timing
+    bytes with the full history of earlier timestamps available for every
+    frame (see :func:`utimers`). Once written, :class:`Rdata` picks it up
+    automatically and uses its times in place of those of :func:`utimer`,
+    which otherwise lacks the history for frames read just after a seek.
+    It can be read back with :func:`read_index`. 'hmeta' writes indexes for
+    the runs it processes.
+
+    Arguments::
+
+       run : string
+          run name, e.g. 'run036'.
+
+    Returns the index as :func:`read_index` would.
+    """
+    with Rtbytes(run) as rtbytes:
+        datsize = os.fstat(rtbytes.fp.fileno()).st_size
+        nframe = datsize // rtbytes.framesize
+        if nframe > 0:
+            tbytes = rtbytes.read_block(1, nframe)
+        else:
+            tbytes = np.zeros((0, rtbytes.ntbytes), dtype=np.uint8)
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            times = utimers(tbytes, rtbytes)
+
+        if rtbytes.instrument == "ULTRACAM":
+            (mjds, exposes, goods, info, bmjds, bexposes, bgoods, junk) = times
+        else:
+            mjds, exposes, goods, info = times
+            bmjds, bexposes, bgoods = mjds, exposes, goods
+            junk = np.zeros(nframe, dtype=bool)
+
+        index = {
+            "framesize": rtbytes.framesize,
+            "ntbytes": rtbytes.ntbytes,
+            "nblue": rtbytes.nblue if rtbytes.instrument == "ULTRACAM" else 1,
+            "nframe": nframe,
+            "datsize": datsize,
+            "junk": junk,
+            "mjds": mjds,
+            "exposes": exposes,
+            "goods": goods,
+            "bmjds": bmjds,
+            "bexposes": bexposes,
+            "bgoods": bgoods,
+        }
+
+    # use a file object to stop numpy adding .npz to the name
+    with open(run + IDX, "wb") as fout:
+        np.savez(fout, **index)
+
+    return index
+
+
+def read_index(run, rhead=None):
+    """Reads the index file of a run written by :func:`make_index`, returning
+    it as a dictionary of the numbers and arrays stored, or None if there is
+    no index or it does not match the run. The index is regarded as out of
+    date if the run's .dat file, if present, differs in size from the one
+    indexed, as it will if the run was still growing when it was indexed.
+
+    Arguments::
+
+       run : string
+          run name, e.g. 'run036'.
+
+       rhead : Rhead | None
+          header of the run to check against. It will be read if
+          not supplied.
+
+    Returns dict or None.
+    """
+    if not os.path.isfile(run + IDX):
+        return None
+
+    if rhead is None:
+        rhead = Rhead(run)
+
+    with np.load(run + IDX) as npz:
+        index = {key: npz[key] for key in npz.files}
+    if "datsize" not in index:
+        return None
+
+    for key in ("framesize", "ntbytes", "nblue", "nframe", "datsize"):
+        index[key] = int(index[key])
+
+    if index["framesize"] != rhead.framesize or index["ntbytes"] != rhead.ntbytes:
+        return None
+
+    if (
+        os.path.isfile(run + ".dat")
+        and os.stat(run + ".dat").st_size != index["datsize"]
+    ):
+        return None
+
+    return index
+
+
 class UltracamError(Exception):
     """For throwing exceptions from the ultracam module"""
 
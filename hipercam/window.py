@@ -13,9 +13,10 @@ from collections import OrderedDict
 
 import numpy as np
 from numpy.lib.stride_tricks import as_strided
+from scipy import fft as sfft
 
 from astropy.io import fits
-from astropy.convolution import Gaussian2DKernel, convolve, convolve_fft
+from astropy.convolution import Gaussian2DKernel, convolve
 from scipy.ndimage.filters import maximum_filter
 from scipy.ndimage import gaussian_filter
 
@@ -25,25 +26,29 @@ from .group import *
 from .header import *
 
 __all__ = (
+    "Wingeom",
     "Winhead",
+    "Winview",
     "Window",
     "CcdWin",
     "MccdWin",
+    "smooth_fft",
 )
 
 
-class Winhead(Header):
-    """The header parts of a CCD window
+class Wingeom:
+    """The format of a CCD window: its position, dimensions, binning factors
+    and output amplifier, without any header or data.
 
-    `Winhead` objects contain everything needed to represent a
-    CCD window other than its data. This represents an arbitrary
-    rectangular region of binned pixels. The lower-left pixel of the
-    CCD is assumed to have coordinates (x,y) = (1,1). `Winhead`
-    dimensions are in binned pixels.
+    `Wingeom` is the base class of :class:`Winhead`, which adds a header, and
+    of :class:`Winview`, which adds data. All the methods that depend only
+    upon the format of a window are defined here. It uses `__slots__` to keep
+    it small and quick to create, as suits the many small windows that are
+    made while reducing data.
 
-        >>> from hipercam import Winhead
-        >>> win = Winhead(12, 6, 100, 150, 2, 3)
-        >>> print(win)
+        >>> from hipercam import Wingeom
+        >>> win = Wingeom(12, 6, 100, 150, 2, 3, 'LL')
+        >>> print(win.extent())
 
     Parameters:
     -----------
@@ -60,56 +65,12 @@ class Winhead(Header):
     ybin : int
         Binning factor in Y
     outamp : str, {'','LL','LR','UL','UR'}
-        Location of output amplifier. Options: '' == unknown; 'LL' ==
-        lower-left; 'LR' == lower-right; 'UL' == upper-left; 'UR' ==
-        upper-right. Used when trimming to remove the correct part of
-        the window.
-    head : :class:`Header`, optional
-        Arbitrary header items (excluding ones such as LLX reserved
-        for containing the above parameters when reading and writing
-        Winhead objects). This will be deep copied to avoid different
-        Winheads sharing the same header. See 'copy' for how the header
-        is tranferred into the Winhead
-    copy : bool, optional
-        Controls whether the header is copied by value (True) or
-        simply by reference (False). The latter is lightweight and
-        faster but can cause unexpected behaviour especially when
-        constructing multiple Winhead (or Window) objects if one
-        repeatedly sends the same Header to each of them.
-
-    Attributes
-    ----------
-    llx : int
-        X ordinate lower-left pixel, unbinned pixels
-    lly : int
-        Y ordinate lower-left pixel, unbinned pixels
-    xbin : int
-        X-binning factor
-    ybin : int
-        Y-binning factor
-    nx : int
-    ny : int
-    outamp : str, {'','LL','LR','UL','UR'}
-        output amplifier location
-    urx : int
-    ury : int
-    xlo : float
-    xhi : float
-    ylo : float
-    yhi : float
+        Location of output amplifier. See :class:`Winhead`.
     """
 
-    def __init__(self, llx, lly, nx, ny, xbin, ybin, outamp, head=None, copy=False):
-        """
-        Inits Winheads
-        """
-
-        if head is None:
-            super().__init__()
-        else:
-            super().__init__(head, copy=copy)
+    __slots__ = ("llx", "lly", "_nx", "_ny", "xbin", "ybin", "outamp")
 
-        # And the window format attributes
+    def __init__(self, llx, lly, nx, ny, xbin, ybin, outamp):
         self.llx = llx
         self.lly = lly
         self.xbin = xbin
@@ -123,8 +84,6 @@ class Winhead(Header):
                 )
             )
 
-        self.outamp = outamp
-
         # Have to take care with the next two since in
         # Window they are connected to the array size
         self._nx = nx
@@ -133,7 +92,7 @@ class Winhead(Header):
     @property
     def nx(self):
         """
-        Binned X-dimension of the `Winhead`.
+        Binned X-dimension of the `Wingeom`.
         """
         return self._nx
 
@@ -146,7 +105,7 @@ class Winhead(Header):
     @property
     def ny(self):
         """
-        Binned Y-dimension of the `Winhead`.
+        Binned Y-dimension of the `Wingeom`.
         """
         return self._ny
 
@@ -157,7 +116,7 @@ class Winhead(Header):
         self._ny = ny
 
     def __repr__(self):
-        return "Winhead(llx={!r}, lly={!r}, nx={!r}, ny={!r}, xbin={!r}, ybin={!r}, outamp={!r}, head={:s})".format(
+        return "Wingeom(llx={!r}, lly={!r}, nx={!r}, ny={!r}, xbin={!r}, ybin={!r}, outamp={!r})".format(
             self.llx,
             self.lly,
             self.nx,
@@ -165,44 +124,27 @@ class Winhead(Header):
             self.xbin,
             self.ybin,
             self.outamp,
-            super().__repr__(),
         )
 
     def __str__(self):
         return self.__repr__()
 
     def format(self, nohead=False):
-        """Used to ensure that only the Winhead format gets printed which is
-        useful in some instances. Relying on __repr__ carries the risk of
-        being overloaded. Set 'nohead' True to suppress the header in addition"""
-
-        if nohead:
-            return "Winhead(llx={!r}, lly={!r}, nx={!r}, ny={!r}, xbin={!r}, ybin={!r}, outamp={!r}, head=<...>)".format(
-                self.llx, self.lly, self.nx, self.ny, self.xbin, self.ybin, self.outamp
-            )
-        else:
-            return "Winhead(llx={!r}, lly={!r}, nx={!r}, ny={!r}, xbin={!r}, ybin={!r}, outamp={!r}, head={!r})".format(
-                self.llx,
-                self.lly,
-                self.nx,
-                self.ny,
-                self.xbin,
-                self.ybin,
-                self.outamp,
-                super().__repr__(),
-            )
+        """Returns a string representing the format of the window. 'nohead'
+        is for compatibility with :meth:`Winhead.format`."""
+        return Wingeom.__repr__(self)
 
     @property
     def urx(self):
         """
-        Unbinned X pixel at upper-right of `Winhead`
+        Unbinned X pixel at upper-right of `Wingeom`
         """
         return self.llx - 1 + self.nx * self.xbin
 
     @property
     def ury(self):
         """
-        Unbinned Y pixel at upper-right of `Winhead`
+        Unbinned Y pixel at upper-right of `Wingeom`
         """
         return self.lly - 1 + self.ny * self.ybin
 
@@ -297,21 +239,21 @@ class Winhead(Header):
     def extent(self):
 
         """
-        Returns (left,right,bottom,top) boundaries of :class:`Winhead`
+        Returns (left,right,bottom,top) boundaries of :class:`Wingeom`
         i.e. (xlo,xhi,ylo,yhi)
         """
         return (self.xlo, self.xhi, self.ylo, self.yhi)
 
     def outside(self, win):
-        """Returns True if `self` contains the :class:Winhead `win` in such a
+        """Returns True if `self` contains the :class:Wingeom `win` in such a
         way that it could be cut down to it. This implies that even if
         binned, its pixels are "in step", aka "synchronised", and that
         its binning factors are integer divisors of those of `win`.
 
         Arguments::
 
-          win  : :class:Winhead
-             the :class:Winhead that we are testing against to see if `self`
+          win  : :class:Wingeom
+             the :class:Wingeom that we are testing against to see if `self`
              surrounds it.
 
         See also :func:`inside`, :func:`window`
@@ -336,8 +278,8 @@ class Winhead(Header):
 
         Arguments::
 
-          win  : :class:Winhead
-             the :class:Winhead that we are testing against to see if `self` in
+          win  : :class:Wingeom
+             the :class:Wingeom that we are testing against to see if `self` in
              inside it.
 
         See also :func:`outside`, :func:`window`
@@ -356,7 +298,7 @@ class Winhead(Header):
 
     def xy(self):
         """Returns two 2D arrays containing the x and y values at the centre
-        of each pixel defined by the :class:`Winhead`. See
+        of each pixel defined by the :class:`Wingeom`. See
         numpy.meshgrid to see what this means.
 
         """
@@ -367,16 +309,16 @@ class Winhead(Header):
         return np.meshgrid(x, y)
 
     def clash(self, win):
-        """Raises a ValueError if two :class: `Winhead`s are considered to
+        """Raises a ValueError if two :class: `Wingeom`s are considered to
         'clash'.  In this case this means if they have any pixels in
         common.  This method is used in the 'check' method of the
         :class:`Group` class to check the mutual validity of a set of
-        :class:`Winhead`.
+        :class:`Wingeom`.
 
         Arguments::
 
-          win : :class:`Winhead`
-             the :class:`Winhead` that we are testing self against.
+          win : :class:`Wingeom`
+             the :class:`Wingeom` that we are testing self against.
 
         """
         if (
@@ -392,14 +334,14 @@ class Winhead(Header):
             )
 
     def matches(self, win):
-        """Tests that the :class:`Winhead` matches another. If all OK, returns
+        """Tests that the :class:`Wingeom` matches another. If all OK, returns
         None, otherwise raises a ValueError reporting the two
-        :class:`Winhead`s. See also `__eq__`
+        :class:`Wingeom`s. See also `__eq__`
 
         Arguments::
 
-          win : :class:`Winhead`
-             the :class:`Winhead` that we are testing self against.
+          win : :class:`Wingeom`
+             the :class:`Wingeom` that we are testing self against.
 
         """
         if self != win:
@@ -410,24 +352,17 @@ class Winhead(Header):
             )
 
     def copy(self, memo=None):
-        """Returns a copy (deepcopy) of the :class:`Winhead`
+        """Returns a copy of the :class:`Wingeom`
 
-        copy.copy and copy.deepcopy of a `Winhead` use this method
+        copy.copy and copy.deepcopy of a `Wingeom` use this method
         """
-        return Winhead(
-            self.llx,
-            self.lly,
-            self.nx,
-            self.ny,
-            self.xbin,
-            self.ybin,
-            self.outamp,
-            super().copy(),
+        return Wingeom(
+            self.llx, self.lly, self.nx, self.ny, self.xbin, self.ybin, self.outamp
         )
 
     def distance(self, x, y):
         """Calculates the minimum distance of a point from the edge of the
-        Winhead. If the point is outside the Winhead the distance will
+        Wingeom. If the point is outside the Wingeom the distance will
         be negative; if inside it will be positive. The edge is
         defined as the line running around the outside of the outer
         set of pixels. For a point outside the box in both x and y,
@@ -461,36 +396,10 @@ class Winhead(Header):
 
         return dist
 
-    def window(self, xlo, xhi, ylo, yhi, copy=False):
-        """Generates a new Winhead by windowing it to match the complete
-        pixels visible within the range xlo to xhi, ylo to yhi.
-
-        Arguments::
-
-           xlo : float
-              minimum X, unbinned pixels (extreme left pixels of CCD centred
-              on 1). None to ignore.
-
-           xhi : float
-              maximum X, unbinned pixels. None to ignore.
-
-           ylo : float
-              minimum Y, unbinned pixels (bottom pixels of CCD centred on 1)
-              None to ignore.
-
-           yhi : float
-              maximum Y, unbinned pixels. None to ignore
-
-           copy : bool
-              controls whether the header is copied over, or just
-              referenced.  The latter is more efficient, but if you later want
-              to change the header could propogate those changes to whatever
-              you copied.
-
-        Returns the windowed Winhead. Raises a ValueError if there are no
-        visible pixels.
-
-        """
+    def _region(self, xlo, xhi, ylo, yhi):
+        """Returns (llx,lly,nx,ny) of the region of the complete pixels of the
+        window visible within the range xlo to xhi, ylo to yhi. See
+        :meth:`window`. Raises a HipercamError if there are none."""
 
         # account for 'None' inputs
         xlo = xlo if xlo is not None else self.xlo
@@ -525,15 +434,34 @@ class Winhead(Header):
                 )
             )
 
-        if copy:
-            # headers are copied over as an independent object
-            wh = Winhead(
-                llx, lly, nx, ny, self.xbin, self.ybin, self.outamp, super().copy()
-            )
-        else:
-            # headers are copied by reference.
-            wh = Winhead(llx, lly, nx, ny, self.xbin, self.ybin, self.outamp, self)
-        return wh
+        return (llx, lly, nx, ny)
+
+    def window(self, xlo, xhi, ylo, yhi):
+        """Generates a new Wingeom by windowing it to match the complete
+        pixels visible within the range xlo to xhi, ylo to yhi.
+
+        Arguments::
+
+           xlo : float
+              minimum X, unbinned pixels (extreme left pixels of CCD centred
+              on 1). None to ignore.
+
+           xhi : float
+              maximum X, unbinned pixels. None to ignore.
+
+           ylo : float
+              minimum Y, unbinned pixels (bottom pixels of CCD centred on 1)
+              None to ignore.
+
+           yhi : float
+              maximum Y, unbinned pixels. None to ignore
+
+        Returns the windowed Wingeom. Raises a HipercamError if there are no
+        visible pixels.
+
+        """
+        llx, lly, nx, ny = self._region(xlo, xhi, ylo, yhi)
+        return Wingeom(llx, lly, nx, ny, self.xbin, self.ybin, self.outamp)
 
     def __copy__(self):
         return self.copy()
@@ -542,13 +470,13 @@ class Winhead(Header):
         return self.copy(memo)
 
     def __eq__(self, win):
-        """Defines equality. Two :class:`Winhead`s are equal if they match exactly
+        """Defines equality. Two :class:`Wingeom`s are equal if they match exactly
         (same lower left corner, dimensions and binning factors)
 
         Arguments::
 
-          win : :class:`Winhead`
-             the :class:Winhead that we are testing self against.
+          win : :class:`Wingeom`
+             the :class:Wingeom that we are testing self against.
 
         """
         return (
@@ -561,71 +489,310 @@ class Winhead(Header):
         )
 
     def __ne__(self, win):
-        """Defines equality. Two :class:`Winhead`s are equal if they match
+        """Defines equality. Two :class:`Wingeom`s are equal if they match
         exactly (same lower left corner, dimensions and binning
         factors)
 
         Arguments::
 
-          win : :class:`Winhead`
-             the :class:Winhead that we are testing self against.
+          win : :class:`Wingeom`
+             the :class:Wingeom that we are testing self against.
 
         """
         return not (self == win)
 
 
-class _Encoder(json.JSONEncoder):
-    """
-    Provides a default that can be used to write Winhead
-    objects to json files
-    """
-
-    def default(self, obj):
-        if isinstance(obj, Winhead):
-            return OrderedDict(
-                (
-                    ("Comment", "hipercam.Winhead"),
-                    ("llx", obj.llx),
-                    ("lly", obj.lly),
-                    ("nx", obj.nx),
-                    ("ny", obj.ny),
-                    ("xbin", obj.xbin),
-                    ("ybin", obj.ybin),
-                    ("outamp", obj.outamp),
-                    ("head", obj.head.tostring("", False, False)),
-                )
-            )
-
-        super().default(obj)
+class Winhead(Wingeom, Header):
+    """The header parts of a CCD window
 
+    `Winhead` objects contain everything needed to represent a
+    CCD window other than its data. This represents an arbitrary
+    rectangular region of binned pixels. The lower-left pixel of the
+    CCD is assumed to have coordinates (x,y) = (1,1). `Winhead`
+    dimensions are in binned pixels.
 
-class _Decoder(json.JSONDecoder):
-    def __init__(self, *args, **kwargs):
-        super().__init__(object_hook=self.object_hook, *args, **kwargs)
+        >>> from hipercam import Winhead
+        >>> win = Winhead(12, 6, 100, 150, 2, 3)
+        >>> print(win)
 
-    def object_hook(self, obj):
-        # looks out for Winhead objects. Everything else done by default
-        if "Comment" in obj and obj["Comment"] == "hipercam.Winhead":
-            return Winhead(
-                obj["llx"],
-                obj["lly"],
-                obj["nx"],
-                obj["ny"],
-                obj["xbin"],
-                obj["ybin"],
-                obj["outamp"],
-                Header.fromstring(obj["head"]),
-            )
+    Parameters:
+    -----------
+    llx : int
+        X position of lower-left pixel of window (unbinned pixels)
+    lly : int
+        Y position of lower-left pixel of window (unbinned pixels)
+    nx : int
+        X dimension of window, binned pixels
+    ny : int
+        Y dimension of window, binned pixels
+    xbin : int
+        Binning factor in X
+    ybin : int
+        Binning factor in Y
+    outamp : str, {'','LL','LR','UL','UR'}
+        Location of output amplifier. Options: '' == unknown; 'LL' ==
+        lower-left; 'LR' == lower-right; 'UL' == upper-left; 'UR' ==
+        upper-right. Used when trimming to remove the correct part of
+        the window.
+    head : :class:`Header`, optional
+        Arbitrary header items (excluding ones such as LLX reserved
+        for containing the above parameters when reading and writing
+        Winhead objects). This will be deep copied to avoid different
+        Winheads sharing the same header. See 'copy' for how the header
+        is tranferred into the Winhead
+    copy : bool, optional
+        Controls whether the header is copied by value (True) or
+        simply by reference (False). The latter is lightweight and
+        faster but can cause unexpected behaviour especially when
+        constructing multiple Winhead (or Window) objects if one
+        repeatedly sends the same Header to each of them.
 
-        return obj
+    Attributes
+    ----------
+    llx : int
+        X ordinate lower-left pixel, unbinned pixels
+    lly : int
+        Y ordinate lower-left pixel, unbinned pixels
+    xbin : int
+        X-binning factor
+    ybin : int
+        Y-binning factor
+    nx : int
+    ny : int
+    outamp : str, {'','LL','LR','UL','UR'}
+        output amplifier location
+    urx : int
+    ury : int
+    xlo : float
+    xhi : float
+    ylo : float
+    yhi : float
+    """
 
+    def __init__(self, llx, lly, nx, ny, xbin, ybin, outamp, head=None, copy=False):
+        """
+        Inits Winheads
+        """
 
-class CcdWin(Group):
-    """All the :class:`Winhead` objects of a single CCD.
+        if head is None:
+            Header.__init__(self)
+        else:
+            Header.__init__(self, head, copy=copy)
 
-    Acts as a container for all of the window formats of a CCD.
+        # And the window format attributes
+        Wingeom.__init__(self, llx, lly, nx, ny, xbin, ybin, outamp)
 
-    Parameters
+    def __repr__(self):
+        return "Winhead(llx={!r}, lly={!r}, nx={!r}, ny={!r}, xbin={!r}, ybin={!r}, outamp={!r}, head={:s})".format(
+            self.llx,
+            self.lly,
+            self.nx,
+            self.ny,
+            self.xbin,
+            self.ybin,
+            self.outamp,
+            Header.__repr__(self),
+        )
+
+    def __str__(self):
+        return self.__repr__()
+
+    def format(self, nohead=False):
+        """Used to ensure that only the Winhead format gets printed which is
+        useful in some instances. Relying on __repr__ carries the risk of
+        being overloaded. Set 'nohead' True to suppress the header in addition"""
+
+        if nohead:
+            return "Winhead(llx={!r}, lly={!r}, nx={!r}, ny={!r}, xbin={!r}, ybin={!r}, outamp={!r}, head=<...>)".format(
+                self.llx, self.lly, self.nx, self.ny, self.xbin, self.ybin, self.outamp
+            )
+        else:
+            return "Winhead(llx={!r}, lly={!r}, nx={!r}, ny={!r}, xbin={!r}, ybin={!r}, outamp={!r}, head={!r})".format(
+                self.llx,
+                self.lly,
+                self.nx,
+                self.ny,
+                self.xbin,
+                self.ybin,
+                self.outamp,
+                Header.__repr__(self),
+            )
+
+    def copy(self, memo=None):
+        """Returns a copy (deepcopy) of the :class:`Winhead`
+
+        copy.copy and copy.deepcopy of a `Winhead` use this method
+        """
+        return Winhead(
+            self.llx,
+            self.lly,
+            self.nx,
+            self.ny,
+            self.xbin,
+            self.ybin,
+            self.outamp,
+            Header.copy(self),
+        )
+
+    def window(self, xlo, xhi, ylo, yhi, copy=False):
+        """Generates a new Winhead by windowing it to match the complete
+        pixels visible within the range xlo to xhi, ylo to yhi.
+
+        Arguments::
+
+           xlo : float
+              minimum X, unbinned pixels (extreme left pixels of CCD centred
+              on 1). None to ignore.
+
+           xhi : float
+              maximum X, unbinned pixels. None to ignore.
+
+           ylo : float
+              minimum Y, unbinned pixels (bottom pixels of CCD centred on 1)
+              None to ignore.
+
+           yhi : float
+              maximum Y, unbinned pixels. None to ignore
+
+           copy : bool
+              controls whether the header is copied over, or just
+              referenced.  The latter is more efficient, but if you later want
+              to change the header could propogate those changes to whatever
+              you copied.
+
+        Returns the windowed Winhead. Raises a ValueError if there are no
+        visible pixels.
+
+        """
+
+        llx, lly, nx, ny = self._region(xlo, xhi, ylo, yhi)
+
+        if copy:
+            # headers are copied over as an independent object
+            wh = Winhead(
+                llx, lly, nx, ny, self.xbin, self.ybin, self.outamp, Header.copy(self)
+            )
+        else:
+            # headers are copied by reference.
+            wh = Winhead(llx, lly, nx, ny, self.xbin, self.ybin, self.outamp, self)
+        return wh
+
+
+class _Encoder(json.JSONEncoder):
+    """
+    Provides a default that can be used to write Winhead
+    objects to json files
+    """
+
+    def default(self, obj):
+        if isinstance(obj, Winhead):
+            return OrderedDict(
+                (
+                    ("Comment", "hipercam.Winhead"),
+                    ("llx", obj.llx),
+                    ("lly", obj.lly),
+                    ("nx", obj.nx),
+                    ("ny", obj.ny),
+                    ("xbin", obj.xbin),
+                    ("ybin", obj.ybin),
+                    ("outamp", obj.outamp),
+                    ("head", obj.head.tostring("", False, False)),
+                )
+            )
+
+        super().default(obj)
+
+
+class _Decoder(json.JSONDecoder):
+    def __init__(self, *args, **kwargs):
+        super().__init__(object_hook=self.object_hook, *args, **kwargs)
+
+    def object_hook(self, obj):
+        # looks out for Winhead objects. Everything else done by default
+        if "Comment" in obj and obj["Comment"] == "hipercam.Winhead":
+            return Winhead(
+                obj["llx"],
+                obj["lly"],
+                obj["nx"],
+                obj["ny"],
+                obj["xbin"],
+                obj["ybin"],
+                obj["outamp"],
+                Header.fromstring(obj["head"]),
+            )
+
+        return obj
+
+
+# Cache of the FFTs of the smoothing kernels used by smooth_fft, keyed on
+# the shape of the image and the kernel's sigma. In reduce these stay the
+# same for a whole run. It is cleared if it grows beyond SMOOTH_CACHE_SIZE
+# entries.
+_smooth_cache = {}
+SMOOTH_CACHE_SIZE = 100
+
+
+def smooth_fft(data, sigma, back):
+    """Convolves an image with a normalised :class:`Gaussian2DKernel` using
+    FFTs, setting pixels beyond its edges to a constant, as
+    astropy.convolution.convolve_fft(data, kern, 'fill', back) does for data
+    without NaNs. The FFT of the kernel and the padded size are cached for
+    each image shape and `sigma`.
+
+    Arguments::
+
+      data : 2D or 3D array
+        the image to convolve. If 3D, each of data[n] is convolved, which
+        allows several images of the same shape to be done with one FFT.
+
+      sigma : float
+        RMS of the Gaussian, pixels.
+
+      back : float | 1D array
+        the value of the pixels beyond the edges, one per image if `data` is
+        3D.
+
+    Returns:: the convolved image(s), float64, of the same shape as `data`.
+
+    """
+    shape = data.shape[-2:]
+    key = (shape, sigma)
+    entry = _smooth_cache.get(key)
+    if entry is None:
+        kern = Gaussian2DKernel(sigma).array
+        kern = kern / kern.sum()
+        ky, kx = kern.shape
+
+        # pad to avoid wrapping round
+        fshape = (
+            sfft.next_fast_len(shape[0] + ky - 1, True),
+            sfft.next_fast_len(shape[1] + kx - 1, True),
+        )
+        entry = (sfft.rfft2(kern, fshape), fshape, ky // 2, kx // 2)
+
+        if len(_smooth_cache) >= SMOOTH_CACHE_SIZE:
+            _smooth_cache.clear()
+        _smooth_cache[key] = entry
+
+    fkern, fshape, yoff, xoff = entry
+
+    # the pixels beyond the edges are zero once the background is removed
+    back = np.asarray(back, dtype=np.float64)
+    if data.ndim == 3:
+        back = back.reshape((-1, 1, 1))
+    diff = data - back
+    conv = sfft.irfft2(sfft.rfft2(diff, fshape) * fkern, fshape)
+    return (
+        conv[..., yoff : yoff + shape[0], xoff : xoff + shape[1]] + back
+    )
+
+
+class CcdWin(Group):
+    """All the :class:`Winhead` objects of a single CCD.
+
+    Acts as a container for all of the window formats of a CCD.
+
+    Parameters
     ----------
     wins : Group(Winhead)
        All of the :class:`Winhead` objects
@@ -664,63 +831,321 @@ class CcdWin(Group):
         return CcdWin(obj[1:])
 
 
-class MccdWin(Group):
-    """All the :class:`Winhead` objects for multiple CCDs.
+class MccdWin(Group):
+    """All the :class:`Winhead` objects for multiple CCDs.
+
+    Parameters
+    ----------
+    wins : Group(CcdWin)
+       All of the :class:`CcdWin` objects
+    """
+
+    def __init__(self, wins=Group(CcdWin)):
+        super().__init__(CcdWin, wins)
+
+    def __repr__(self):
+        return "{:s}(wins={:s})".format(self.__class__.__name__, super().__repr__())
+
+    def toJson(self, fname):
+        """Dumps MccdWin in JSON format to a file
+
+        Arguments::
+
+            fname : (string)
+               file to dump to
+        """
+        # dumps as list to retain order through default iterator encoding
+        # that buggers things otherwise
+        listify = ["hipercam.MccdWin"] + list(
+            (
+                (key, ["hipercam.CcdWin"] + list(val.items()))
+                for key, val in self.items()
+            )
+        )
+        with open(fname, "w") as fp:
+            json.dump(listify, fp, cls=_Encoder, indent=2)
+
+    @classmethod
+    def fromJson(cls, fname):
+        """Read from JSON-format file fname
+
+        Returns an MccdWin object.
+        """
+        with open(fname) as fp:
+            obj = json.load(fp, cls=_Decoder)
+        listify = [(v1, CcdWin(v2[1:])) for v1, v2 in obj[1:]]
+        mccdwin = MccdWin(listify)
+        return mccdwin
+
+    @classmethod
+    def fromMccd(cls, mccd):
+        mccdwin = MccdWin()
+        for cnam, ccd in mccd.items():
+            mccdwin[cnam] = CcdWin()
+            for wnam, wind in ccd.items():
+                mccdwin[cnam][wnam] = wind.win
+        return mccdwin
+
+
+class Winview(Wingeom):
+    """A lightweight view of the data of a CCD window without any header.
+
+    Constructed from a :class:`Wingeom` (or anything with the same format
+    attributes, such as a :class:`Window`) and a 2D :class:`numpy.ndarray`
+    stored in the attribute `data`. This is what :meth:`Window.view` returns,
+    which is much cheaper than :meth:`Window.window` when only the data and
+    position of a sub-window are needed, as in the repeated aperture
+    repositioning and extraction of a reduction. The `data` are usually a
+    slice of those of the parent :class:`Window`, so changes to one are seen
+    in the other.
+
+    Parameters
+    ----------
+    win : :class:`Wingeom`
+        the position, binning factors and output amplifier
+    data : 2D numpy.ndarray
+        the data. Its dimensions define nx and ny.
+    """
+
+    __slots__ = ("data",)
+
+    def __init__(self, win, data):
+        Wingeom.__init__(
+            self,
+            win.llx,
+            win.lly,
+            data.shape[1],
+            data.shape[0],
+            win.xbin,
+            win.ybin,
+            win.outamp,
+        )
+        self.data = data
+
+    @property
+    def nx(self):
+        """
+        Returns binned X-dimension of the :class:`Winview`.
+        """
+        return self.data.shape[1]
+
+    @nx.setter
+    def nx(self, nx):
+        raise NotImplementedError("cannot set nx directly; change data array instead")
+
+    @property
+    def ny(self):
+        """
+        Returns binned Y-dimension of the :class:`Winview`.
+        """
+        return self.data.shape[0]
+
+    @ny.setter
+    def ny(self, ny):
+        raise NotImplementedError("cannot set ny directly; change data array instead")
+
+    def flatten(self):
+        """Return data of the :class:`Winview` as a 1D array"""
+        return self.data.flatten()
+
+    @property
+    def size(self):
+        """
+        Number of pixels
+        """
+        return self.data.size
+
+    def set_const(self, val):
+        """Sets the data array to a constant"""
+        self.data[:] = val
+
+    def min(self):
+        """
+        Returns the minimum value of the :class:`Winview`.
+        """
+        return self.data.min()
+
+    def max(self):
+        """
+        Returns the maximum value of the :class:`Winview`.
+        """
+        return self.data.max()
+
+    def mean(self):
+        """
+        Returns the mean value of the :class:`Winview`.
+        """
+        return self.data.mean()
+
+    def median(self):
+        """
+        Returns the median value of the :class:`Winview`.
+        """
+        return np.median(self.data)
+
+    def sum(self):
+        """
+        Returns the sum of the :class:`Winview`.
+        """
+        return self.data.sum()
+
+    def std(self):
+        """
+        Returns the standard deviation of the :class:`Winview`.
+        """
+        return self.data.std()
+
+    def percentile(self, q):
+        """
+        Computes percentile(s) of a :class:`Winview`.
+
+        Arguments::
+
+          q : float or sequence of floats
+            Percentile(s) to use, in range [0,100]
+        """
+        return np.percentile(self.data, q)
+
+    def search(self, fwhm, x0, y0, thresh, fft, max=False, percent=50.0):
+        """Search for a target in a :class:Winview. Works by convolving the image
+        with a gaussian of FWHM = fwhm, and returns the location of the
+        maximum in the smoothed image which exceeds a level `thresh` and lies
+        closest to the expected position. The convolution improves the
+        reliability of the identification of the object position and reduces
+        the chance of problems being caused by cosmic rays, although if there
+        is more overall flux in a cosmic ray than the star, it could go wrong.
+
+        This routine is intended to provide a first cut in position for more
+        precise methods to polish.
+
+        Arguments::
+
+          fwhm : float
+            Gaussian FWHM in pixels. If <= 0, there will be no convolution,
+            although this is not advisable as a useful strategy.
+
+          x0 : float
+            x-position to judge position from (CCD-coordinates). The closest
+            sufficiently high maximum will be taken.
+
+          y0 : float
+            y-position to judge position from (CCD-coordinates). The closest
+            sufficiently high maximum will be taken.
+
+          thresh : float
+            The peak counts above background in the maximum of the *smoothed*
+            image must exceed this value for a maximum to count. Use this to
+            filter out noise.
+
+          fft : bool
+            The astropy.convolution routines are used. By default FFT-based
+            convolution is applied as it scales better with fwhm, especially
+            for fwhm >> 1, however the direct method (fft=False) may be faster
+            for small fwhm values and images. The FFT of the kernel is cached
+            for each combination of Window shape and fwhm (see
+            :func:`smooth_fft`), so repeated searches of boxes of the same
+            size are cheaper.
+
+         max : bool
+            If True, just go for the highest peak, i.e. ignore x0, y0. The peak
+            should still exceed the background by `thresh`
+
+         percent : float
+            percentile to use to compute the background value. < 0 and it will
+            be set to the minimum. 50% = median by default.
+
+        Returns::
+
+            a tuple of (x,y,peak): x,y is the location of the
+            brightest pixel measured in terms of CCD coordinates
+            (i.e. lower-left pixel is at (1,1)) and `peak` is the image value
+            at the peak pixel, in the *unconvolved* image. It might be useful
+            for initial estimates of peak height. If no peak is found, a
+            HipercamError will be raised.
+
+        """
+
+        # compute the background for judging peak heights
+        if percent <= 0:
+            back = self.data.min()
+        else:
+            back = np.percentile(self.data, percent)
+
+        if fwhm > 0:
+            sigma = fwhm / np.sqrt(8 * np.log(2))
+            if fft:
+                cimg = smooth_fft(self.data, sigma, back)
+            else:
+                cimg = gaussian_filter(self.data, sigma, mode="constant", cval=back)
+
+        else:
+            cimg = self.data
+
+        if max:
+            # Locate the pixel of the global maximum
+            iy, ix = np.unravel_index(cimg.argmax(), cimg.shape)
+
+            # it must exceed thresh to count
+            if cimg[iy, ix] <= back + thresh:
+                raise HipercamError(
+                    "no peak higher than {:.1f} found; highest = {:.1f} (background = {:.1f})".format(
+                        thresh, cimg[iy, ix], back
+                    )
+                )
 
-    Parameters
-    ----------
-    wins : Group(CcdWin)
-       All of the :class:`CcdWin` objects
-    """
+        else:
+            # in this case we will search for the maximum > thresh and closest
+            # to x0,y0 Find local maxima in smoothed image
+            dmax = maximum_filter(cimg, 3, mode="nearest")
+            iys, ixs = np.nonzero((dmax == cimg) & (cimg > back + thresh))
 
-    def __init__(self, wins=Group(CcdWin)):
-        super().__init__(CcdWin, wins)
+            # Find the maximum (if there is one) nearest to the expected
+            # position
+            if len(iys) == 0:
+                # Locate the pixel of the global maximum
+                cmax = cimg.max()
+                raise HipercamError(
+                    (
+                        "no peak higher than {:.1f} found; highest"
+                        " = {:.1f} (background = {:.1f})"
+                    ).format(thresh, cmax, back)
+                )
 
-    def __repr__(self):
-        return "{:s}(wins={:s})".format(self.__class__.__name__, super().__repr__())
+            ix0, iy0 = self.x_pixel(x0), self.y_pixel(y0)
+            imin = ((ixs - ix0) ** 2 + (iys - iy0) ** 2).argmin()
+            iy, ix = iys[imin], ixs[imin]
 
-    def toJson(self, fname):
-        """Dumps MccdWin in JSON format to a file
+        # return with the device coords and the value
+        return (self.x(ix), self.y(iy), self.data[iy, ix])
 
-        Arguments::
+    def view(self, xlo, xhi, ylo, yhi):
+        """Creates a :class:`Winview` of the complete pixels visible in the
+        region xlo to xhi, ylo to yhi. Its data are a slice of those of this
+        object, not a copy. Arguments are as for :meth:`Wingeom.window`; a
+        HipercamError is raised if there are no visible pixels.
 
-            fname : (string)
-               file to dump to
+        Returns the :class:`Winview`.
         """
-        # dumps as list to retain order through default iterator encoding
-        # that buggers things otherwise
-        listify = ["hipercam.MccdWin"] + list(
-            (
-                (key, ["hipercam.CcdWin"] + list(val.items()))
-                for key, val in self.items()
-            )
+        llx, lly, nx, ny = self._region(xlo, xhi, ylo, yhi)
+        x1 = (llx - self.llx) // self.xbin
+        y1 = (lly - self.lly) // self.ybin
+        return Winview(
+            Wingeom(llx, lly, nx, ny, self.xbin, self.ybin, self.outamp),
+            self.data[y1 : y1 + ny, x1 : x1 + nx],
         )
-        with open(fname, "w") as fp:
-            json.dump(listify, fp, cls=_Encoder, indent=2)
 
-    @classmethod
-    def fromJson(cls, fname):
-        """Read from JSON-format file fname
+    def copy(self, memo=None):
+        """Returns a copy of the :class:`Winview`, with its data copied as well
 
-        Returns an MccdWin object.
+        copy.copy and copy.deepcopy of a `Winview` use this method
         """
-        with open(fname) as fp:
-            obj = json.load(fp, cls=_Decoder)
-        listify = [(v1, CcdWin(v2[1:])) for v1, v2 in obj[1:]]
-        mccdwin = MccdWin(listify)
-        return mccdwin
+        return Winview(self, self.data.copy())
 
-    @classmethod
-    def fromMccd(cls, mccd):
-        mccdwin = MccdWin()
-        for cnam, ccd in mccd.items():
-            mccdwin[cnam] = CcdWin()
-            for wnam, wind in ccd.items():
-                mccdwin[cnam][wnam] = wind.win
-        return mccdwin
+    def __repr__(self):
+        return "Winview(win={:s}, data={!r})".format(Wingeom.__repr__(self), self.data)
 
 
-class Window(Winhead):
+class Window(Winview, Winhead):
     """A CCD window, headers, position and data
 
     Constructed from a :class:`Winhead` and a :class:`numpy.ndarray`
@@ -762,7 +1187,8 @@ class Window(Winhead):
     """
 
     def __init__(self, win, data=None, copy=False):
-        super().__init__(
+        Winhead.__init__(
+            self,
             win.llx,
             win.lly,
             win.nx,
@@ -770,7 +1196,7 @@ class Window(Winhead):
             win.xbin,
             win.ybin,
             win.outamp,
-            win,
+            win if isinstance(win, Header) else None,
             copy=copy,
         )
 
@@ -790,32 +1216,6 @@ class Window(Winhead):
 
             self.data = data
 
-    @property
-    def nx(self):
-        """
-        Returns binned X-dimension of the :class:`Window`.
-        """
-        return self.data.shape[1]
-
-    @nx.setter
-    def nx(self, nx):
-        raise NotImplementedError("cannot set nx directly; change data array instead")
-
-    @property
-    def ny(self):
-        """
-        Returns binned Y-dimension of the :class:`Window`.
-        """
-        return self.data.shape[0]
-
-    @ny.setter
-    def ny(self, ny):
-        raise NotImplementedError("cannot set ny directly; change data array instead")
-
-    def flatten(self):
-        """Return data of the :class:`Window` as a 1D array"""
-        return self.data.flatten()
-
     @classmethod
     def rhdu(cls, hdu):
         """Constructs a :class:`Window` from an ImageHdu. Requires header
@@ -831,7 +1231,11 @@ class Window(Winhead):
         # this prevents problems down the line with arithematic
         # on integers which can generate junk in soime cases.
         data = hdu.data
-        if data.dtype != np.float64:
+        if data.dtype.kind == "f" and data.dtype.itemsize == 8:
+            # FITS data are big-endian, so compare kind and size rather
+            # than dtype, but convert to native byte order
+            data = data.astype(np.float64, copy=False)
+        else:
             data = data.astype(np.float32)
 
         # extract important keywords Winhead
@@ -951,13 +1355,6 @@ class Window(Winhead):
         # Return the HDU
         return fits.ImageHDU(self.data, head.to_fits)
 
-    @property
-    def size(self):
-        """
-        Number of pixels
-        """
-        return self.data.size
-
     @property
     def winhead(self):
         """A copy of the :class:`Winhead` underlying the :class:`Window` This is to
@@ -965,11 +1362,7 @@ class Window(Winhead):
         as well
 
         """
-        return super().copy()
-
-    def set_const(self, val):
-        """Sets the data array to a constant"""
-        self.data[:] = val
+        return Winhead.copy(self)
 
     def add_noise(self, readout, gain):
         """Adds noise to a :class:`Window` according to a variance
@@ -985,53 +1378,6 @@ class Window(Winhead):
         sig = np.sqrt(readout ** 2 + self.data / gain)
         self.data += np.random.normal(scale=sig)
 
-    def min(self):
-        """
-        Returns the minimum value of the :class:`Window`.
-        """
-        return self.data.min()
-
-    def max(self):
-        """
-        Returns the maximum value of the :class:`Window`.
-        """
-        return self.data.max()
-
-    def mean(self):
-        """
-        Returns the mean value of the :class:`Window`.
-        """
-        return self.data.mean()
-
-    def median(self):
-        """
-        Returns the median value of the :class:`Window`.
-        """
-        return np.median(self.data)
-
-    def sum(self):
-        """
-        Returns the sum of the :class:`Window`.
-        """
-        return self.data.sum()
-
-    def std(self):
-        """
-        Returns the standard deviation of the :class:`Window`.
-        """
-        return self.data.std()
-
-    def percentile(self, q):
-        """
-        Computes percentile(s) of a :class:`Window`.
-
-        Arguments::
-
-          q : float or sequence of floats
-            Percentile(s) to use, in range [0,100]
-        """
-        return np.percentile(self.data, q)
-
     def add_fxy(self, funcs, ndiv=0):
         """Routine to add in the results of evaluating a function or a list of
         functions of x & y to the :class:`Window`.  Each function must take 2D
@@ -1094,7 +1440,7 @@ class Window(Winhead):
 
         copy.copy and copy.deepcopy of a `Window` use this method
         """
-        return Window(super().copy(), self.data.copy())
+        return Window(Winhead.copy(self), self.data.copy())
 
     def window(self, xlo, xhi, ylo, yhi, copy=False):
         """Creates a new Window by windowing it down to whatever complete
@@ -1126,7 +1472,7 @@ class Window(Winhead):
 
         """
         # construct a chopped down Winhead
-        winh = super().window(xlo, xhi, ylo, yhi, copy)
+        winh = Winhead.window(self, xlo, xhi, ylo, yhi, copy)
 
         # we know the Winhead generated is in step with the current
         # Winhead which saves some checks that would be applied if
@@ -1212,118 +1558,6 @@ class Window(Winhead):
 
             self.data = self.data.astype(np.uint16)
 
-    def search(self, fwhm, x0, y0, thresh, fft, max=False, percent=50.0):
-        """Search for a target in a :class:Window. Works by convolving the image
-        with a gaussian of FWHM = fwhm, and returns the location of the
-        maximum in the smoothed image which exceeds a level `thresh` and lies
-        closest to the expected position. The convolution improves the
-        reliability of the identification of the object position and reduces
-        the chance of problems being caused by cosmic rays, although if there
-        is more overall flux in a cosmic ray than the star, it could go wrong.
-
-        This routine is intended to provide a first cut in position for more
-        precise methods to polish.
-
-        Arguments::
-
-          fwhm : float
-            Gaussian FWHM in pixels. If <= 0, there will be no convolution,
-            although this is not advisable as a useful strategy.
-
-          x0 : float
-            x-position to judge position from (CCD-coordinates). The closest
-            sufficiently high maximum will be taken.
-
-          y0 : float
-            y-position to judge position from (CCD-coordinates). The closest
-            sufficiently high maximum will be taken.
-
-          thresh : float
-            The peak counts above background in the maximum of the *smoothed*
-            image must exceed this value for a maximum to count. Use this to
-            filter out noise.
-
-          fft : bool
-            The astropy.convolution routines are used. By default FFT-based
-            convolution is applied as it scales better with fwhm, especially
-            for fwhm >> 1, however the direct method (fft=False) may be faster
-            for small fwhm values and images and has a better behaviour at the
-            edges where it extends value with the nearest pixel while the FFT
-            wraps values.
-
-         max : bool
-            If True, just go for the highest peak, i.e. ignore x0, y0. The peak
-            should still exceed the background by `thresh`
-
-         percent : float
-            percentile to use to compute the background value. < 0 and it will
-            be set to the minimum. 50% = median by default.
-
-        Returns::
-
-            a tuple of (x,y,peak): x,y is the location of the
-            brightest pixel measured in terms of CCD coordinates
-            (i.e. lower-left pixel is at (1,1)) and `peak` is the image value
-            at the peak pixel, in the *unconvolved* image. It might be useful
-            for initial estimates of peak height. If no peak is found, a
-            HipercamError will be raised.
-
-        """
-
-        # compute the background for judging peak heights
-        if percent <= 0:
-            back = self.data.min()
-        else:
-            back = np.percentile(self.data, percent)
-
-        if fwhm > 0:
-            sigma = fwhm / np.sqrt(8 * np.log(2))
-            if fft:
-                kern = Gaussian2DKernel(sigma)
-                cimg = convolve_fft(self.data, kern, "fill", back)
-            else:
-                cimg = gaussian_filter(self.data, sigma, mode="constant", cval=back)
-
-        else:
-            cimg = self.data
-
-        if max:
-            # Locate the pixel of the global maximum
-            iy, ix = np.unravel_index(cimg.argmax(), cimg.shape)
-
-            # it must exceed thresh to count
-            if cimg[iy, ix] <= back + thresh:
-                raise HipercamError(
-                    "no peak higher than {:.1f} found; highest = {:.1f} (background = {:.1f})".format(
-                        thresh, cimg[iy, ix], back
-                    )
-                )
-
-        else:
-            # in this case we will search for the maximum > thresh and closest
-            # to x0,y0 Find local maxima in smoothed image
-            dmax = maximum_filter(cimg, 3, mode="nearest")
-            iys, ixs = np.nonzero((dmax == cimg) & (cimg > back + thresh))
-
-            # Find the maximum (if there is one) nearest to the expected
-            # position
-            if len(iys) == 0:
-                # Locate the pixel of the global maximum
-                cmax = cimg.max()
-                raise HipercamError(
-                    (
-                        "no peak higher than {:.1f} found; highest"
-                        " = {:.1f} (background = {:.1f})"
-                    ).format(thresh, cmax, back)
-                )
-
-            ix0, iy0 = self.x_pixel(x0), self.y_pixel(y0)
-            imin = ((ixs - ix0) ** 2 + (iys - iy0) ** 2).argmin()
-            iy, ix = iys[imin], ixs[imin]
-
-        # return with the device coords and the value
-        return (self.x(ix), self.y(iy), self.data[iy, ix])
-
     def __copy__(self):
         return self.copy()
 
@@ -1331,7 +1565,7 @@ class Window(Winhead):
         return self.copy(memo)
 
     def __repr__(self):
-        return "Window(win={:s}, data={!r})".format(super().__repr__(), self.data)
+        return "Window(win={:s}, data={!r})".format(Winhead.__repr__(self), self.data)
 
     # lots of arithematic routines
 
@@ -1420,7 +1654,7 @@ class Window(Winhead):
         # carry out addition to a float type
         data = self.data + num
 
-        return Window(super().copy(), data)
+        return Window(Winhead.copy(self), data)
 
     def __radd__(self, other):
         """Adds `other` to a :class:`Window` as `other + wind`.  Here `other` is any
@@ -1430,7 +1664,7 @@ class Window(Winhead):
 
         # carry out addition to a float type
         data = self.data + other
-        return Window(super().copy(), data)
+        return Window(Winhead.copy(self), data)
 
     def __sub__(self, other):
         """Subtracts `other` from a :class:`Window` as `wind - other`.  Here `other`
@@ -1457,7 +1691,7 @@ class Window(Winhead):
         """
         # carry out subtraction to a float type
         data = other - self.data
-        return Window(super().copy(), data)
+        return Window(Winhead.copy(self), data)
 
     def __mul__(self, other):
         """Multiplies a :class:`Window` by `other` as `wind * other`.  Here `other`
@@ -1475,7 +1709,7 @@ class Window(Winhead):
 
         # carry out multiplication to a float type
         data = self.data * num
-        return Window(super().copy(), data)
+        return Window(Winhead.copy(self), data)
 
     def __rmul__(self, other):
         """Multiplies a :class:`Window` by `other` as `other * wind`.  Here `other` is
@@ -1485,7 +1719,7 @@ class Window(Winhead):
         """
         # carry out multiplication to a float type
         data = self.data * other
-        return Window(super().copy(), data)
+        return Window(Winhead.copy(self), data)
 
     def __truediv__(self, other):
         """Divides a :class:`Window` by `other` as `wind / other`.  Here `other`
@@ -1504,7 +1738,7 @@ class Window(Winhead):
 
         # carry out division
         data = self.data / num
-        return Window(super().copy(), data)
+        return Window(Winhead.copy(self), data)
 
     def __rtruediv__(self, other):
         """Divides `other` by a :class:`Window` as `other / wind`.  Here `other` is
@@ -1513,4 +1747,4 @@ class Window(Winhead):
         """
         # carry out division
         data = other / self.data
-        return Window(super().copy(), data)
+        return Window(Winhead.copy(self), data)
@@ -3,6 +3,7 @@ hipercam setup file
 """
 
 import os
+import sys
 from setuptools import setup, find_packages
 from setuptools.extension import Extension
 
@@ -19,13 +20,16 @@ here = os.path.abspath(os.path.dirname(__file__))
 with open(os.path.join(here, 'README.rst'), encoding='utf-8') as f:
     long_description = f.read()
 
-# cython support routine
+# cython support routine. OpenMP is used to parallelise it, except on
+# macOS where the default compiler does not support it.
+openmp = [] if sys.platform == 'darwin' else ["-fopenmp"]
 extension = [
     Extension("hipercam.support",
               [os.path.join('hipercam','support.pyx')],
               libraries=["m"],
               include_dirs=[np.get_include()],
-              extra_compile_args=["-fno-strict-aliasing"],),
+              extra_compile_args=["-fno-strict-aliasing"] + openmp,
+              extra_link_args=openmp,),
 ]
 
 setup(